@@ -0,0 +1,477 @@
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+import numpy as np
+
+from market_data import parse_timeframe
+from signals import (
+    CLOSE,
+    HIGH,
+    LOW,
+    OPEN,
+    STATUS_BUY,
+    STATUS_NEUTRAL,
+    STATUS_SELL,
+    compute_atr_pct,
+    compute_dynamic_intervals,
+    compute_indicators,
+    compute_tp_sl,
+    compute_votes,
+)
+from strategy import StrategyParams
+
+HISTORY_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+# Cells (symbols x bars) evaluated per indicator pass; bounds peak memory.
+MAX_CELLS = 4_000_000
+
+
+def symbol_from_path(path: Path):
+    # BTC_USDT.csv / BTC-USDT.parquet -> BTC/USDT
+    return path.stem.replace("_", "/").replace("-", "/").upper()
+
+
+def _read_frame(path: Path):
+    import pandas as pd
+
+    if path.suffix == ".parquet":
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+    frame.columns = [str(column).lower() for column in frame.columns]
+    if "timestamp" not in frame.columns:
+        # Headerless ccxt dump: timestamp, open, high, low, close, volume
+        frame = pd.read_csv(path, header=None, names=HISTORY_COLUMNS)
+    timestamps = frame["timestamp"]
+    if not np.issubdtype(timestamps.dtype, np.number):
+        timestamps = pd.to_datetime(timestamps, utc=True).astype("int64") // 1_000_000
+    frame["timestamp"] = timestamps.astype("int64")
+    return frame[HISTORY_COLUMNS].sort_values("timestamp").drop_duplicates("timestamp", keep="last")
+
+
+def load_history(source, symbols=None):
+    """
+    Historical candles from local files: a directory of ``BASE_QUOTE.csv`` /
+    ``.parquet`` files (or a list of such paths) with ccxt's column order.
+    Returns {symbol: (bars, 6) float array}, timestamps in ms.
+    """
+    if isinstance(source, (str, Path)) and Path(source).is_dir():
+        paths = sorted(
+            path for path in Path(source).iterdir() if path.suffix in {".csv", ".parquet"}
+        )
+    else:
+        paths = [Path(source)] if isinstance(source, (str, Path)) else [Path(p) for p in source]
+    wanted = set(symbols) if symbols else None
+    history = {}
+    for path in paths:
+        symbol = symbol_from_path(path)
+        if wanted is not None and symbol not in wanted:
+            continue
+        candles = _read_frame(path).to_numpy(dtype=float)
+        if len(candles):
+            history[symbol] = candles
+    return history
+
+
+def fill_gaps(candles, step_ms: int):
+    """
+    Put one symbol's candles on a regular grid. Missing bars become flat
+    candles at the previous close with zero volume, as exchanges report them.
+    """
+    timestamps = candles[:, 0].astype(np.int64)
+    first = timestamps[0]
+    slots = (timestamps - first) // step_ms
+    bars = int(slots[-1]) + 1
+    if bars == len(candles):
+        return first, candles[:, 1:6]
+    filled = np.full((bars, 5), np.nan)
+    filled[slots] = candles[:, 1:6]
+    present = np.zeros(bars, dtype=bool)
+    present[slots] = True
+    last_seen = np.maximum.accumulate(np.where(present, np.arange(bars), 0))
+    previous_close = filled[last_seen, CLOSE]
+    for column in (OPEN, HIGH, LOW, CLOSE):
+        filled[~present, column] = previous_close[~present]
+    filled[~present, 4] = 0.0
+    return first, filled
+
+
+def _next_index(mask):
+    """For every bar, the first bar at or after it where ``mask`` holds (len if none)."""
+    size = len(mask)
+    positions = np.where(mask, np.arange(size), size)
+    return np.minimum.accumulate(positions[::-1])[::-1]
+
+
+def _find_exit(entry, limit, tp, sl, open_, high, low):
+    """
+    First bar in (entry, limit] whose range touches TP or SL. Scans in
+    doubling chunks so a trade only touches the bars it actually lives for.
+    SL wins when both are touched in one bar; gaps fill at the open.
+    """
+    begin = entry + 1
+    width = 64
+    while begin <= limit:
+        end = min(limit, begin + width - 1)
+        hit = (low[begin:end + 1] <= sl) | (high[begin:end + 1] >= tp)
+        if hit.any():
+            bar = begin + int(np.argmax(hit))
+            if low[bar] <= sl:
+                return bar, min(sl, open_[bar]), "sl"
+            return bar, max(tp, open_[bar]), "tp"
+        begin = end + 1
+        width *= 2
+    return None
+
+
+def simulate_symbol(ohlcv, status, tp, sl):
+    """
+    Long-only trades for one symbol, following apply_paper_trading: enter on
+    a Buy at the bar close while flat, exit on TP/SL touch, on a Sell close,
+    or at the end of the data. Work is per trade, not per bar: entries come
+    from a precomputed next-Buy index and exits from vectorized range scans.
+    Returns a list of (entry_bar, exit_bar, entry_price, exit_price, reason).
+    """
+    open_ = ohlcv[:, OPEN]
+    high = ohlcv[:, HIGH]
+    low = ohlcv[:, LOW]
+    close = ohlcv[:, CLOSE]
+    bars = len(close)
+    next_buy = _next_index(status == STATUS_BUY)
+    next_sell = _next_index(status == STATUS_SELL)
+    trades = []
+    entry = next_buy[0] if bars else bars
+    while entry < bars - 1:
+        sell_at = next_sell[entry + 1]
+        limit = min(sell_at, bars - 1)
+        found = _find_exit(entry, limit, tp[entry], sl[entry], open_, high, low)
+        if found is not None:
+            exit_bar, price, reason = found
+        elif sell_at < bars:
+            exit_bar, price, reason = sell_at, close[sell_at], "signal"
+        else:
+            exit_bar, price, reason = bars - 1, close[-1], "end"
+        trades.append((entry, exit_bar, close[entry], price, reason))
+        if exit_bar + 1 >= bars:
+            break
+        entry = next_buy[exit_bar + 1]
+    return trades
+
+
+def check_mask(atr_pct, interval: int, step_ms: int, params: StrategyParams | None = None):
+    """
+    Bars at which the live scheduler would look at each symbol: the first
+    bar, then again after compute_dynamic_interval seconds (at least a bar).
+    """
+    waits = compute_dynamic_intervals(atr_pct, interval, params) * 1000
+    steps = np.maximum(1, -(-waits // step_ms))
+    mask = np.zeros(atr_pct.shape, dtype=bool)
+    if (steps == 1).all():
+        mask[:] = True
+        return mask
+    for row, row_steps in enumerate(steps):
+        row_steps = row_steps.tolist()
+        bar = 0
+        while bar < len(row_steps):
+            mask[row, bar] = True
+            bar += row_steps[bar]
+    return mask
+
+
+def evaluate_signals(
+    ohlcv,
+    params: StrategyParams | None = None,
+    allow_buy: bool = True,
+    allow_sell: bool = True,
+    interval: int | None = None,
+    step_ms: int | None = None,
+    ind=None,
+):
+    """
+    Status and TP/SL arrays for a (symbols, bars, 5) block, with warm-up bars
+    neutral. With ``interval`` the status is only visible on the bars the
+    scheduler would have checked. ``ind`` lets callers pass precomputed
+    indicators (see optimize.py).
+    """
+    params = params or StrategyParams()
+    if ind is None:
+        ind = compute_indicators(ohlcv, params.bb_length, params.bb_std, psar=False)
+    _, _, _, status = compute_votes(ind, allow_buy, allow_sell, params)
+    warm = np.isnan(ind["atr"]) | np.isnan(ind["macd_signal"])
+    status[warm] = STATUS_NEUTRAL
+    if interval:
+        atr_pct = compute_atr_pct(ind["close"], ind["atr"])
+        status[~check_mask(atr_pct, interval, step_ms, params)] = STATUS_NEUTRAL
+    tp, sl = compute_tp_sl(status, ind["close"], ind["atr"], params.tp_mult, params.sl_mult)
+    # Without a usable ATR the bot's TP/SL collapse onto the close; treat that
+    # as "no target" instead of an instant exit on the next bar.
+    flat = ~(ind["atr"] > 0)
+    tp[flat] = np.inf
+    sl[flat] = -np.inf
+    return status, tp, sl
+
+
+def prepare_history(history, timeframe: str | None = None):
+    """
+    Regular-grid arrays grouped by (first bar, length) so each group stacks
+    into one (symbols, bars, 5) array. Returns (step_ms, [(first, symbols, ohlcv)]).
+    """
+    if not history:
+        raise ValueError("No history to backtest")
+    if timeframe is None:
+        sample = next(iter(history.values()))
+        step_ms = int(np.median(np.diff(sample[:, 0]))) if len(sample) > 1 else 60_000
+    else:
+        step_ms = parse_timeframe(timeframe)
+    grids = {}
+    for symbol, candles in history.items():
+        first, ohlcv = fill_gaps(candles, step_ms)
+        grids.setdefault((int(first), len(ohlcv)), []).append((symbol, ohlcv))
+    groups = [
+        (first, [symbol for symbol, _ in members], np.stack([ohlcv for _, ohlcv in members]))
+        for (first, _), members in grids.items()
+    ]
+    return step_ms, groups
+
+
+def collect_trades(trades, symbols, first, step_ms, ohlcv, status, tp, sl):
+    """Append every symbol's trades as (symbol, entry_ms, exit_ms, entry_bar, exit_bar, entry, exit, reason)."""
+    for row, symbol in enumerate(symbols):
+        for entry, exit_bar, entry_price, exit_price, reason in simulate_symbol(
+            ohlcv[row], status[row], tp[row], sl[row]
+        ):
+            trades.append(
+                (symbol, first + entry * step_ms, first + exit_bar * step_ms,
+                 entry, exit_bar, entry_price, exit_price, reason)
+            )
+    return trades
+
+
+def run_portfolio(trades, closes, step_ms, start_balance: float, risk_pct: float):
+    """
+    Size the trades the way apply_paper_trading does (risk_pct of the cash on
+    hand per entry) in time order, exits before entries on the same bar.
+    ``closes`` maps symbol -> (first_ms, close array). Returns the time grid,
+    the equity curve and each trade's quantity.
+    """
+    risk_pct = max(0.1, min(50.0, risk_pct))
+    events = sorted(
+        [(trade[2], 0, index) for index, trade in enumerate(trades)]
+        + [(trade[1], 1, index) for index, trade in enumerate(trades)]
+    )
+    cash = float(start_balance)
+    quantities = np.zeros(len(trades))
+    cash_changes = []
+    for timestamp, is_entry, index in events:
+        _, _, _, _, _, entry_price, exit_price, _ = trades[index]
+        if is_entry:
+            allocation = cash * risk_pct / 100
+            quantities[index] = allocation / entry_price if entry_price else 0.0
+            cash -= allocation
+            cash_changes.append((timestamp, -allocation))
+        else:
+            proceeds = quantities[index] * exit_price
+            cash += proceeds
+            cash_changes.append((timestamp, proceeds))
+
+    start = min(first for first, _ in closes.values())
+    end = max(first + (len(close) - 1) * step_ms for first, close in closes.values())
+    grid = np.arange(start, end + step_ms, step_ms, dtype=np.int64)
+    cash_curve = np.zeros(len(grid))
+    if cash_changes:
+        stamps, amounts = zip(*cash_changes)
+        np.add.at(cash_curve, (np.asarray(stamps) - start) // step_ms, amounts)
+    cash_curve = start_balance + np.cumsum(cash_curve)
+
+    # Quantity held per bar: +qty at the entry bar, -qty at the exit bar.
+    held = {}
+    for index, (symbol, _, _, entry, exit_bar, _, _, _) in enumerate(trades):
+        change = held.get(symbol)
+        if change is None:
+            change = held[symbol] = np.zeros(len(closes[symbol][1]) + 1)
+        change[entry] += quantities[index]
+        change[exit_bar] -= quantities[index]
+    position_value = np.zeros(len(grid))
+    for symbol, change in held.items():
+        first, close = closes[symbol]
+        offset = (first - start) // step_ms
+        position_value[offset:offset + len(close)] += np.cumsum(change[:-1]) * close
+    return grid, cash_curve + position_value, quantities
+
+
+def trade_stats(trades, quantities, equity, start_balance: float):
+    entry_prices = np.array([trade[5] for trade in trades], dtype=float)
+    exit_prices = np.array([trade[6] for trade in trades], dtype=float)
+    pnl = quantities * (exit_prices - entry_prices)
+    returns = (exit_prices / entry_prices - 1) * 100 if len(trades) else np.zeros(0)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    exits = {}
+    for trade in trades:
+        exits[trade[7]] = exits.get(trade[7], 0) + 1
+    return {
+        "trades": len(trades),
+        "win_rate": float((pnl > 0).mean()) if len(trades) else 0.0,
+        "avg_trade_pct": float(returns.mean()) if len(trades) else 0.0,
+        "start_balance": float(start_balance),
+        "final_equity": float(equity[-1]),
+        "total_return": float(equity[-1] / start_balance - 1),
+        "max_drawdown": float(-drawdown.min()),
+        "exits": exits,
+    }
+
+
+@dataclass
+class BacktestResult:
+    equity: "object"
+    drawdown: "object"
+    trades: "object"
+    stats: dict = field(default_factory=dict)
+
+    def report(self):
+        stats = self.stats
+        lines = [
+            f"Symbols: {stats['symbols']} | bars: {stats['bars']:,} | "
+            f"{stats['bars_per_second']:,.0f} bars/s ({stats['elapsed']:.2f}s)",
+            f"Trades: {stats['trades']} | win rate: {stats['win_rate']*100:.1f}% | "
+            f"avg trade: {stats['avg_trade_pct']:.2f}%",
+            f"Equity: {stats['start_balance']:,.2f} -> {stats['final_equity']:,.2f} "
+            f"({stats['total_return']*100:+.2f}%) | max drawdown: {stats['max_drawdown']*100:.2f}%",
+            "Exits: " + ", ".join(f"{reason} {count}" for reason, count in stats["exits"].items()),
+        ]
+        return "\n".join(lines)
+
+
+def run_backtest(
+    history,
+    timeframe: str | None = None,
+    start_balance: float = 10_000.0,
+    risk_pct: float = 5.0,
+    allow_buy: bool = True,
+    allow_sell: bool = True,
+    params: StrategyParams | None = None,
+    interval: int | None = None,
+    max_cells: int = MAX_CELLS,
+):
+    """
+    Replay the bot's voting, TP/SL and paper sizing over ``history``
+    ({symbol: (bars, 6) array} from load_history). Indicators and votes are
+    computed for blocks of symbols at once; the portfolio pass walks trades,
+    not bars, and the equity curve is assembled with cumulative sums.
+    """
+    import pandas as pd
+
+    started = time.perf_counter()
+    step_ms, groups = prepare_history(history, timeframe)
+    trades = []
+    closes = {}
+    total_bars = 0
+    for first, symbols, ohlcv in groups:
+        bars = ohlcv.shape[1]
+        per_block = max(1, max_cells // max(bars, 1))
+        for offset in range(0, len(symbols), per_block):
+            block = ohlcv[offset:offset + per_block]
+            block_symbols = symbols[offset:offset + per_block]
+            status, tp, sl = evaluate_signals(
+                block, params, allow_buy, allow_sell, interval, step_ms
+            )
+            collect_trades(trades, block_symbols, first, step_ms, block, status, tp, sl)
+        for row, symbol in enumerate(symbols):
+            closes[symbol] = (first, ohlcv[row, :, CLOSE])
+        total_bars += bars * len(symbols)
+
+    grid, equity, quantities = run_portfolio(trades, closes, step_ms, start_balance, risk_pct)
+    stats = trade_stats(trades, quantities, equity, start_balance)
+    elapsed = time.perf_counter() - started
+    stats.update(
+        symbols=len(closes),
+        bars=total_bars,
+        elapsed=elapsed,
+        bars_per_second=total_bars / elapsed if elapsed else float("inf"),
+    )
+
+    index = pd.to_datetime(grid, unit="ms", utc=True)
+    trades_frame = pd.DataFrame(
+        trades,
+        columns=["symbol", "entry_time", "exit_time", "entry_bar", "exit_bar",
+                 "entry_price", "exit_price", "reason"],
+    )
+    trades_frame["qty"] = quantities
+    trades_frame["pnl"] = trades_frame["qty"] * (trades_frame["exit_price"] - trades_frame["entry_price"])
+    trades_frame["return_pct"] = (trades_frame["exit_price"] / trades_frame["entry_price"] - 1) * 100
+    for column in ("entry_time", "exit_time"):
+        trades_frame[column] = pd.to_datetime(trades_frame[column], unit="ms", utc=True)
+    equity_series = pd.Series(equity, index=index, name="equity")
+    return BacktestResult(
+        equity=equity_series,
+        drawdown=(equity_series / equity_series.cummax() - 1).rename("drawdown"),
+        trades=trades_frame,
+        stats=stats,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the bot's signals on local candle files.")
+    parser.add_argument("source", help="directory of BASE_QUOTE.csv/.parquet files, or one file")
+    parser.add_argument("--store", action="store_true", help="SOURCE is the bot's candle store (cache/candles)")
+    parser.add_argument("--exchange", default="binance", help="exchange folder inside the candle store")
+    parser.add_argument("--symbols", nargs="*", help="only these pairs, e.g. BTC/USDT")
+    parser.add_argument("--timeframe", help="bar size such as 1m or 1h (inferred if omitted)")
+    parser.add_argument("--config", help="take balance, risk %, Buy/Sell toggles and strategy from user.json")
+    parser.add_argument("--profile", help="strategy profile to read from --config (default: its profile)")
+    parser.add_argument("--interval", type=int, help="only act on bars the scheduler would check at this base interval (s)")
+    parser.add_argument("--balance", type=float, help="starting balance (default 10000)")
+    parser.add_argument("--risk-pct", type=float, help="percent of cash per entry (default 5)")
+    parser.add_argument("--tp-mult", type=float, help="take profit in ATRs (default 2)")
+    parser.add_argument("--sl-mult", type=float, help="stop loss in ATRs (default 1.5)")
+    parser.add_argument("--equity-csv", help="write the equity and drawdown curve here")
+    parser.add_argument("--trades-csv", help="write the trade list here")
+    args = parser.parse_args(argv)
+
+    options = {"start_balance": 10_000.0, "risk_pct": 5.0, "params": StrategyParams()}
+    if args.config:
+        from engine import EngineSettings, load_settings
+
+        overrides = {"profile": args.profile} if args.profile else {}
+        settings = EngineSettings.from_dict(load_settings(Path(args.config)), **overrides)
+        options.update(
+            start_balance=settings.paper_start_balance,
+            risk_pct=settings.paper_risk_pct,
+            allow_buy=settings.allow_buy,
+            allow_sell=settings.allow_sell,
+            params=settings.strategy,
+        )
+    if args.tp_mult is not None:
+        options["params"] = replace(options["params"], tp_mult=args.tp_mult)
+    if args.sl_mult is not None:
+        options["params"] = replace(options["params"], sl_mult=args.sl_mult)
+    if args.balance is not None:
+        options["start_balance"] = args.balance
+    if args.risk_pct is not None:
+        options["risk_pct"] = args.risk_pct
+
+    loaded = time.perf_counter()
+    if args.store:
+        if not args.timeframe:
+            parser.error("--store needs --timeframe")
+        from market_data import CandleStore
+
+        history = CandleStore(Path(args.source), args.exchange).history(args.timeframe, args.symbols)
+    else:
+        history = load_history(args.source, args.symbols)
+    if not history:
+        print(f"No candle files found in {args.source}")
+        return 1
+    print(f"Loaded {len(history)} pairs in {time.perf_counter() - loaded:.2f}s")
+    result = run_backtest(history, args.timeframe, interval=args.interval, **options)
+    print(result.report())
+    if args.equity_csv:
+        result.equity.to_frame().join(result.drawdown).to_csv(args.equity_csv)
+    if args.trades_csv:
+        result.trades.to_csv(args.trades_csv, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
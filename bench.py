@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+from charts import _synthetic_history, render_chart
+from engine import PROFILE_PARAMS, BotEngine, EngineSettings
+from fakes import FakeApiServer, FakeExchange
+from market_data import CandleCache, DominanceCache, parse_timeframe
+from streaming import KlineReplayServer
+from telegram_sender import TokenBucket
+
+BENCH_STAGES = ("fetch", "indicators", "mtf", "votes", "dominance", "chart", "telegram", "scan", "stream")
+SIZES = (1, 50, 500)
+
+
+def bench_symbols(count: int):
+    return [f"C{index:04d}/USDT" for index in range(count)]
+
+
+def peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) / 1024  # kilobytes on Linux
+
+
+def chart_render_ms(engine, renders: int = 10):
+    """Median time of one chart render on this thread, without pool queueing."""
+    options = engine.charts.options
+    history = _synthetic_history(240, 0)
+    render_chart(options, "WARM/UP", history)
+    timings = []
+    for index in range(renders):
+        started = time.perf_counter()
+        render_chart(options, f"BENCH{index}/USDT", history)
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+async def scan_pass(engine, symbols, semaphore):
+    """One cycle of the scheduler's work: every pair through scan_symbol."""
+    schedule = []
+    started = time.perf_counter()
+    await asyncio.gather(*(engine.scan_symbol(symbol, semaphore, schedule) for symbol in symbols))
+    return time.perf_counter() - started
+
+
+async def stream_pass(engine, exchange, settings, symbols, timeframe, args):
+    """
+    Replay the next ``--stream-bars`` bars over the local kline stream and let
+    the scheduler loop react to each close. Returns (bars, seconds, REST calls).
+    """
+    step = parse_timeframe(timeframe)
+    if exchange.history is None:
+        start = exchange.now_ms // step * step
+    else:
+        # Recorded candles end at the clock: rewind so there is a tail to replay.
+        start = max(int(exchange.history[symbol][-1, 0]) for symbol in symbols) - (args.stream_bars - 1) * step
+        exchange.now_ms = start
+        engine.candles.invalidate()
+    until = start + (args.stream_bars - 1) * step
+    history = {symbol: exchange.series(symbol, timeframe, until) for symbol in symbols}
+    server = await KlineReplayServer(
+        history,
+        timeframe,
+        speed=args.stream_speed,
+        start_ms=start,
+        clock=exchange,
+        drop_every=args.stream_drop_every,
+    ).start()
+    engine.apply_settings(replace(settings, stream_enabled=True, stream_url=server.url))
+    requests = exchange.requests
+    task = asyncio.create_task(engine.run())
+    started = time.perf_counter()
+    await server.done.wait()
+    # Let the analyses of the last bar finish.
+    scans = None
+    while engine.stream_ready or scans != engine.metrics.counter("scans_total"):
+        scans = engine.metrics.counter("scans_total")
+        await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - started
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await server.stop()
+    return engine.metrics.counter("stream_bars_total"), elapsed, exchange.requests - requests
+
+
+async def run_size(args, count: int):
+    symbols = bench_symbols(count)
+    timeframe = PROFILE_PARAMS[args.profile][0]
+    step_seconds = FakeExchange().parse_timeframe(timeframe)
+    api = FakeApiServer(latency=args.telegram_latency).start()
+    history = None
+    if args.history:
+        from backtest import load_history
+
+        history = load_history(args.history)
+        symbols = sorted(history)[:count]
+    state_dir = tempfile.mkdtemp(prefix="bench-")
+    settings = EngineSettings.from_dict(
+        {},
+        symbols=tuple(symbols),
+        profile=args.profile,
+        bot_token="123456:BENCH",
+        chat_id="1",
+        telegram_base_url=api.telegram_url,
+        telegram_queue_size=max(100, count * (args.rounds + 1)),
+        chart_workers=args.chart_workers,
+        chart_executor=args.chart_executor,
+        max_concurrency=args.concurrency,
+        mtf_timeframes=tuple(args.mtf),
+        candle_store=False,
+        suppress_unchanged=args.suppress,
+        shard_workers=args.shards,
+        state_dir=state_dir,
+    )
+    engine = BotEngine(settings)
+    exchange = FakeExchange(latency=args.exchange_latency, seed=args.seed, history=history)
+    engine.exchange = exchange
+    engine.candles = CandleCache(exchange)
+    engine.dominance = DominanceCache(ttl=settings.dominance_ttl)
+    engine.dominance.URL = api.dominance_url
+
+    sender = await engine.get_sender()
+    if not args.telegram_limits:
+        # Measure our side of delivery, not Telegram's rate limits.
+        sender.global_bucket = TokenBucket(1e9, 1e9)
+        sender.chat_buckets[settings.chat_id] = TokenBucket(1e9, 1e9)
+
+    semaphore = asyncio.Semaphore(settings.max_concurrency)
+    passes = []
+    for round_index in range(args.rounds):
+        if round_index:
+            exchange.advance(step_seconds)
+        elapsed = await scan_pass(engine, symbols, semaphore)
+        passes.append({"seconds": elapsed, "symbols_per_sec": count / elapsed})
+
+    loop_scans = None
+    if args.loop_seconds:
+        engine.apply_settings(EngineSettings(**{**settings.__dict__, "interval": 5}))
+        before = engine.metrics.counter("scans_total")
+        task = asyncio.create_task(engine.run())
+        await asyncio.sleep(args.loop_seconds)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        loop_scans = engine.metrics.counter("scans_total") - before
+
+    stream = None
+    if args.stream_bars:
+        stream = await stream_pass(engine, exchange, settings, symbols, timeframe, args)
+
+    try:
+        await asyncio.wait_for(sender.queue.join(), timeout=args.drain_timeout)
+    except asyncio.TimeoutError:
+        pass
+    stats = sender.stats()
+    summary = engine.metrics.summary()
+    render_ms = chart_render_ms(engine)
+    await engine.close()
+    api.stop()
+    return {
+        "symbols": count,
+        "cold_symbols_per_sec": passes[0]["symbols_per_sec"],
+        "warm_symbols_per_sec": (
+            sorted(item["symbols_per_sec"] for item in passes[1:])[(len(passes) - 2) // 2]
+            if len(passes) > 1
+            else None
+        ),
+        "loop_scans_per_sec": loop_scans / args.loop_seconds if loop_scans is not None else None,
+        "stream_bars_per_sec": stream[0] / stream[1] if stream else None,
+        "stream_rest_requests": stream[2] if stream else None,
+        "stages": {
+            stage: {key: summary[stage][key] for key in ("count", "p50", "p95")}
+            for stage in BENCH_STAGES
+            if stage in summary
+        },
+        "chart_render_ms": render_ms,
+        "exchange_requests": exchange.requests,
+        "telegram_sent": stats["sent"],
+        "telegram_dropped": stats["dropped"],
+        "skipped": sum(
+            engine.metrics.counter("skipped_total", reason=reason) for reason in ("no_data", "rsi_nan", "error")
+        ),
+        "suppressed": engine.metrics.counter("suppressed_total"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(results):
+    print(
+        f"{'pairs':>6} {'cold/s':>8} {'warm/s':>8} {'loop/s':>8} {'render':>9} {'chart p95':>10} "
+        f"{'scan p95':>9} {'rss MB':>7} {'sent':>6} {'skip':>5}"
+    )
+    for result in results:
+        stages = result["stages"]
+        warm = result["warm_symbols_per_sec"]
+        loop = result["loop_scans_per_sec"]
+        print(
+            f"{result['symbols']:>6} {result['cold_symbols_per_sec']:>8.1f} "
+            f"{warm if warm is not None else float('nan'):>8.1f} "
+            f"{loop if loop is not None else float('nan'):>8.1f} "
+            f"{result['chart_render_ms']:>7.1f}ms {stages.get('chart', {}).get('p95', 0)*1000:>8.1f}ms "
+            f"{stages.get('scan', {}).get('p95', 0)*1000:>7.0f}ms {result['peak_rss_mb']:>7.0f} "
+            f"{result['telegram_sent']:>6} {result['skipped']:>5}"
+        )
+    if any(result["stream_bars_per_sec"] is not None for result in results):
+        print()
+        print(f"{'pairs':>6} {'bars/s':>8} {'REST':>6} {'close->done p50':>16} {'p95':>9}")
+        for result in results:
+            if result["stream_bars_per_sec"] is None:
+                continue
+            stream = result["stages"].get("stream", {"p50": 0, "p95": 0})
+            print(
+                f"{result['symbols']:>6} {result['stream_bars_per_sec']:>8.1f} {result['stream_rest_requests']:>6} "
+                f"{stream['p50']*1000:>14.1f}ms {stream['p95']*1000:>7.1f}ms"
+            )
+    print()
+    print(f"{'pairs':>6} {'stage':<11} {'count':>7} {'p50 ms':>9} {'p95 ms':>9}")
+    for result in results:
+        for stage, values in result["stages"].items():
+            print(
+                f"{result['symbols']:>6} {stage:<11} {values['count']:>7} "
+                f"{values['p50']*1000:>9.2f} {values['p95']*1000:>9.2f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the scan pipeline against a fake exchange and a fake Telegram API."
+    )
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(SIZES), help="pair counts to run")
+    parser.add_argument("--profile", choices=sorted(PROFILE_PARAMS), default="scalp")
+    parser.add_argument("--rounds", type=int, default=3, help="scan passes per size (the first is cold)")
+    parser.add_argument(
+        "--loop-seconds", type=float, default=10, help="then run the scheduler loop this long per size (0: skip)"
+    )
+    parser.add_argument("--exchange-latency", type=float, default=0.02, help="seconds per fake OHLCV request")
+    parser.add_argument("--stream-bars", type=int, default=0, help="also replay this many bars over the kline stream")
+    parser.add_argument("--stream-speed", type=float, default=60, help="replay speed, times real time (0: flat out)")
+    parser.add_argument("--stream-drop-every", type=int, default=0, help="drop the stream every N bars")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="seconds per fake Bot API call")
+    parser.add_argument("--telegram-limits", action="store_true", help="keep the sender's real rate limits")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="max seconds to wait for the Telegram queue")
+    parser.add_argument("--suppress", action="store_true", help="skip unchanged signals as the bot does by default")
+    parser.add_argument("--shards", type=int, default=0, help="indicator/chart worker processes (0: in-process)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chart-workers", type=int, default=2)
+    parser.add_argument("--chart-executor", choices=("thread", "process"), default="thread")
+    parser.add_argument("--mtf", nargs="*", default=[], help="higher timeframes, e.g. 5m 1h")
+    parser.add_argument("--history", help="directory of recorded BASE_QUOTE.csv/.parquet candles to serve")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(asyncio.run(run_size(args, args.child))))
+        return 0
+
+    # Each size runs in a fresh process so peak RSS and warm caches do not
+    # leak from one size into the next.
+    results = []
+    passthrough = list(argv if argv is not None else sys.argv[1:])
+    for count in args.sizes:
+        completed = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), *passthrough, "--child", str(count)],
+            capture_output=True,
+            text=True,
+        )
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            print(f"{count} pairs failed:\n{completed.stderr}")
+            return 1
+        results.append(json.loads(lines[-1]))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
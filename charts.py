@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import io
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+CHART_KEYS = ("close", "rsi", "macd", "macd_signal", "bb_lower", "bb_middle", "bb_upper")
+FORMATS = {"png": "png", "webp": "webp", "jpeg": "jpeg", "jpg": "jpeg"}
+
+
+class ChartRenderer:
+    """
+    Four-panel chart (close, RSI, MACD, Bollinger Bands) on a private Agg
+    figure. The figure, axes and lines are built once; each render only swaps
+    the line data, so nothing touches pyplot's global state.
+    """
+
+    def __init__(self, size=(12, 16), dpi: int = 100, fmt: str = "png", quality: int = 80):
+        # Imported here so matplotlib loads in the render workers, not at startup.
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.dpi = dpi
+        self.fmt = FORMATS.get(fmt, "png")
+        self.quality = quality
+        self.figure = Figure(figsize=tuple(size), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        price_ax, rsi_ax, macd_ax, bb_ax = self.figure.subplots(4, 1)
+
+        (self.close_line,) = price_ax.plot([], [], label="Close")
+        self.price_title = price_ax.set_title("Close Prices")
+        price_ax.legend(loc="upper left")
+
+        (self.rsi_line,) = rsi_ax.plot([], [], label="RSI")
+        rsi_ax.axhline(70, color="red", linestyle="--")
+        rsi_ax.axhline(30, color="green", linestyle="--")
+        rsi_ax.set_ylim(0, 100)
+        rsi_ax.set_title("RSI")
+        rsi_ax.legend(loc="upper left")
+
+        (self.macd_line,) = macd_ax.plot([], [], label="MACD")
+        (self.signal_line,) = macd_ax.plot([], [], label="Signal")
+        macd_ax.set_title("MACD")
+        macd_ax.legend(loc="upper left")
+
+        (self.bb_close_line,) = bb_ax.plot([], [], label="Close")
+        (self.bb_lower_line,) = bb_ax.plot([], [], label="Lower Band")
+        (self.bb_middle_line,) = bb_ax.plot([], [], label="Middle Band")
+        (self.bb_upper_line,) = bb_ax.plot([], [], label="Upper Band")
+        bb_ax.set_title("Bollinger Bands")
+        bb_ax.legend(loc="upper left")
+
+        self.rescaled_axes = (price_ax, macd_ax, bb_ax)
+        self.rsi_ax = rsi_ax
+        self.figure.tight_layout()
+
+    def render(self, symbol: str, history: dict) -> bytes:
+        x = range(len(history["close"]))
+        self.price_title.set_text(f"{symbol} Close Prices")
+        self.close_line.set_data(x, history["close"])
+        self.rsi_line.set_data(x, history["rsi"])
+        self.macd_line.set_data(x, history["macd"])
+        self.signal_line.set_data(x, history["macd_signal"])
+        self.bb_close_line.set_data(x, history["close"])
+        self.bb_lower_line.set_data(x, history["bb_lower"])
+        self.bb_middle_line.set_data(x, history["bb_middle"])
+        self.bb_upper_line.set_data(x, history["bb_upper"])
+        for ax in self.rescaled_axes:
+            ax.relim()
+            ax.autoscale_view()
+        self.rsi_ax.set_xlim(0, max(1, len(history["close"]) - 1))
+
+        buf = io.BytesIO()
+        pil_kwargs = {"quality": self.quality} if self.fmt in {"jpeg", "webp"} else None
+        self.figure.savefig(buf, format=self.fmt, dpi=self.dpi, pil_kwargs=pil_kwargs)
+        return buf.getvalue()
+
+
+_local = threading.local()
+
+
+def render_chart(options: tuple, symbol: str, history: dict) -> bytes:
+    """Executor entry point: one cached renderer per worker thread/process."""
+    renderers = getattr(_local, "renderers", None)
+    if renderers is None:
+        renderers = _local.renderers = {}
+    renderer = renderers.get(options)
+    if renderer is None:
+        size, dpi, fmt, quality = options
+        renderer = renderers[options] = ChartRenderer(size, dpi, fmt, quality)
+    return renderer.render(symbol, history)
+
+
+class ChartPool:
+    """Renders charts in a thread or process pool so the event loop keeps serving I/O."""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        executor: str = "thread",
+        size=(12, 16),
+        dpi: int = 100,
+        fmt: str = "png",
+        quality: int = 80,
+    ):
+        self.options = (tuple(size), int(dpi), FORMATS.get(fmt, "png"), int(quality))
+        workers = max(1, int(workers))
+        if executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart")
+
+    @property
+    def extension(self):
+        return "jpg" if self.options[2] == "jpeg" else self.options[2]
+
+    async def render(self, symbol: str, history: dict) -> bytes:
+        payload = {key: list(history[key]) for key in CHART_KEYS}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, render_chart, self.options, symbol, payload
+        )
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _synthetic_history(bars: int, seed: int):
+    rng = random.Random(seed)
+    close = [100.0]
+    for _ in range(bars - 1):
+        close.append(close[-1] * (1 + rng.gauss(0, 0.01)))
+    return {
+        "close": close,
+        "rsi": [50 + 20 * rng.uniform(-1, 1) for _ in range(bars)],
+        "macd": [rng.gauss(0, 1) for _ in range(bars)],
+        "macd_signal": [rng.gauss(0, 1) for _ in range(bars)],
+        "bb_lower": [value * 0.98 for value in close],
+        "bb_middle": close,
+        "bb_upper": [value * 1.02 for value in close],
+    }
+
+
+async def _run_benchmark(pool: ChartPool, renders: int, bars: int):
+    histories = [_synthetic_history(bars, seed) for seed in range(min(renders, 16))]
+    await pool.render("WARM/UP", histories[0])
+    started = time.perf_counter()
+    images = await asyncio.gather(
+        *(pool.render(f"BENCH{i}/USDT", histories[i % len(histories)]) for i in range(renders))
+    )
+    elapsed = time.perf_counter() - started
+    return elapsed, sum(len(image) for image in images) / len(images)
+
+
+def benchmark(renders: int = 50, bars: int = 240, **pool_options):
+    """Render ``renders`` synthetic charts and return (charts_per_second, avg_bytes)."""
+    pool = ChartPool(**pool_options)
+    try:
+        elapsed, avg_bytes = asyncio.run(_run_benchmark(pool, renders, bars))
+    finally:
+        pool.shutdown()
+    return renders / elapsed, avg_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chart rendering benchmark")
+    parser.add_argument("--renders", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=240)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="png")
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args()
+    rate, avg_bytes = benchmark(
+        args.renders,
+        args.bars,
+        workers=args.workers,
+        executor=args.executor,
+        fmt=args.format,
+        dpi=args.dpi,
+    )
+    print(
+        f"{args.renders} charts | {args.executor} x{args.workers} | {args.format} @ {args.dpi} dpi: "
+        f"{rate:.2f} charts/s, {avg_bytes / 1024:.1f} KiB avg"
+    )
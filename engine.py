@@ -0,0 +1,1061 @@
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import signal
+import sys
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime
+from pathlib import Path
+
+from charts import ChartPool
+from exchange import ExchangePool
+from indicators import IndicatorEngine
+from ledger import PaperLedger
+from metrics import Metrics, MetricsServer
+from portfolio import valuation_pairs, value_balances
+from screener import rank_tickers
+from signal_state import SignalStateCache, signal_fingerprint
+from market_data import CandleCache, CandleStore, DominanceCache, TimeframeAggregator, shared_dominance_cache
+from strategy import StrategyParams, strategy_for_profile
+from streaming import DEFAULT_STREAM_URL, KlineStream
+
+
+BASE_DIR = Path(__file__).resolve().parent
+USER_PATH = BASE_DIR / "user.json"
+ADS_PATH = BASE_DIR / "ads.json"
+
+DEFAULT_SETTINGS = {
+    "bot_token": "",
+    "chat_id": "",
+    "interval": 900,
+    "message_interval": 30,
+    "api_key": "",
+    "api_secret": "",
+    "profile": "swing",
+    "paper_enabled": False,
+    "paper_start_balance": 10_000,
+    "paper_risk_pct": 5,
+    "paper_snapshot_every": 500,
+    "paper_mark_interval": 60,
+    "max_concurrency": 8,
+    "chart_format": "png",
+    "chart_dpi": 100,
+    "chart_size": [12, 16],
+    "chart_workers": 2,
+    "chart_executor": "thread",
+    "telegram_queue_size": 100,
+    "telegram_coalesce": False,
+    "telegram_base_url": "",
+    "dominance_ttl": 300,
+    "search_debounce_ms": 150,
+    "startup_budget_ms": 1500,
+    "portfolio_auto_refresh": False,
+    "portfolio_refresh_seconds": 60,
+    "state_dir": "cache",
+    "candle_store": True,
+    "mtf_timeframes": [],
+    "mtf_bars": 100,
+    "metrics_port": 0,
+    "metrics_per_symbol": True,
+    "exchange_weight_per_minute": 6000,
+    "exchange_weight_safety": 0.8,
+    "screener_enabled": False,
+    "screener_top_n": 20,
+    "screener_quote": "USDT",
+    "screener_min_volume": 1_000_000,
+    "screener_interval": 300,
+    "suppress_unchanged": True,
+    "signal_heartbeat_minutes": 60,
+    "signal_risk_bucket": 10,
+    "signal_price_step_pct": 0.5,
+    "shard_workers": 0,
+    "stream_enabled": False,
+    "stream_url": DEFAULT_STREAM_URL,
+    "io_record": "",
+    "signature": "Built by @mebularts",
+    "rsi_thresholds": {
+        "buy": True,
+        "sell": True,
+        "neutral": True,
+        "potential_buy": True,
+        "potential_sell": True,
+    },
+}
+
+PROFILE_PARAMS = {
+    "scalp": ("1m", 240),
+    "intraday": ("5m", 240),
+    "swing": ("1h", 240),
+}
+
+
+def load_settings(path: Path = USER_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        settings = json.loads(json.dumps(DEFAULT_SETTINGS))
+    # Provide defaults for newly added fields when upgrading from older configs
+    for key, value in DEFAULT_SETTINGS.items():
+        settings.setdefault(key, value)
+    return settings
+
+
+def lock_state_dir(state_dir: Path):
+    """
+    Take the exclusive lock that makes ``state_dir`` single-instance: the
+    ledger, signal state and candle store are not safe to share between
+    processes. Returns the open lock file (closing it releases the lock);
+    raises RuntimeError while another engine holds it.
+    """
+    state_dir.mkdir(parents=True, exist_ok=True)
+    handle = open(state_dir / "engine.lock", "a+b")
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        raise RuntimeError(
+            f"{state_dir} is in use by another bot instance; give each instance its own state_dir"
+        ) from None
+    return handle
+
+
+def save_settings(settings, path: Path = USER_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(settings, f, ensure_ascii=False, indent=4)
+
+
+def load_ads(path: Path = ADS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["ads"]
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def save_ads(ads, path: Path = ADS_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"ads": ads}, f, ensure_ascii=False, indent=4)
+
+
+@dataclass(frozen=True)
+class EngineSettings:
+    """
+    Immutable snapshot of everything the engine reads while scanning. The GUI
+    (or the headless runner) builds a new one and swaps it in with
+    BotEngine.apply_settings; the engine never looks at widgets.
+    """
+
+    bot_token: str = ""
+    chat_id: str = ""
+    interval: int = 900
+    profile: str = "swing"
+    symbols: tuple = ()
+    auto_messages: bool = True
+    allow_buy: bool = True
+    allow_sell: bool = True
+    paper_enabled: bool = False
+    paper_risk_pct: float = 5.0
+    paper_start_balance: float = 10_000.0
+    paper_snapshot_every: int = 500
+    paper_mark_interval: int = 60
+    signature: str = ""
+    max_concurrency: int = 8
+    telegram_queue_size: int = 100
+    telegram_coalesce: bool = False
+    telegram_base_url: str = ""
+    dominance_ttl: float = 300.0
+    chart_format: str = "png"
+    chart_dpi: int = 100
+    chart_size: tuple = (12, 16)
+    chart_workers: int = 2
+    chart_executor: str = "thread"
+    strategy: StrategyParams = StrategyParams()
+    exchange_id: str = "binance"
+    state_dir: str = str(BASE_DIR / "cache")
+    candle_store: bool = True
+    mtf_timeframes: tuple = ()
+    mtf_bars: int = 100
+    metrics_port: int = 0
+    metrics_per_symbol: bool = True
+    exchange_weight_per_minute: float = 6000.0
+    exchange_weight_safety: float = 0.8
+    screener_enabled: bool = False
+    screener_top_n: int = 20
+    screener_quote: str = "USDT"
+    screener_min_volume: float = 1_000_000.0
+    screener_interval: int = 300
+    suppress_unchanged: bool = True
+    signal_heartbeat_minutes: float = 60.0
+    signal_risk_bucket: int = 10
+    signal_price_step_pct: float = 0.5
+    shard_workers: int = 0
+    stream_enabled: bool = False
+    stream_url: str = DEFAULT_STREAM_URL
+    io_record: str = ""
+
+    @classmethod
+    def from_dict(cls, settings: dict, **overrides):
+        thresholds = settings.get("rsi_thresholds", {})
+        try:
+            paper_risk_pct = float(settings.get("paper_risk_pct", 5))
+        except (TypeError, ValueError):
+            paper_risk_pct = 5.0
+        state_dir = Path(settings.get("state_dir", "cache"))
+        if not state_dir.is_absolute():
+            state_dir = BASE_DIR / state_dir
+        io_record = settings.get("io_record", "")
+        if io_record and not Path(io_record).is_absolute():
+            io_record = str(BASE_DIR / io_record)
+        profile = overrides.get("profile", settings.get("profile", "swing"))
+        values = {
+            "bot_token": settings.get("bot_token", ""),
+            "chat_id": settings.get("chat_id", ""),
+            "interval": int(settings.get("interval", 900)),
+            "profile": profile,
+            "symbols": tuple(settings.get("selected_coins", [])),
+            "allow_buy": thresholds.get("buy", True),
+            "allow_sell": thresholds.get("sell", True),
+            "paper_enabled": bool(settings.get("paper_enabled", False)),
+            "paper_risk_pct": paper_risk_pct,
+            "paper_start_balance": float(settings.get("paper_start_balance", 10_000)),
+            "paper_snapshot_every": max(1, int(settings.get("paper_snapshot_every", 500))),
+            "paper_mark_interval": max(5, int(settings.get("paper_mark_interval", 60))),
+            "signature": settings.get("signature", "").strip(),
+            "max_concurrency": max(1, int(settings.get("max_concurrency", 8))),
+            "telegram_queue_size": int(settings.get("telegram_queue_size", 100)),
+            "telegram_coalesce": bool(settings.get("telegram_coalesce", False)),
+            "telegram_base_url": settings.get("telegram_base_url", ""),
+            "dominance_ttl": float(settings.get("dominance_ttl", 300)),
+            "chart_format": settings.get("chart_format", "png"),
+            "chart_dpi": int(settings.get("chart_dpi", 100)),
+            "chart_size": tuple(settings.get("chart_size", [12, 16])),
+            "chart_workers": int(settings.get("chart_workers", 2)),
+            "chart_executor": settings.get("chart_executor", "thread"),
+            "state_dir": str(state_dir),
+            "candle_store": bool(settings.get("candle_store", True)),
+            "mtf_timeframes": tuple(settings.get("mtf_timeframes", [])),
+            "mtf_bars": max(40, int(settings.get("mtf_bars", 100))),
+            "metrics_port": int(settings.get("metrics_port", 0)),
+            "metrics_per_symbol": bool(settings.get("metrics_per_symbol", True)),
+            "exchange_weight_per_minute": float(settings.get("exchange_weight_per_minute", 6000)),
+            "exchange_weight_safety": min(1.0, max(0.1, float(settings.get("exchange_weight_safety", 0.8)))),
+            "screener_enabled": bool(settings.get("screener_enabled", False)),
+            "screener_top_n": max(1, int(settings.get("screener_top_n", 20))),
+            "screener_quote": str(settings.get("screener_quote", "USDT")).upper(),
+            "screener_min_volume": float(settings.get("screener_min_volume", 1_000_000)),
+            "screener_interval": max(30, int(settings.get("screener_interval", 300))),
+            "suppress_unchanged": bool(settings.get("suppress_unchanged", True)),
+            "signal_heartbeat_minutes": max(0.0, float(settings.get("signal_heartbeat_minutes", 60))),
+            "signal_risk_bucket": max(1, int(settings.get("signal_risk_bucket", 10))),
+            "signal_price_step_pct": max(0.0, float(settings.get("signal_price_step_pct", 0.5))),
+            "shard_workers": max(0, int(settings.get("shard_workers", 0))),
+            "stream_enabled": bool(settings.get("stream_enabled", False)),
+            "stream_url": settings.get("stream_url") or DEFAULT_STREAM_URL,
+            "io_record": io_record,
+            "strategy": strategy_for_profile(settings, profile),
+        }
+        known = {field.name for field in fields(cls)}
+        values.update({key: value for key, value in overrides.items() if key in known})
+        return cls(**values)
+
+
+class BotEngine:
+    """
+    The scan engine without any Qt dependency: scheduling, market data,
+    indicators, signals, paper trading, charts and Telegram delivery. All
+    coroutines run on one event loop; settings arrive as immutable snapshots.
+    """
+
+    def __init__(self, settings: EngineSettings, ads=None, ads_path: Path = ADS_PATH, tap=None):
+        self.settings = settings
+        self.ads = ads if ads is not None else []
+        self.ads_path = ads_path
+        # Exchange, CoinGecko and Telegram I/O go through the tap when set:
+        # replay.IORecorder (io_record) or replay.IOReplayer.
+        self.tap = tap
+        # One engine per state_dir; the lock is held until close().
+        self.state_lock = lock_state_dir(Path(settings.state_dir))
+        if tap is None and settings.io_record:
+            from replay import IORecorder
+
+            self.tap = IORecorder(settings.io_record, settings)
+        self.exchanges = None
+        self.exchange = None
+        self.candles = None
+        self.indicator_engines = {}
+        # Multi-timeframe mode: per (symbol, base timeframe) aggregator and
+        # per (symbol, higher timeframe) indicator state.
+        self.aggregators = {}
+        self.mtf_engines = {}
+        self.active_profile = settings.profile
+        if self.tap is not None:
+            self.dominance = DominanceCache(ttl=settings.dominance_ttl, tap=self.tap)
+        else:
+            self.dominance = shared_dominance_cache(settings.dominance_ttl)
+        self.charts = ChartPool(
+            workers=settings.chart_workers,
+            executor=settings.chart_executor,
+            size=settings.chart_size,
+            dpi=settings.chart_dpi,
+            fmt=settings.chart_format,
+        )
+        self.sender = None
+        # Called (from the engine's loop thread) whenever paper cash/PnL change.
+        self.on_paper_update = None
+        # Survives restarts; thread-safe, so the GUI reads it directly.
+        self.ledger = PaperLedger(
+            Path(settings.state_dir) / "paper",
+            settings.paper_start_balance,
+            snapshot_every=settings.paper_snapshot_every,
+        )
+        # Latest mark-to-market of the open paper positions (None until the first one).
+        self.paper_marks = None
+        self.paper_marked_at = 0.0
+        # Sharded mode: indicator state and chart rendering live in worker
+        # processes; this process keeps fetching, scheduling and sending.
+        self.shards = None
+        if settings.shard_workers:
+            from sharding import ShardPool
+
+            self.shards = ShardPool(settings.shard_workers, window=max(limit for _, limit in PROFILE_PARAMS.values()))
+        # Streaming mode: closed-bar events queue pairs for analysis
+        # ({symbol: monotonic receive time}) instead of the timer heap.
+        self.stream = None
+        self.stream_ready = {}
+        self.wakeup = None
+        # Last sent fingerprint per pair; unchanged signals are not re-sent.
+        self.signal_states = SignalStateCache(Path(settings.state_dir) / "signals.json")
+        # Screener mode: the pairs picked by the last market-wide ranking.
+        self.screened = ()
+        self.screen_ranking = []
+        self.screened_at = None
+        # Stage latencies and counters; optionally served at /metrics.
+        self.metrics = Metrics(per_symbol=settings.metrics_per_symbol)
+        self.metrics_server = None
+        if settings.metrics_port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, settings.metrics_port).start()
+            except OSError as exc:
+                print(f"Metrics endpoint on port {settings.metrics_port} failed: {exc}")
+
+    def apply_settings(self, settings: EngineSettings):
+        # A single reference swap; the loop picks it up on its next read.
+        self.settings = settings
+
+    def format_with_signature(self, text: str):
+        signature = self.settings.signature
+        if signature:
+            return f"{text}\n\n{signature}"
+        return text
+
+    async def ensure_exchange(self):
+        if self.exchange is None:
+            settings = self.settings
+            if self.exchanges is None:
+                self.exchanges = ExchangePool(
+                    asyncio.get_running_loop(),
+                    weight_per_minute=settings.exchange_weight_per_minute,
+                    safety=settings.exchange_weight_safety,
+                    metrics=self.metrics,
+                    tap=self.tap,
+                )
+            self.exchange = self.exchanges.get(settings.exchange_id)
+            store = None
+            if settings.candle_store:
+                store = CandleStore(Path(settings.state_dir) / "candles", settings.exchange_id)
+            self.candles = CandleCache(self.exchange, store)
+        return self.exchange
+
+    async def refresh_markets(self):
+        await self.ensure_exchange()
+        # The user is waiting for the pair list: ahead of background scans.
+        exchange = self.exchanges.get(self.settings.exchange_id, interactive=True)
+        markets = await exchange.load_markets()
+        return list(markets.keys())
+
+    async def fetch_balance(self, api_key: str, api_secret: str):
+        await self.ensure_exchange()
+        exchange = self.exchanges.set_credentials(api_key, api_secret, self.settings.exchange_id)
+        return await exchange.fetch_balance()
+
+    async def fetch_portfolio(self, api_key: str, api_secret: str, quote: str = "USDT"):
+        """
+        Non-zero balances valued in ``quote``: one balance request plus one
+        tickers request for every pricing pair at once, on the pooled client.
+        """
+        await self.ensure_exchange()
+        exchange = self.exchanges.set_credentials(api_key, api_secret, self.settings.exchange_id)
+        balances = await exchange.fetch_balance()
+        markets = exchange.markets or await exchange.load_markets()
+        assets = [asset for asset, total in (balances.get("total") or {}).items() if total and total > 0]
+        pairs = valuation_pairs(assets, quote, markets)
+        tickers = {}
+        if pairs:
+            try:
+                tickers = await exchange.fetch_tickers(sorted(symbol for symbol, _ in pairs.values()))
+            except Exception as exc:
+                # Balances are still worth showing without prices.
+                self.metrics.increment("errors_total", stage="portfolio")
+                print(f"Portfolio valuation failed: {exc}")
+        return value_balances(balances, tickers, pairs, quote)
+
+    async def close(self):
+        if self.stream is not None:
+            await self.stream.close()
+        if self.sender is not None:
+            await self.sender.stop()
+        if self.exchanges is not None:
+            await self.exchanges.close()
+        self.charts.shutdown()
+        if self.shards is not None:
+            self.shards.shutdown()
+        self.ledger.close()
+        self.signal_states.save()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.tap is not None:
+            self.tap.close()
+        self.state_lock.close()
+
+    def _sync_profile(self):
+        if self.settings.profile != self.active_profile:
+            self.active_profile = self.settings.profile
+            if self.candles is not None:
+                self.candles.invalidate()
+            self.indicator_engines.clear()
+            if self.shards is not None:
+                self.shards.reset()
+            self.aggregators.clear()
+            self.mtf_engines.clear()
+
+    async def run(self):
+        await self.ensure_exchange()
+        # Min-heap of (next_due, symbol): every pair keeps its own cadence from
+        # compute_dynamic_interval instead of delaying the pairs queued after it.
+        schedule = []
+        scheduled = set()
+        in_flight = set()
+        streaming = set()
+        concurrency = self.settings.max_concurrency
+        semaphore = asyncio.Semaphore(concurrency)
+        self.wakeup = asyncio.Event()
+        while True:
+            self.wakeup.clear()
+            dispatching = False
+            try:
+                await self.dispatch_ads_if_due()
+                self._sync_profile()
+                settings = self.settings
+                if settings.max_concurrency != concurrency:
+                    # Scans already running release the old semaphore; new
+                    # ones queue on the new limit.
+                    concurrency = settings.max_concurrency
+                    semaphore = asyncio.Semaphore(concurrency)
+                now = time.monotonic()
+                if settings.paper_enabled and now - self.paper_marked_at >= settings.paper_mark_interval:
+                    self.paper_marked_at = now
+                    task = asyncio.create_task(self.mark_paper_positions())
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                if settings.screener_enabled:
+                    if self.screened_at is None or now - self.screened_at >= settings.screener_interval:
+                        self.screened_at = now
+                        await self.screen_market(settings)
+                    selected = set(self.screened)
+                else:
+                    selected = set(settings.symbols)
+                self.signal_states.save()
+                await self._sync_stream(settings, selected)
+                if self.stream is not None:
+                    for symbol, received in list(self.stream_ready.items()):
+                        if symbol in streaming:
+                            continue  # still analysing the previous bar
+                        del self.stream_ready[symbol]
+                        if symbol not in selected or not settings.auto_messages:
+                            continue
+                        streaming.add(symbol)
+                        task = asyncio.create_task(self.scan_streamed(symbol, semaphore, received))
+                        in_flight.add(task)
+                        task.add_done_callback(in_flight.discard)
+                        task.add_done_callback(lambda _, symbol=symbol: streaming.discard(symbol))
+                    # Pairs go back on the timer heap only if streaming is switched off.
+                    scheduled.clear()
+                    schedule.clear()
+                else:
+                    for symbol in selected - scheduled:
+                        heapq.heappush(schedule, (now, symbol))
+                        scheduled.add(symbol)
+                dispatching = settings.auto_messages and self.stream is None
+                if dispatching:
+                    while schedule and schedule[0][0] <= now:
+                        _, symbol = heapq.heappop(schedule)
+                        if symbol not in selected:
+                            scheduled.discard(symbol)
+                            continue
+                        task = asyncio.create_task(
+                            self.scan_symbol(symbol, semaphore, schedule)
+                        )
+                        in_flight.add(task)
+                        task.add_done_callback(in_flight.discard)
+            except Exception as exc:
+                dispatching = False
+                self.metrics.increment("errors_total", stage="loop")
+                print(f"Bot loop error: {exc}")
+            # Sleep until the next pair is due; with nothing to dispatch (auto
+            # messages off, streaming, or a loop error) recheck every second.
+            delay = schedule[0][0] - time.monotonic() if dispatching and schedule else 1
+            try:
+                # A closed bar from the stream ends the wait early.
+                await asyncio.wait_for(self.wakeup.wait(), min(1, max(0.05, delay)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _sync_stream(self, settings: EngineSettings, selected):
+        timeframe = self.get_profile_params(settings.profile)[0]
+        if self.stream is not None and (
+            not settings.stream_enabled or (self.stream.url, self.stream.timeframe) != (settings.stream_url, timeframe)
+        ):
+            await self.stream.close()
+            self.stream = None
+            self.stream_ready.clear()
+        if not settings.stream_enabled:
+            return
+        if self.stream is None:
+            self.stream = KlineStream(
+                settings.stream_url,
+                timeframe,
+                self._on_bar_close,
+                on_connect=self._on_stream_connect,
+                metrics=self.metrics,
+            )
+        self.stream.update(selected)
+
+    def _on_bar_close(self, symbol, timeframe, candle):
+        # The cached window absorbs the bar, so the analysis it triggers
+        # needs no REST call; on a gap the fetch backfills over REST.
+        if self.candles is not None:
+            self.candles.ingest(symbol, timeframe, candle)
+        self.metrics.increment("stream_bars_total")
+        self.stream_ready.setdefault(symbol, time.monotonic())
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def _on_stream_connect(self, symbols):
+        # Bars may have closed while disconnected (or before the first
+        # connect): analyse every pair now, fetching what is missing.
+        now = time.monotonic()
+        for symbol in symbols:
+            self.stream_ready.setdefault(symbol, now)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def screen_market(self, settings: EngineSettings | None = None):
+        """
+        Rank every quote pair from one bulk tickers request and keep the top N
+        for the deep scan. A failed request keeps the previous pick.
+        """
+        settings = settings or self.settings
+        try:
+            exchange = await self.ensure_exchange()
+            with self.metrics.timer("screen"):
+                tickers = await exchange.fetch_tickers()
+        except Exception as exc:
+            print(f"Screener tickers fetch failed: {exc}")
+            return self.screened
+        ranking = rank_tickers(tickers, settings.screener_quote, settings.screener_min_volume)
+        self.screen_ranking = ranking
+        self.screened = tuple(symbol for symbol, *_ in ranking[: settings.screener_top_n])
+        self.metrics.increment("screens_total")
+        print(
+            f"Screener: {len(ranking)} {settings.screener_quote} pairs ranked, "
+            f"scanning {', '.join(self.screened) or 'none'}"
+        )
+        return self.screened
+
+    async def scan_symbol(self, symbol, semaphore, schedule):
+        symbol_interval = None
+        try:
+            async with semaphore:
+                with self.metrics.timer("scan", symbol):
+                    symbol_interval = await self.analyze_and_send_message(symbol)
+            self.metrics.increment("scans_total")
+        finally:
+            if schedule is not None:
+                next_due = time.monotonic() + (symbol_interval or self.settings.interval)
+                heapq.heappush(schedule, (next_due, symbol))
+
+    async def scan_streamed(self, symbol, semaphore, received):
+        """Analyse a pair whose bar just closed; "stream" times receipt to done."""
+        try:
+            await self.scan_symbol(symbol, semaphore, None)
+        finally:
+            self.metrics.observe("stream", time.monotonic() - received, symbol)
+
+    async def dispatch_ads_if_due(self):
+        current_time = datetime.now()
+        for ad in self.ads:
+            if not ad.get("active"):
+                continue
+            schedule = ad.get("schedule")
+            if not schedule:
+                continue
+            ad_time = datetime.strptime(
+                f"{schedule['date']} {schedule['time']}", "%Y-%m-%d %H:%M:%S"
+            )
+            if current_time >= ad_time:
+                # Deactivate before awaiting so the timer and the bot loop
+                # never both send the same campaign.
+                ad["active"] = False
+                await self.send_ad(ad)
+                save_ads(self.ads, self.ads_path)
+
+    async def get_sender(self):
+        # Created on the engine loop so the queue and worker task live there;
+        # a token or API URL change swaps in a fresh sender.
+        settings = self.settings
+        previous = self.sender
+        target = (settings.bot_token, settings.telegram_base_url)
+        if previous is None or (previous.token, previous.base_url) != target:
+            from telegram_sender import TelegramSender
+
+            self.sender = TelegramSender(
+                settings.bot_token,
+                queue_size=settings.telegram_queue_size,
+                coalesce=settings.telegram_coalesce,
+                metrics=self.metrics,
+                base_url=settings.telegram_base_url or None,
+                request=self.tap.telegram_request() if self.tap is not None else None,
+            )
+            self.sender.start()
+            if previous is not None:
+                await previous.stop()
+        return self.sender
+
+    async def send_ad(self, ad):
+        try:
+            message = f"{ad['title']}\n{ad['description']}\n{ad['link']}"
+            message = self.format_with_signature(message)
+            sender = await self.get_sender()
+            image_path = ad.get("image_path")
+            if image_path:
+                with open(image_path, "rb") as img:
+                    sender.send_photo(self.settings.chat_id, img.read(), message)
+            else:
+                sender.send_text(self.settings.chat_id, message)
+        except Exception as exc:
+            print(f"Ad send failed: {exc}")
+
+    async def analyze_and_send_message(self, symbol):
+        if not self.exchange:
+            print("Exchange not initialized.")
+            return None
+        settings = self.settings
+        metrics = self.metrics
+        try:
+            timeframe, limit = self.get_profile_params(settings.profile)
+            with metrics.timer("fetch", symbol):
+                ohlcv = await self.candles.fetch(symbol, timeframe, limit)
+            if not ohlcv:
+                metrics.increment("skipped_total", reason="no_data")
+                print(f"No data returned for {symbol}")
+                return None
+
+            params = settings.strategy
+            with metrics.timer("indicators", symbol):
+                if self.shards is not None:
+                    engine = None
+                    values = await self.shards.analyze(
+                        symbol,
+                        ohlcv,
+                        limit,
+                        params.bb_length,
+                        params.bb_std,
+                        keep=self.screened if settings.screener_enabled else settings.symbols,
+                    )
+                else:
+                    engine = self.indicator_engines.get((symbol, timeframe))
+                    if engine is None or (engine.bb_length, engine.bb_std) != (params.bb_length, params.bb_std):
+                        engine = IndicatorEngine(window=limit, bb_length=params.bb_length, bb_std=params.bb_std)
+                        self.indicator_engines[(symbol, timeframe)] = engine
+                    values = engine.sync(ohlcv)
+            last_close = values["close"]
+            rsi_value = values["rsi"]
+            if math.isnan(rsi_value):
+                metrics.increment("skipped_total", reason="rsi_nan")
+                print(f"RSI calculation failed for {symbol}")
+                return None
+
+            with metrics.timer("dominance", symbol):
+                dominance = await self.fetch_dominance(symbol) or 0
+            atr_value = values["atr"]
+            atr_pct = (atr_value / last_close) if last_close else 0
+
+            macd_line = values["macd"]
+            macd_signal = values["macd_signal"]
+            stoch_k_val = values["stoch_k"]
+            stoch_d_val = values["stoch_d"]
+            aroon_up_val = values["aroon_up"]
+            aroon_down_val = values["aroon_down"]
+            bb_lower = values["bb_lower"]
+            bb_middle = values["bb_middle"]
+            bb_upper = values["bb_upper"]
+            obv_val = values["obv"]
+            psar_val = values["psar_long"]
+
+            frames = None
+            if settings.mtf_timeframes:
+                with metrics.timer("mtf", symbol):
+                    frames = await self.multi_timeframe_values(symbol, timeframe, ohlcv, settings)
+            with metrics.timer("votes", symbol):
+                votes, status = self.compute_indicator_votes(values, last_close, settings)
+                timeframe_line = ""
+                if frames:
+                    votes, status, timeframe_line = self.combine_timeframe_votes(
+                        timeframe, votes, status, frames, settings
+                    )
+                risk_score = self.compute_risk_score(atr_pct, votes)
+                tp, sl = self.compute_tp_sl(status, last_close, atr_value, params)
+                dynamic_interval = self.compute_dynamic_interval(atr_pct, settings.interval, params)
+
+            volume_24h = int(sum(candle[5] for candle in ohlcv))
+            paper_note = self.apply_paper_trading(status, symbol, last_close, atr_value, settings)
+
+            fingerprint = signal_fingerprint(
+                settings.profile,
+                status,
+                votes,
+                risk_score,
+                tp,
+                sl,
+                settings.signal_risk_bucket,
+                settings.signal_price_step_pct,
+            )
+            states = self.signal_states
+            states.heartbeat = settings.signal_heartbeat_minutes * 60
+            if settings.suppress_unchanged and not paper_note and not states.should_send(symbol, fingerprint):
+                # Same signal as last sent: skip the chart render and the send.
+                metrics.increment("suppressed_total")
+                return dynamic_interval
+
+            message_lines = [
+                f"*{symbol}* | Profile: *{settings.profile}* | Status: *{status}*",
+                f"RSI: {rsi_value:.2f} | Risk: {risk_score}/100 | ATR%: {atr_pct*100:.2f}",
+                f"Votes (buy/sell/neutral): {votes['buy']} / {votes['sell']} / {votes['neutral']}",
+                *([timeframe_line] if timeframe_line else []),
+                f"MACD: {macd_line:.2f} | Signal: {macd_signal:.2f}",
+                f"Stoch %K/%D: {stoch_k_val:.2f}/{stoch_d_val:.2f}",
+                f"Aroon Up/Down: {aroon_up_val:.2f}/{aroon_down_val:.2f}",
+                f"BB L/M/U: {bb_lower:.2f}/{bb_middle:.2f}/{bb_upper:.2f}",
+                f"OBV: {obv_val:.2f} | ATR: {atr_value:.2f} | Dominance: {dominance:.2f}%",
+                f"24h Vol (bars sum): {volume_24h}",
+                f"PSAR: {psar_val:.4f} | TP: {tp:.4f} | SL: {sl:.4f}",
+                f"Next check (dynamic): ~{dynamic_interval}s",
+            ]
+            if paper_note:
+                message_lines.append(paper_note)
+
+            message = self.format_with_signature("\n".join(message_lines))
+            # Sharded: the owning worker renders from its own history.
+            history = engine.series(values, len(ohlcv)) if engine is not None else None
+            if await self.send_telegram_message_with_graph(symbol, message, history):
+                # Only a queued send counts; a dropped one is retried next scan.
+                states.record(symbol, fingerprint)
+            return dynamic_interval
+        except Exception as exc:
+            metrics.increment("skipped_total", reason="error")
+            print(f"Error analyzing {symbol}: {exc}")
+            return None
+
+    async def send_telegram_message_with_graph(self, symbol, message, history):
+        with self.metrics.timer("chart", symbol):
+            if history is None:
+                image = await self.shards.render(symbol, self.charts.options)
+            else:
+                image = await self.charts.render(symbol, history)
+        sender = await self.get_sender()
+        return sender.send_chart(self.settings.chat_id, image, message)
+
+    def compute_indicator_votes(self, values, last_close, settings: EngineSettings | None = None):
+        settings = settings or self.settings
+        params = settings.strategy
+        votes = {"buy": 0, "sell": 0, "neutral": 0}
+        # Indicators that are still warming up are NaN; every comparison below
+        # is then False, so they fall through to a neutral vote.
+
+        # RSI vote
+        rsi_value = values["rsi"]
+        if rsi_value < params.rsi_buy:
+            votes["buy"] += 1
+        elif rsi_value > params.rsi_sell:
+            votes["sell"] += 1
+        else:
+            votes["neutral"] += 1
+
+        # MACD vote
+        macd_diff = values["macd"] - values["macd_signal"]
+        if macd_diff > 0:
+            votes["buy"] += 1
+        elif macd_diff < 0:
+            votes["sell"] += 1
+        else:
+            votes["neutral"] += 1
+
+        # Stochastic vote
+        stoch_k = values["stoch_k"]
+        if stoch_k < params.stoch_buy:
+            votes["buy"] += 1
+        elif stoch_k > params.stoch_sell:
+            votes["sell"] += 1
+        else:
+            votes["neutral"] += 1
+
+        # Aroon vote
+        aroon_up = values["aroon_up"]
+        aroon_down = values["aroon_down"]
+        if aroon_up > params.aroon_strong and aroon_down < params.aroon_weak:
+            votes["buy"] += 1
+        elif aroon_down > params.aroon_strong and aroon_up < params.aroon_weak:
+            votes["sell"] += 1
+        else:
+            votes["neutral"] += 1
+
+        # Bollinger band vote
+        if last_close < values["bb_lower"]:
+            votes["buy"] += 1
+        elif last_close > values["bb_upper"]:
+            votes["sell"] += 1
+        else:
+            votes["neutral"] += 1
+
+        return votes, self.status_from_votes(votes, settings)
+
+    def status_from_votes(self, votes, settings: EngineSettings | None = None):
+        settings = settings or self.settings
+        # Status from majority
+        if votes["buy"] > votes["sell"] and settings.allow_buy:
+            return "Buy"
+        if votes["sell"] > votes["buy"] and settings.allow_sell:
+            return "Sell"
+        return "Neutral"
+
+    async def multi_timeframe_values(self, symbol, base_timeframe, ohlcv, settings: EngineSettings):
+        """
+        Indicator values for every configured higher timeframe, built from the
+        base candles already fetched for this scan. Only the first call per
+        symbol downloads extra (base) history to fill the higher windows.
+        """
+        key = (symbol, base_timeframe)
+        aggregator = self.aggregators.get(key)
+        if aggregator is not None and (
+            aggregator.bars_kept != settings.mtf_bars
+            or not aggregator.update(ohlcv)
+        ):
+            aggregator = None
+        if aggregator is None:
+            aggregator = TimeframeAggregator(base_timeframe, settings.mtf_timeframes, settings.mtf_bars)
+            if not aggregator.timeframes:
+                return {}
+            history = await self.candles.fetch_history(
+                symbol, base_timeframe, aggregator.base_bars_needed
+            )
+            aggregator.update(history)
+            aggregator.update(ohlcv)
+            self.aggregators[key] = aggregator
+
+        params = settings.strategy
+        frames = {}
+        for timeframe in aggregator.timeframes:
+            bars = aggregator.bars(timeframe)
+            if len(bars) < 2:
+                continue
+            engine = self.mtf_engines.get((symbol, timeframe))
+            if engine is None or (engine.bb_length, engine.bb_std) != (params.bb_length, params.bb_std):
+                engine = IndicatorEngine(
+                    window=settings.mtf_bars, bb_length=params.bb_length, bb_std=params.bb_std
+                )
+                self.mtf_engines[(symbol, timeframe)] = engine
+            frames[timeframe] = engine.sync(bars)
+        return frames
+
+    def combine_timeframe_votes(self, base_timeframe, votes, status, frames, settings: EngineSettings):
+        """Sum the votes of every timeframe and take the majority over all of them."""
+        combined = dict(votes)
+        statuses = [f"{base_timeframe} {status}"]
+        for timeframe, values in frames.items():
+            frame_votes, frame_status = self.compute_indicator_votes(values, values["close"], settings)
+            for side in combined:
+                combined[side] += frame_votes[side]
+            statuses.append(f"{timeframe} {frame_status}")
+        line = "Timeframes: " + " | ".join(statuses)
+        return combined, self.status_from_votes(combined, settings), line
+
+    def compute_risk_score(self, atr_pct, votes):
+        vote_spread = abs(votes["buy"] - votes["sell"])
+        conflict_penalty = 10 if vote_spread <= 1 else 0
+        atr_component = min(70, atr_pct * 3000)  # scales ATR% into 0-70-ish
+        base = 30 + atr_component + conflict_penalty
+        return int(min(100, max(0, base)))
+
+    def compute_tp_sl(self, status, last_close, atr_value, params: StrategyParams | None = None):
+        params = params or self.settings.strategy
+        if not last_close or not atr_value:
+            return last_close, last_close
+        if status == "Buy":
+            tp = last_close + params.tp_mult * atr_value
+            sl = last_close - params.sl_mult * atr_value
+        elif status == "Sell":
+            tp = last_close - params.tp_mult * atr_value
+            sl = last_close + params.sl_mult * atr_value
+        else:
+            tp = last_close
+            sl = last_close
+        return tp, sl
+
+    def compute_dynamic_interval(self, atr_pct, interval: int | None = None, params: StrategyParams | None = None):
+        interval = self.settings.interval if interval is None else interval
+        params = params or self.settings.strategy
+        factor = 1.0
+        if atr_pct > params.interval_high_atr:
+            factor = params.interval_high_factor
+        elif atr_pct > params.interval_mid_atr:
+            factor = params.interval_mid_factor
+        elif atr_pct < params.interval_low_atr:
+            factor = params.interval_low_factor
+        return max(5, int(interval * factor))
+
+    def get_profile_params(self, profile: str | None = None):
+        return PROFILE_PARAMS.get(profile or self.settings.profile, PROFILE_PARAMS["swing"])
+
+    @property
+    def paper_cash(self):
+        return self.ledger.cash
+
+    @property
+    def paper_pnl(self):
+        return self.ledger.pnl
+
+    @property
+    def paper_positions(self):
+        return self.ledger.positions
+
+    def reset_paper_state(self):
+        self.ledger.reset(self.settings.paper_start_balance)
+        self.paper_marks = None
+        if self.on_paper_update is not None:
+            self.on_paper_update()
+
+    async def mark_paper_positions(self):
+        """Value every open paper position with one tickers request."""
+        symbols = sorted(self.ledger.positions)
+        if not symbols:
+            self.paper_marks = self.ledger.mark_to_market({})
+        else:
+            try:
+                exchange = await self.ensure_exchange()
+                tickers = await exchange.fetch_tickers(symbols)
+            except Exception as exc:
+                self.metrics.increment("errors_total", stage="paper_mark")
+                print(f"Paper mark-to-market error: {exc}")
+                return
+            prices = {symbol: ticker.get("last") for symbol, ticker in tickers.items()}
+            self.paper_marks = self.ledger.mark_to_market(prices)
+        if self.on_paper_update is not None:
+            self.on_paper_update()
+
+    def apply_paper_trading(self, status, symbol, last_price, atr_value, settings: EngineSettings | None = None):
+        settings = settings or self.settings
+        if not settings.paper_enabled:
+            return ""
+        if status not in {"Buy", "Sell"}:
+            return ""
+        risk_pct = max(0.1, min(50.0, settings.paper_risk_pct))
+        note = ""
+        ledger = self.ledger
+        if status == "Buy" and not ledger.has_position(symbol):
+            allocation = ledger.cash * (risk_pct / 100)
+            if allocation <= 0:
+                return ""
+            qty = allocation / last_price
+            if not ledger.open_position(symbol, qty, last_price):
+                return ""
+            note = f"[paper] opened {symbol}: qty {qty:.6f} @ {last_price:.4f}"
+        elif status == "Sell":
+            pnl = ledger.close_position(symbol, last_price)
+            if pnl is None:
+                return ""
+            note = f"[paper] closed {symbol}: pnl {pnl:.2f} | cash {ledger.cash:.2f}"
+        if self.on_paper_update is not None:
+            self.on_paper_update()
+        return note
+
+    async def fetch_dominance(self, symbol):
+        try:
+            return await self.dominance.lookup(symbol, self.settings.dominance_ttl)
+        except Exception as exc:
+            self.metrics.increment("errors_total", stage="dominance")
+            print(f"Dominance fetch error for {symbol}: {exc}")
+        return None
+
+    async def serve(self):
+        """Headless entry: run until SIGINT/SIGTERM, then close connections."""
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # e.g. Windows; KeyboardInterrupt still ends asyncio.run
+        runner = asyncio.create_task(self.run())
+        try:
+            await stop.wait()
+        finally:
+            runner.cancel()
+            await self.close()
+
+
+def run_headless(argv=None):
+    parser = argparse.ArgumentParser(description="Run the scan engine without the GUI.")
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--config", default=str(USER_PATH), help="settings file (user.json)")
+    parser.add_argument("--ads", default=str(ADS_PATH), help="ads schedule file (ads.json)")
+    args = parser.parse_args(argv)
+
+    settings = EngineSettings.from_dict(load_settings(Path(args.config)))
+    if not settings.symbols and not settings.screener_enabled:
+        print("No pairs configured: set selected_coins (or screener_enabled) in the config file.")
+        return 1
+    if not settings.bot_token or not settings.chat_id:
+        print("Fill in bot_token and chat_id in the config file.")
+        return 1
+
+    ads_path = Path(args.ads)
+    try:
+        engine = BotEngine(settings, load_ads(ads_path), ads_path)
+    except RuntimeError as exc:
+        print(exc)
+        return 1
+    if settings.screener_enabled:
+        print(f"Headless engine: screener top {settings.screener_top_n}, profile {settings.profile}")
+    else:
+        print(f"Headless engine: {len(settings.symbols)} pairs, profile {settings.profile}")
+    try:
+        asyncio.run(engine.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_headless(sys.argv[1:]))
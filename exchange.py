@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+# Request weights of the calls the bot makes (Binance spot values; other
+# exchanges are close enough, and used-weight headers correct the estimate).
+REQUEST_WEIGHTS = {
+    "fetch_ohlcv": 2,
+    "fetch_ticker": 2,
+    "fetch_balance": 20,
+    "load_markets": 20,
+}
+# Response headers reporting the weight used in the current minute.
+USED_WEIGHT_HEADERS = ("x-mbx-used-weight-1m", "x-mbx-used-weight")
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+def request_weight(method: str, args, kwargs):
+    if method == "fetch_tickers":
+        symbols = args[0] if args else kwargs.get("symbols")
+        if not symbols or len(symbols) > 100:
+            return 80
+        return 2 if len(symbols) <= 20 else 40
+    return REQUEST_WEIGHTS.get(method, 1)
+
+
+class EventLoopThread:
+    """
+    Background asyncio loop shared by the bot and the GUI. Anything that talks
+    to the network is scheduled here so sessions and sockets stay on one loop.
+    """
+
+    def __init__(self, name: str = "bot-io"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        if not self.thread.is_alive():
+            self.thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine from any thread; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """Run a coroutine on the loop and block the caller until it finishes."""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+class RequestGovernor:
+    """
+    Weight-based token bucket shared by every call to one exchange. Callers
+    wait in priority order (interactive before background scans), the bucket
+    is trimmed to what the exchange reports as used, and 429/418 responses
+    pause everyone for Retry-After or an exponential backoff.
+    """
+
+    def __init__(
+        self,
+        weight_per_minute: float = 6000,
+        safety: float = 0.8,
+        max_retries: int = 3,
+        metrics=None,
+    ):
+        self.limit = float(weight_per_minute)
+        self.capacity = self.limit * safety
+        self.rate = self.capacity / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.backoff = 0.0
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.waiting = []
+        self._sequence = itertools.count()
+        self._changed = None
+        self.used_weight = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def acquire(self, weight: float, priority: int = BACKGROUND):
+        weight = min(weight, self.capacity)
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(self.waiting, ticket)
+        try:
+            while True:
+                now = self._refill()
+                if self.waiting[0] == ticket:
+                    if now < self.paused_until:
+                        delay = self.paused_until - now
+                    elif self.tokens >= weight:
+                        self.tokens -= weight
+                        return
+                    else:
+                        delay = (weight - self.tokens) / self.rate
+                else:
+                    # Not our turn: sleep until the queue head changes.
+                    delay = None
+                if self._changed is None:
+                    self._changed = asyncio.Event()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.waiting.remove(ticket)
+            heapq.heapify(self.waiting)
+            self._notify()
+
+    def observe_headers(self, headers):
+        """Trust the exchange's used-weight count over the local estimate."""
+        if not headers:
+            return
+        for name in USED_WEIGHT_HEADERS:
+            value = headers.get(name) or headers.get(name.upper()) or headers.get(name.title())
+            if value is None:
+                continue
+            try:
+                used = float(value)
+            except ValueError:
+                return
+            self.used_weight = used
+            self._refill()
+            self.tokens = min(self.tokens, max(0.0, self.capacity - used))
+            return
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self._notify()
+
+    def _retry_after(self, headers):
+        value = (headers or {}).get("Retry-After") or (headers or {}).get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    async def call(self, client, method: str, args, kwargs, priority: int = BACKGROUND):
+        from ccxt.base.errors import DDoSProtection, RateLimitExceeded
+
+        weight = request_weight(method, args, kwargs)
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(weight, priority)
+            try:
+                result = await getattr(client, method)(*args, **kwargs)
+            except (RateLimitExceeded, DDoSProtection) as exc:
+                headers = getattr(client, "last_response_headers", None)
+                self.backoff = min(max(self.backoff * 2, 2.0), 120.0)
+                delay = self._retry_after(headers) or self.backoff
+                self.pause(delay)
+                self.tokens = 0.0
+                if self.metrics is not None:
+                    self.metrics.increment("exchange_backoffs_total", kind=type(exc).__name__)
+                print(f"Exchange rate limit on {method} ({type(exc).__name__}), pausing {delay:.0f}s")
+                if attempt == self.max_retries:
+                    raise
+                if self.metrics is not None:
+                    self.metrics.increment("retries_total", stage="exchange")
+                continue
+            self.backoff = 0.0
+            self.observe_headers(getattr(client, "last_response_headers", None))
+            return result
+
+    def stats(self):
+        self._refill()
+        return {
+            "tokens": self.tokens,
+            "capacity": self.capacity,
+            "used_weight": self.used_weight,
+            "waiting": len(self.waiting),
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+        }
+
+
+class GovernedExchange:
+    """
+    A ccxt client whose request methods go through a RequestGovernor at one
+    priority. Everything else (markets, parse_timeframe, close, ...) is the
+    client's own attribute.
+    """
+
+    GOVERNED = ("fetch_ohlcv", "fetch_ticker", "fetch_tickers", "fetch_balance", "load_markets")
+
+    def __init__(self, client, governor: RequestGovernor, priority: int = BACKGROUND):
+        self.client = client
+        self.governor = governor
+        self.priority = priority
+
+    def __getattr__(self, name):
+        if name in self.GOVERNED:
+            async def governed(*args, **kwargs):
+                return await self.governor.call(self.client, name, args, kwargs, self.priority)
+
+            return governed
+        return getattr(self.client, name)
+
+
+class ExchangePool:
+    """
+    One long-lived ccxt async client per exchange id. The client keeps its
+    aiohttp session (and therefore its keep-alive connections) for the life of
+    the app, so OHLCV, balance and market calls reuse the same sockets. All
+    calls to one exchange share a RequestGovernor; ``interactive`` clients
+    jump the queue ahead of background scans.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        options: dict | None = None,
+        weight_per_minute: float = 6000,
+        safety: float = 0.8,
+        metrics=None,
+        tap=None,
+    ):
+        self.loop = loop
+        self.options = options or {}
+        self.weight_per_minute = weight_per_minute
+        self.safety = safety
+        self.metrics = metrics
+        # Optional IORecorder/IOReplayer wrapped around each client's HTTP calls.
+        self.tap = tap
+        self._clients = {}
+        self.governors = {}
+
+    def get(self, exchange_id: str = "binance", interactive: bool = False):
+        client = self._clients.get(exchange_id)
+        if client is None:
+            # ccxt is slow to import; keep it off the startup path.
+            import ccxt.async_support as ccxt_async
+
+            exchange_class = getattr(ccxt_async, exchange_id)
+            # The governor paces requests; ccxt's own sequential throttle would
+            # only serialize them behind it.
+            config = {"enableRateLimit": False, "asyncio_loop": self.loop}
+            config.update(self.options)
+            client = exchange_class(config)
+            if self.tap is not None:
+                self.tap.wrap_exchange(client)
+            self._clients[exchange_id] = client
+            self.governors[exchange_id] = RequestGovernor(
+                self.weight_per_minute, self.safety, metrics=self.metrics
+            )
+        priority = INTERACTIVE if interactive else BACKGROUND
+        return GovernedExchange(client, self.governors[exchange_id], priority)
+
+    def set_credentials(self, api_key: str, api_secret: str, exchange_id: str = "binance"):
+        exchange = self.get(exchange_id, interactive=True)
+        exchange.client.apiKey = api_key
+        exchange.client.secret = api_secret
+        return exchange
+
+    async def close(self):
+        for exchange_id, client in list(self._clients.items()):
+            try:
+                await client.close()
+            except Exception as exc:
+                print(f"Exchange close failed for {exchange_id}: {exc}")
+        self._clients.clear()
@@ -0,0 +1,243 @@
+import asyncio
+import json
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from market_data import parse_timeframe
+
+
+class FakeExchange:
+    """
+    Offline stand-in for the ccxt async client: serves deterministic synthetic
+    OHLCV per pair (or recorded candles) against a virtual clock, with a fixed
+    per-request latency. Only the methods the engine calls are implemented.
+    """
+
+    id = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        seed: int = 0,
+        now_ms: int = 1_700_000_000_000,
+        history: dict | None = None,
+        warmup_bars: int = 5000,
+        symbols=None,
+    ):
+        self.latency = latency
+        self.seed = seed
+        self.now_ms = now_ms
+        self.warmup_bars = warmup_bars
+        self.requests = 0
+        self._series = {}
+        # Recorded candles: {symbol: (bars, 6) array}; the clock starts at the
+        # last bar so the recorded data plays as "now".
+        self.history = history
+        # Pairs listed by load_markets and a bare fetch_tickers().
+        self.symbols = list(symbols) if symbols else list(history or [])
+        if history:
+            self.now_ms = max(int(candles[-1, 0]) for candles in history.values())
+
+    def parse_timeframe(self, timeframe: str):
+        return parse_timeframe(timeframe) // 1000
+
+    def milliseconds(self):
+        return self.now_ms
+
+    def advance(self, seconds: float):
+        self.now_ms += int(seconds * 1000)
+
+    def _generate(self, rng, first: int, count: int, step: int, price: float):
+        changes = rng.normal(0, 0.004, count)
+        closes = price * np.cumprod(1 + changes)
+        opens = np.concatenate(([price], closes[:-1]))
+        spreads = np.abs(rng.normal(0, 0.002, count)) * opens
+        rows = np.empty((count, 6))
+        rows[:, 0] = first + step * np.arange(count)
+        rows[:, 1] = opens
+        rows[:, 2] = np.maximum(opens, closes) + spreads
+        rows[:, 3] = np.minimum(opens, closes) - spreads
+        rows[:, 4] = closes
+        rows[:, 5] = rng.integers(100, 5000, count)
+        return rows
+
+    def _synthetic(self, symbol: str, timeframe: str):
+        step = parse_timeframe(timeframe)
+        key = (symbol, timeframe)
+        current = self.now_ms // step * step
+        series = self._series.get(key)
+        if series is None:
+            rng = np.random.default_rng(zlib.crc32(f"{symbol}|{timeframe}|{self.seed}".encode()))
+            first = current - (self.warmup_bars - 1) * step
+            rows = self._generate(rng, first, self.warmup_bars, step, 100.0 * (1 + rng.random()))
+            series = self._series[key] = (rng, rows)
+        rng, rows = series
+        last = int(rows[-1, 0])
+        if current > last:
+            count = (current - last) // step
+            rows = np.vstack((rows, self._generate(rng, last + step, count, step, rows[-1, 4])))
+            self._series[key] = (rng, rows)
+        return rows
+
+    def _candles(self, symbol: str, timeframe: str):
+        if self.history is not None:
+            candles = self.history.get(symbol)
+            if candles is None:
+                return np.empty((0, 6))
+        else:
+            candles = self._synthetic(symbol, timeframe)
+        # Nothing after the virtual clock (a replayed feed may run ahead).
+        return candles[: np.searchsorted(candles[:, 0], self.now_ms, side="right")]
+
+    def series(self, symbol: str, timeframe: str, until_ms: int):
+        """Every candle up to ``until_ms`` regardless of the clock, e.g. to replay ahead of it."""
+        now_ms, self.now_ms = self.now_ms, until_ms
+        try:
+            return self._candles(symbol, timeframe)
+        finally:
+            self.now_ms = now_ms
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        rows = self._candles(symbol, timeframe)
+        if since is not None:
+            rows = rows[np.searchsorted(rows[:, 0], since):]
+            rows = rows[:limit] if limit else rows
+        elif limit:
+            rows = rows[-limit:]
+        return [[int(row[0]), *row[1:]] for row in rows.tolist()]
+
+    async def fetch_tickers(self, symbols=None, params=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tickers = {}
+        for symbol in symbols or self.symbols:
+            rows = self._candles(symbol, "1m")
+            if not len(rows):
+                continue
+            day = rows[rows[:, 0] > rows[-1, 0] - 86_400_000]
+            last = day[-1, 4]
+            tickers[symbol] = {
+                "symbol": symbol,
+                "open": day[0, 1],
+                "high": day[:, 2].max(),
+                "low": day[:, 3].min(),
+                "last": last,
+                "percentage": (last / day[0, 1] - 1) * 100,
+                "baseVolume": day[:, 5].sum(),
+                "quoteVolume": (day[:, 5] * day[:, 4]).sum(),
+            }
+        return tickers
+
+    async def load_markets(self, reload=False):
+        return {symbol: {"symbol": symbol} for symbol in self.symbols}
+
+    async def close(self):
+        pass
+
+
+class FakeApiServer:
+    """
+    Local HTTP server answering the Telegram Bot API calls the sender makes
+    (``/bot<token>/sendMessage`` etc.) and CoinGecko's ``/api/v3/global``,
+    after a fixed delay. Point TelegramSender at ``telegram_url`` and
+    DominanceCache at ``dominance_url``.
+    """
+
+    METHOD = re.compile(r"^/bot[^/]+/(\w+)")
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1"):
+        server = self
+        self.latency = latency
+        self.calls = {}
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.message_id = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/api/v3/global"):
+                    server._count("coingecko_global", 0)
+                    self._reply({"data": {"market_cap_percentage": {"btc": 52.1, "eth": 16.8, "sol": 3.2}}})
+                    return
+                self.do_POST()
+
+            def do_POST(self):
+                size = int(self.headers.get("Content-Length") or 0)
+                if size:
+                    self.rfile.read(size)
+                match = server.METHOD.match(self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                method = match.group(1)
+                server._count(method, size)
+                if server.latency:
+                    time.sleep(server.latency)
+                self._reply({"ok": True, "result": server._result(method)})
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-api", daemon=True)
+
+    def _count(self, method, size):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.bytes_received += size
+
+    def _message(self):
+        with self.lock:
+            self.message_id += 1
+            message_id = self.message_id
+        return {"message_id": message_id, "date": int(time.time()), "chat": {"id": 1, "type": "private"}}
+
+    def _result(self, method):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method == "sendMediaGroup":
+            return [self._message()]
+        if method in {"sendMessage", "sendPhoto"}:
+            return self._message()
+        return True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def telegram_url(self):
+        return f"{self.url}/bot"
+
+    @property
+    def dominance_url(self):
+        return f"{self.url}/api/v3/global"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,411 @@
+import math
+from collections import deque
+
+NAN = float("nan")
+
+# Running sums are re-added from the raw window every so often so float drift
+# cannot build up over a long-lived stream.
+RESYNC_EVERY = 1_000
+
+
+def _window_with(window: deque, value):
+    values = list(window)
+    if len(values) == window.maxlen:
+        values = values[1:]
+    values.append(value)
+    return values
+
+
+class Wilder:
+    """Wilder/RMA average: ewm(alpha=1/length, adjust=False, min_periods=length)."""
+
+    __slots__ = ("length", "value", "count")
+
+    def __init__(self, length: int):
+        self.length = length
+        self.value = None
+        self.count = 0
+
+    def step(self, x, commit=True):
+        value = x if self.value is None else self.value + (x - self.value) / self.length
+        count = self.count + 1
+        if commit:
+            self.value = value
+            self.count = count
+        return value if count >= self.length else NAN
+
+
+class Ema:
+    """EMA seeded with the SMA of the first ``length`` values, as pandas_ta does."""
+
+    __slots__ = ("length", "alpha", "value", "count", "seed")
+
+    def __init__(self, length: int):
+        self.length = length
+        self.alpha = 2 / (length + 1)
+        self.value = None
+        self.count = 0
+        self.seed = 0.0
+
+    def step(self, x, commit=True):
+        count = self.count + 1
+        if count < self.length:
+            value = None
+        elif count == self.length:
+            value = (self.seed + x) / self.length
+        else:
+            value = self.value + self.alpha * (x - self.value)
+        if commit:
+            if self.count < self.length:
+                self.seed += x
+            self.count = count
+            self.value = value
+        return NAN if value is None else value
+
+
+class Rolling:
+    """Fixed-length window with running sum / sum of squares (SMA and population std)."""
+
+    __slots__ = ("length", "window", "total", "total_sq", "pushes")
+
+    def __init__(self, length: int):
+        self.length = length
+        self.window = deque(maxlen=length)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.pushes = 0
+
+    def step(self, x, commit=True):
+        full = len(self.window) == self.length
+        old = self.window[0] if full else 0.0
+        total = self.total + x - old
+        total_sq = self.total_sq + x * x - old * old
+        count = len(self.window) if full else len(self.window) + 1
+        if commit:
+            self.window.append(x)
+            self.pushes += 1
+            if self.pushes % RESYNC_EVERY == 0:
+                total = math.fsum(self.window)
+                total_sq = math.fsum(v * v for v in self.window)
+            self.total = total
+            self.total_sq = total_sq
+        if count < self.length:
+            return NAN, NAN
+        mean = total / self.length
+        variance = max(0.0, total_sq / self.length - mean * mean)
+        return mean, variance
+
+
+class Rsi:
+    def __init__(self, length: int = 14):
+        self.gains = Wilder(length)
+        self.losses = Wilder(length)
+        self.prev_close = None
+
+    def update(self, close, commit=True):
+        value = NAN
+        if self.prev_close is not None:
+            diff = close - self.prev_close
+            avg_gain = self.gains.step(max(diff, 0.0), commit)
+            avg_loss = self.losses.step(max(-diff, 0.0), commit)
+            if avg_gain + avg_loss:
+                value = 100 * avg_gain / (avg_gain + avg_loss)
+        if commit:
+            self.prev_close = close
+        return value
+
+
+class Atr:
+    def __init__(self, length: int = 14):
+        self.average = Wilder(length)
+        self.prev_close = None
+
+    def update(self, high, low, close, commit=True):
+        value = NAN
+        if self.prev_close is not None:
+            true_range = max(
+                high - low, abs(high - self.prev_close), abs(low - self.prev_close)
+            )
+            value = self.average.step(true_range, commit)
+        if commit:
+            self.prev_close = close
+        return value
+
+
+class Macd:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = Ema(fast)
+        self.slow = Ema(slow)
+        self.signal = Ema(signal)
+
+    def update(self, close, commit=True):
+        macd = self.fast.step(close, commit) - self.slow.step(close, commit)
+        signal = NAN if math.isnan(macd) else self.signal.step(macd, commit)
+        return macd, signal, macd - signal
+
+
+class Stoch:
+    def __init__(self, k: int = 14, d: int = 3, smooth_k: int = 3):
+        self.highs = deque(maxlen=k)
+        self.lows = deque(maxlen=k)
+        self.smooth_k = Rolling(smooth_k)
+        self.smooth_d = Rolling(d)
+
+    def update(self, high, low, close, commit=True):
+        highs = _window_with(self.highs, high)
+        lows = _window_with(self.lows, low)
+        if commit:
+            self.highs.append(high)
+            self.lows.append(low)
+        if len(highs) < self.highs.maxlen:
+            return NAN, NAN
+        lowest, highest = min(lows), max(highs)
+        span = (highest - lowest) or 2.220446049250313e-16
+        raw = 100 * (close - lowest) / span
+        k_value, _ = self.smooth_k.step(raw, commit)
+        if math.isnan(k_value):
+            return NAN, NAN
+        d_value, _ = self.smooth_d.step(k_value, commit)
+        return k_value, d_value
+
+
+class Aroon:
+    def __init__(self, length: int = 14):
+        self.length = length
+        self.highs = deque(maxlen=length + 1)
+        self.lows = deque(maxlen=length + 1)
+
+    @staticmethod
+    def _periods_since(values, target):
+        last = len(values) - 1
+        for offset in range(len(values)):
+            if values[last - offset] == target:
+                return offset
+        return last
+
+    def update(self, high, low, commit=True):
+        highs = _window_with(self.highs, high)
+        lows = _window_with(self.lows, low)
+        if commit:
+            self.highs.append(high)
+            self.lows.append(low)
+        if len(highs) < self.length + 1:
+            return NAN, NAN
+        up = 100 * (1 - self._periods_since(highs, max(highs)) / self.length)
+        down = 100 * (1 - self._periods_since(lows, min(lows)) / self.length)
+        return up, down
+
+
+class Obv:
+    """OBV over the last ``window`` bars, matching ta.obv on a fixed-size fetch window."""
+
+    def __init__(self, window: int):
+        self.bars = deque(maxlen=max(2, window))
+        self.signed_total = 0.0
+        self.prev_close = None
+
+    def update(self, close, volume, commit=True):
+        if self.prev_close is None or close > self.prev_close:
+            signed = volume
+        elif close < self.prev_close:
+            signed = -volume
+        else:
+            signed = 0.0
+        full = len(self.bars) == self.bars.maxlen
+        total = self.signed_total + signed - (self.bars[0][0] if full else 0.0)
+        if full:
+            first = self.bars[1]
+        elif self.bars:
+            first = self.bars[0]
+        else:
+            first = (signed, volume)
+        if commit:
+            self.bars.append((signed, volume))
+            if len(self.bars) % RESYNC_EVERY == 0:
+                total = math.fsum(bar[0] for bar in self.bars)
+            self.signed_total = total
+            self.prev_close = close
+        # ta.obv always counts the first bar of the window as an up bar.
+        return total - first[0] + first[1]
+
+
+class Psar:
+    """
+    Parabolic SAR with the same recurrence as ta.psar (close used as the seed).
+    The stream never restarts, so values can differ from a fresh 240-bar
+    recomputation until the first reversal inside the window.
+    """
+
+    def __init__(self, af0: float = 0.02, af: float = 0.02, max_af: float = 0.2):
+        self.af0 = af0
+        self.initial_af = af
+        self.max_af = max_af
+        self.state = None
+        self.first = None
+
+    def update(self, high, low, close, commit=True):
+        if self.first is None:
+            if commit:
+                self.first = (high, low, close)
+            return NAN, NAN
+
+        if self.state is None:
+            first_high, first_low, first_close = self.first
+            up = high - first_high
+            down = first_low - low
+            falling = down > up and down > 0
+            ep = first_low if falling else first_high
+            state = (falling, first_close, ep, self.initial_af, first_high, first_high, first_low, first_low)
+        else:
+            state = self.state
+        falling, sar, ep, af, prev_high, prev2_high, prev_low, prev2_low = state
+
+        new_sar = sar + af * (ep - sar)
+        if falling:
+            reverse = high > new_sar
+            if low < ep:
+                ep = low
+                af = min(af + self.af0, self.max_af)
+            new_sar = max(prev_high, prev2_high, new_sar)
+        else:
+            reverse = low < new_sar
+            if high > ep:
+                ep = high
+                af = min(af + self.af0, self.max_af)
+            new_sar = min(prev_low, prev2_low, new_sar)
+
+        if reverse:
+            new_sar = ep
+            af = self.af0
+            falling = not falling
+            ep = low if falling else high
+
+        if commit:
+            self.state = (falling, new_sar, ep, af, high, prev_high, low, prev_low)
+        if falling:
+            return NAN, new_sar
+        return new_sar, NAN
+
+
+class IndicatorEngine:
+    """
+    Running indicator state for one symbol/timeframe. ``update`` folds a closed
+    candle into the state; ``peek`` evaluates the still-forming candle without
+    committing it. A bounded output history feeds the charts.
+    """
+
+    def __init__(self, window: int = 240, bb_length: int = 20, bb_std: float = 2.0):
+        self.window = window
+        self.bb_length = bb_length
+        self.bb_std = bb_std
+        self.reset()
+
+    def reset(self):
+        self.rsi = Rsi(14)
+        self.macd = Macd(12, 26, 9)
+        self.stoch = Stoch(14, 3, 3)
+        self.aroon = Aroon(14)
+        self.obv = Obv(self.window)
+        self.bbands = Rolling(self.bb_length)
+        self.atr = Atr(14)
+        self.psar = Psar()
+        self.last_timestamp = None
+        self.history = deque(maxlen=self.window)
+
+    def _evaluate(self, candle, commit):
+        timestamp, _open, high, low, close, volume = candle[:6]
+        macd, macd_signal, macd_hist = self.macd.update(close, commit)
+        stoch_k, stoch_d = self.stoch.update(high, low, close, commit)
+        aroon_up, aroon_down = self.aroon.update(high, low, commit)
+        bb_middle, bb_variance = self.bbands.step(close, commit)
+        bb_width = self.bb_std * math.sqrt(bb_variance) if not math.isnan(bb_variance) else NAN
+        psar_long, psar_short = self.psar.update(high, low, close, commit)
+        return {
+            "timestamp": timestamp,
+            "close": close,
+            "volume": volume,
+            "rsi": self.rsi.update(close, commit),
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "macd_hist": macd_hist,
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+            "aroon_up": aroon_up,
+            "aroon_down": aroon_down,
+            "obv": self.obv.update(close, volume, commit),
+            "bb_lower": bb_middle - bb_width,
+            "bb_middle": bb_middle,
+            "bb_upper": bb_middle + bb_width,
+            "atr": self.atr.update(high, low, close, commit),
+            "psar_long": psar_long,
+            "psar_short": psar_short,
+        }
+
+    def update(self, candle):
+        values = self._evaluate(candle, commit=True)
+        self.last_timestamp = candle[0]
+        self.history.append(values)
+        return values
+
+    def peek(self, candle):
+        return self._evaluate(candle, commit=False)
+
+    def sync(self, candles):
+        """
+        Feed a fetch window whose last candle is still forming. Only candles
+        newer than the state are folded in; a window that no longer overlaps
+        the state (gap, refetch) rebuilds it from the window.
+        """
+        closed, forming = candles[:-1], candles[-1]
+        if self.last_timestamp is not None and (
+            (closed and closed[0][0] > self.last_timestamp)
+            or forming[0] <= self.last_timestamp
+        ):
+            self.reset()
+        for candle in closed:
+            if self.last_timestamp is None or candle[0] > self.last_timestamp:
+                self.update(candle)
+        return self.peek(forming)
+
+    def series(self, current, length: int):
+        """Last ``length`` outputs (committed history plus ``current``) as column lists."""
+        rows = list(self.history)[-(length - 1):] if length > 1 else []
+        rows.append(current)
+        return {key: [row[key] for row in rows] for key in current}
+
+
+def compare_with_pandas_ta(candles):
+    """
+    Max absolute difference between a fresh engine and pandas_ta on the same
+    window, per indicator. Used to check the streaming formulas.
+    """
+    import pandas as pd
+    import pandas_ta as ta
+
+    df = pd.DataFrame(candles, columns=["timestamp", "open", "high", "low", "close", "volume"])
+    engine = IndicatorEngine(window=len(candles))
+    current = engine.sync(candles)
+    ours = pd.DataFrame(engine.series(current, len(candles)))
+
+    macd = ta.macd(df["close"])
+    stoch = ta.stoch(df["high"], df["low"], df["close"])
+    aroon = ta.aroon(df["high"], df["low"])
+    bbands = ta.bbands(df["close"], length=20, std=2)
+    reference = {
+        "rsi": ta.rsi(df["close"], length=14),
+        "macd": macd["MACD_12_26_9"],
+        "macd_signal": macd["MACDs_12_26_9"],
+        "stoch_k": stoch["STOCHk_14_3_3"],
+        "stoch_d": stoch["STOCHd_14_3_3"],
+        "aroon_up": aroon["AROONU_14"],
+        "aroon_down": aroon["AROOND_14"],
+        "obv": ta.obv(df["close"], df["volume"]),
+        "bb_lower": bbands["BBL_20_2.0"],
+        "bb_middle": bbands["BBM_20_2.0"],
+        "bb_upper": bbands["BBU_20_2.0"],
+        "atr": ta.atr(df["high"], df["low"], df["close"], length=14),
+    }
+    return {
+        key: float((ours[key].reset_index(drop=True) - series.reset_index(drop=True)).abs().max())
+        for key, series in reference.items()
+    }
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class PaperLedger:
+    """
+    Paper-trading book kept on disk as a compact snapshot plus an append-only
+    journal of fills. Every fill is one JSON line written (and flushed) before
+    the in-memory state changes; every ``snapshot_every`` fills the state is
+    written atomically and the journal starts over, so recovery reads one
+    small file and replays at most that many lines.
+
+    All reads and writes go through one lock: the engine loop records fills
+    while the GUI thread reads cash/PnL for its labels.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root: Path, start_balance: float, snapshot_every: int = 500, durable: bool = False):
+        self.root = Path(root)
+        self.snapshot_path = self.root / "snapshot.json"
+        self.journal_path = self.root / "journal.jsonl"
+        self.snapshot_every = max(1, int(snapshot_every))
+        # fsync each fill (survives power loss) instead of only flushing it to
+        # the OS (survives a crash of the process).
+        self.durable = durable
+        self.lock = threading.Lock()
+        self.journal = None
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._state = self._empty(start_balance)
+        self.recovered_fills = self._recover()
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _empty(start_balance: float):
+        return {
+            "seq": 0,
+            "start_balance": float(start_balance),
+            "cash": float(start_balance),
+            "pnl": 0.0,
+            "fills": 0,
+            "positions": {},
+        }
+
+    def _recover(self):
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("version") == self.VERSION:
+                self._state = snapshot["state"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"Paper snapshot unreadable, replaying journal only: {exc}")
+        replayed = 0
+        # Byte offset just past the last complete line; anything after it is
+        # cut off so the next fill does not land on the same line.
+        good = 0
+        torn = False
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("no line end")
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write; the fill never happened.
+                        torn = True
+                        break
+                    good += len(line)
+                    if record["seq"] <= self._state["seq"]:
+                        continue
+                    self._apply(record)
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        if torn:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good)
+                f.flush()
+                os.fsync(f.fileno())
+            print(f"Paper journal: dropped a torn record at byte {good}")
+        return replayed
+
+    def _apply(self, record):
+        state = self._state
+        kind = record["type"]
+        if kind == "open":
+            state["cash"] -= record["qty"] * record["price"]
+            state["positions"][record["symbol"]] = {"qty": record["qty"], "entry": record["price"]}
+        elif kind == "close":
+            pos = state["positions"].pop(record["symbol"], None)
+            if pos is not None:
+                state["cash"] += pos["qty"] * record["price"]
+                state["pnl"] += pos["qty"] * (record["price"] - pos["entry"])
+        elif kind == "reset":
+            state.update(self._empty(record["balance"]), seq=state["seq"])
+        state["seq"] = record["seq"]
+        if kind != "reset":
+            state["fills"] += 1
+
+    def _record(self, record):
+        record["seq"] = self._state["seq"] + 1
+        record["ts"] = int(time.time() * 1000)
+        self.journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.journal.flush()
+        if self.durable:
+            os.fsync(self.journal.fileno())
+        self._apply(record)
+        if self._state["fills"] % self.snapshot_every == 0 or record["type"] == "reset":
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "state": self._state}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        # Records up to the snapshot's seq are skipped on replay, so a crash
+        # between the replace and the truncate loses nothing.
+        self.journal.close()
+        self.journal = open(self.journal_path, "w", encoding="utf-8")
+
+    def open_position(self, symbol: str, qty: float, price: float):
+        with self.lock:
+            if symbol in self._state["positions"]:
+                return False
+            self._record({"type": "open", "symbol": symbol, "qty": qty, "price": price})
+            return True
+
+    def close_position(self, symbol: str, price: float):
+        """Realized PnL of the closed position, or None when none was open."""
+        with self.lock:
+            pos = self._state["positions"].get(symbol)
+            if pos is None:
+                return None
+            self._record({"type": "close", "symbol": symbol, "price": price})
+            return pos["qty"] * (price - pos["entry"])
+
+    def reset(self, start_balance: float):
+        with self.lock:
+            self._record({"type": "reset", "balance": float(start_balance)})
+
+    def has_position(self, symbol: str):
+        with self.lock:
+            return symbol in self._state["positions"]
+
+    @property
+    def cash(self):
+        with self.lock:
+            return self._state["cash"]
+
+    @property
+    def pnl(self):
+        with self.lock:
+            return self._state["pnl"]
+
+    @property
+    def positions(self):
+        with self.lock:
+            return {symbol: dict(pos) for symbol, pos in self._state["positions"].items()}
+
+    def mark_to_market(self, prices: dict):
+        """
+        Cash, open position value and unrealized PnL at ``prices``
+        (symbol -> last price). Positions without a price are valued at entry.
+        """
+        with self.lock:
+            cash = self._state["cash"]
+            positions = list(self._state["positions"].items())
+        value = 0.0
+        unrealized = 0.0
+        for symbol, pos in positions:
+            price = prices.get(symbol) or pos["entry"]
+            value += pos["qty"] * price
+            unrealized += pos["qty"] * (price - pos["entry"])
+        return {"cash": cash, "positions": value, "equity": cash + value, "unrealized": unrealized}
+
+    def close(self):
+        with self.lock:
+            if self.journal is not None:
+                self._write_snapshot()
+                self.journal.close()
+                self.journal = None
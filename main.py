@@ -1,18 +1,17 @@
-﻿import sys
-import json
-import io
-import threading
-from datetime import datetime
+﻿import time
+
+STARTUP_STARTED = time.perf_counter()
+
+import sys
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # Server mode never imports Qt.
+    from engine import run_headless
+
+    sys.exit(run_headless(sys.argv[1:]))
+
 from pathlib import Path
 
-import asyncio
-import requests
-import ccxt
-import pandas as pd
-import pandas_ta as ta
-import matplotlib.pyplot as plt
-from telegram import Bot, InputMediaPhoto
-from telegram.error import TelegramError
 from PyQt5.QtWidgets import (
     QApplication,
     QWidget,
@@ -22,91 +21,220 @@ from PyQt5.QtWidgets import (
     QComboBox,
     QPushButton,
     QLabel,
-    QScrollArea,
+    QListView,
     QLineEdit,
     QRadioButton,
     QGroupBox,
     QFormLayout,
-    QWidgetItem,
-    QLayoutItem,
-    QTextEdit,
+    QTableView,
+    QHeaderView,
+    QMessageBox,
+)
+from PyQt5.QtCore import (
+    Qt,
+    QTimer,
+    pyqtSignal,
+    QAbstractListModel,
+    QAbstractTableModel,
+    QModelIndex,
+    QSortFilterProxyModel,
 )
-from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QIcon
 from qt_material import apply_stylesheet
 
+from engine import (
+    ADS_PATH,
+    BASE_DIR,
+    USER_PATH,
+    BotEngine,
+    EngineSettings,
+    load_ads,
+    load_settings,
+    save_settings,
+)
+from exchange import EventLoopThread
+from market_data import load_markets_cache, save_markets_cache
+from metrics import format_summary
+
 
-BASE_DIR = Path(__file__).resolve().parent
-USER_PATH = BASE_DIR / "user.json"
-ADS_PATH = BASE_DIR / "ads.json"
 ICON_PATH = BASE_DIR / "icon.ico"
 
 
+class SymbolListModel(QAbstractListModel):
+    """
+    Checkable list of market symbols. Selection lives in a plain set, so it
+    survives filtering and the view only creates items for visible rows.
+    """
+
+    def __init__(self, symbols=(), selected=(), parent=None):
+        super().__init__(parent)
+        self.symbols = list(symbols)
+        self.selected = set(selected)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.symbols)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        symbol = self.symbols[index.row()]
+        if role == Qt.DisplayRole:
+            return symbol
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if symbol in self.selected else Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        symbol = self.symbols[index.row()]
+        if value == Qt.Checked:
+            self.selected.add(symbol)
+        else:
+            self.selected.discard(symbol)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def set_symbols(self, symbols):
+        self.beginResetModel()
+        self.symbols = list(symbols)
+        self.endResetModel()
+
+    def set_checked(self, symbols, checked: bool):
+        if checked:
+            self.selected.update(symbols)
+        else:
+            self.selected.difference_update(symbols)
+        if self.symbols:
+            self.dataChanged.emit(
+                self.index(0), self.index(len(self.symbols) - 1), [Qt.CheckStateRole]
+            )
+
+    def selected_symbols(self):
+        return [symbol for symbol in self.symbols if symbol in self.selected]
+
+
+class PortfolioModel(QAbstractTableModel):
+    """
+    Balance rows keyed by asset. update() diffs against the current rows and
+    only signals the cells, insertions and removals that changed, so a
+    refresh does not rebuild the view.
+    """
+
+    COLUMNS = ("Asset", "Total", "Free", "Locked", "Price (USDT)", "Value (USDT)")
+    KEYS = ("asset", "total", "free", "used", "price", "value")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        key = self.KEYS[index.column()]
+        value = self.rows[index.row()][key]
+        if role == Qt.DisplayRole:
+            if key == "asset":
+                return value
+            if value is None:
+                return "-"
+            if key == "value":
+                return f"{value:,.2f}"
+            if key == "price":
+                return f"{value:,.6g}"
+            return f"{value:.4f}"
+        if role == Qt.UserRole:
+            # Sort key: unpriced assets last.
+            return value if key == "asset" or value is not None else -1.0
+        if role == Qt.TextAlignmentRole and key != "asset":
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def update(self, rows):
+        incoming = {row["asset"]: row for row in rows}
+        for position in reversed(range(len(self.rows))):
+            if self.rows[position]["asset"] not in incoming:
+                self.beginRemoveRows(QModelIndex(), position, position)
+                del self.rows[position]
+                self.endRemoveRows()
+        positions = {row["asset"]: position for position, row in enumerate(self.rows)}
+        for asset, row in incoming.items():
+            position = positions.get(asset)
+            if position is None:
+                self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows))
+                self.rows.append(row)
+                self.endInsertRows()
+                continue
+            changed = [column for column, key in enumerate(self.KEYS) if self.rows[position][key] != row[key]]
+            if changed:
+                self.rows[position] = row
+                self.dataChanged.emit(self.index(position, min(changed)), self.index(position, max(changed)))
+
+
 class CryptoBot(QWidget):
     """
     Example version of the trading notifier without any license checks
     or bundled personal credentials. Configuration is read from JSON
     files that live next to this script (user.json, ads.json).
+
+    The window is only a front end: scanning runs in BotEngine on the
+    background loop, and every widget change is pushed to it as a new
+    EngineSettings snapshot.
     """
 
+    markets_loaded = pyqtSignal(list, float)
+    portfolio_loaded = pyqtSignal(list, float)
+    portfolio_failed = pyqtSignal(str)
+    paper_changed = pyqtSignal()
+
     def __init__(self):
         super().__init__()
-        self.load_settings()
-        self.load_ads()
-        self.reset_paper_state()
-        self.interval = self.settings.get("interval", 900)
+        self.settings = load_settings(USER_PATH)
+        self.io = EventLoopThread()
+        self.io.start()
+        self.engine = BotEngine(
+            EngineSettings.from_dict(self.settings), load_ads(ADS_PATH), ADS_PATH
+        )
+        self.engine.on_paper_update = self.paper_changed.emit
+        self.markets_cache_path = Path(self.engine.settings.state_dir) / "markets.json"
+        self.portfolio_refresh_seconds = max(10, int(self.settings["portfolio_refresh_seconds"]))
         self.init_ui()
         self.selected_symbols = []
-        self.bot_thread = None
+        self.bot_future = None
+        self.portfolio_future = None
+        self.portfolio_timer = QTimer(self)
+        self.portfolio_timer.setInterval(self.portfolio_refresh_seconds * 1000)
+        self.portfolio_timer.timeout.connect(self.refresh_portfolio)
+        self.portfolio_auto_checkbox.toggled.connect(self.toggle_portfolio_refresh)
+        if self.portfolio_auto_checkbox.isChecked():
+            self.toggle_portfolio_refresh(True)
         self.ad_timer = QTimer(self)
         self.ad_timer.timeout.connect(self.check_ads_schedule)
         self.ad_timer.start(60_000)  # check ads every minute
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_telegram_stats)
+        self.stats_timer.timeout.connect(self.update_stage_stats)
+        self.stats_timer.start(2_000)
         self.setFixedSize(800, 900)
         if ICON_PATH.exists():
             self.setWindowIcon(QIcon(str(ICON_PATH)))
 
-    def load_settings(self):
-        try:
-            with open(USER_PATH, "r", encoding="utf-8") as f:
-                self.settings = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.settings = {
-                "bot_token": "",
-                "chat_id": "",
-                "interval": 900,
-                "message_interval": 30,
-                "api_key": "",
-                "api_secret": "",
-                "profile": "swing",
-                "paper_start_balance": 10_000,
-                "paper_risk_pct": 5,
-                "signature": "Built by @mebularts",
-                "rsi_thresholds": {
-                    "buy": True,
-                    "sell": True,
-                    "neutral": True,
-                    "potential_buy": True,
-                    "potential_sell": True,
-                },
-            }
-        # Provide defaults for newly added fields when upgrading from older configs
-        self.settings.setdefault("signature", "Built by @mebularts")
-
-    def save_settings(self):
-        with open(USER_PATH, "w", encoding="utf-8") as f:
-            json.dump(self.settings, f, ensure_ascii=False, indent=4)
-
-    def load_ads(self):
-        try:
-            with open(ADS_PATH, "r", encoding="utf-8") as f:
-                self.ads = json.load(f)["ads"]
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.ads = []
-
-    def save_ads(self):
-        with open(ADS_PATH, "w", encoding="utf-8") as f:
-            json.dump({"ads": self.ads}, f, ensure_ascii=False, indent=4)
-
     def init_ui(self):
         layout = QVBoxLayout()
 
@@ -118,15 +246,11 @@ class CryptoBot(QWidget):
         dev_label.setOpenExternalLinks(True)
         layout.addWidget(dev_label)
 
-        # Load markets from the chosen exchange (binance by default)
-        try:
-            self.exchange = ccxt.binance()
-            markets = self.exchange.load_markets()
-            self.symbols = list(markets.keys())
-        except Exception as exc:
-            self.exchange = None
-            self.symbols = []
-            print(f"Exchange init failed: {exc}")
+        # Start from the last known market list; refresh_markets replaces it
+        # in the background once the exchange answers.
+        self.symbols = load_markets_cache(
+            self.markets_cache_path, self.engine.settings.exchange_id
+        )
 
         # Telegram bot settings inputs
         form_layout = QFormLayout()
@@ -152,22 +276,39 @@ class CryptoBot(QWidget):
         # Paper trading controls
         paper_layout = QHBoxLayout()
         self.paper_checkbox = QCheckBox("Enable paper trading", self)
-        self.paper_checkbox.setChecked(False)
+        self.paper_checkbox.setChecked(bool(self.settings.get("paper_enabled", False)))
         self.paper_risk_input = QLineEdit(str(self.settings.get("paper_risk_pct", 5)), self)
         self.paper_risk_input.setFixedWidth(60)
         self.paper_balance_label = QLabel(
-            f"Paper cash: {self.paper_cash:,.2f} USDT", self
+            f"Paper cash: {self.engine.paper_cash:,.2f} USDT", self
         )
         self.paper_pnl_label = QLabel(
-            f"Paper PnL: {self.paper_pnl:,.2f} USDT", self
+            f"Paper PnL: {self.engine.paper_pnl:,.2f} USDT", self
         )
+        self.paper_equity_label = QLabel("Paper equity: -", self)
+        self.paper_reset_button = QPushButton("Reset paper", self)
+        self.paper_reset_button.clicked.connect(self.reset_paper)
         paper_layout.addWidget(self.paper_checkbox)
         paper_layout.addWidget(QLabel("Risk % per trade:", self))
         paper_layout.addWidget(self.paper_risk_input)
         paper_layout.addWidget(self.paper_balance_label)
         paper_layout.addWidget(self.paper_pnl_label)
+        paper_layout.addWidget(self.paper_equity_label)
+        paper_layout.addWidget(self.paper_reset_button)
         layout.addLayout(paper_layout)
 
+        # Screener: rank the whole market from one tickers call, scan the top N
+        screener_layout = QHBoxLayout()
+        self.screener_checkbox = QCheckBox("Screen whole market instead of the selected pairs", self)
+        self.screener_checkbox.setChecked(bool(self.settings.get("screener_enabled", False)))
+        self.screener_top_input = QLineEdit(str(self.settings.get("screener_top_n", 20)), self)
+        self.screener_top_input.setFixedWidth(60)
+        screener_layout.addWidget(self.screener_checkbox)
+        screener_layout.addWidget(QLabel("Top N:", self))
+        screener_layout.addWidget(self.screener_top_input)
+        screener_layout.addStretch()
+        layout.addLayout(screener_layout)
+
         # RSI checkboxes
         self.rsi_group = QGroupBox("RSI Options")
         rsi_layout = QHBoxLayout()
@@ -192,33 +333,52 @@ class CryptoBot(QWidget):
         # Portfolio / positions (read-only) view
         portfolio_group = QGroupBox("Portfolio / Positions (read-only)")
         portfolio_layout = QVBoxLayout()
+        portfolio_controls = QHBoxLayout()
         refresh_button = QPushButton("Refresh Balances", self)
         refresh_button.clicked.connect(self.refresh_portfolio)
-        self.portfolio_view = QTextEdit(self)
-        self.portfolio_view.setReadOnly(True)
-        self.portfolio_view.setPlaceholderText(
-            "Enter API key/secret to pull balances. No trades executed."
-        )
-        portfolio_layout.addWidget(refresh_button)
+        self.portfolio_auto_checkbox = QCheckBox(f"Auto refresh every {self.portfolio_refresh_seconds}s", self)
+        self.portfolio_auto_checkbox.setChecked(bool(self.settings["portfolio_auto_refresh"]))
+        portfolio_controls.addWidget(refresh_button)
+        portfolio_controls.addWidget(self.portfolio_auto_checkbox)
+        portfolio_controls.addStretch()
+        self.portfolio_status = QLabel("Enter API key/secret to pull balances. No trades executed.", self)
+        self.portfolio_model = PortfolioModel(self)
+        self.portfolio_proxy = QSortFilterProxyModel(self)
+        self.portfolio_proxy.setSourceModel(self.portfolio_model)
+        self.portfolio_proxy.setSortRole(Qt.UserRole)
+        self.portfolio_proxy.sort(len(PortfolioModel.COLUMNS) - 1, Qt.DescendingOrder)
+        self.portfolio_view = QTableView(self)
+        self.portfolio_view.setModel(self.portfolio_proxy)
+        self.portfolio_view.verticalHeader().setVisible(False)
+        self.portfolio_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        portfolio_layout.addLayout(portfolio_controls)
+        portfolio_layout.addWidget(self.portfolio_status)
         portfolio_layout.addWidget(self.portfolio_view)
         portfolio_group.setLayout(portfolio_layout)
         layout.addWidget(portfolio_group)
 
-        # Symbol selector with search
-        self.checkbox_widget = QWidget()
-        self.checkbox_layout = QVBoxLayout(self.checkbox_widget)
-        self.checkboxes = []
-        self.build_symbol_checkboxes()
+        # Symbol selector with search (model/view, filtered through a proxy)
+        self.symbol_model = SymbolListModel(
+            self.symbols, self.settings.get("selected_coins", []), self
+        )
+        self.symbol_proxy = QSortFilterProxyModel(self)
+        self.symbol_proxy.setSourceModel(self.symbol_model)
+        self.symbol_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(int(self.settings.get("search_debounce_ms", 150)))
+        self.search_timer.timeout.connect(self.filter_symbols)
 
         self.search_input = QLineEdit(self)
         self.search_input.setPlaceholderText("Search coin...")
-        self.search_input.textChanged.connect(self.filter_symbols)
+        self.search_input.textChanged.connect(self.search_timer.start)
         layout.addWidget(self.search_input)
 
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(self.checkbox_widget)
-        layout.addWidget(scroll_area)
+        self.symbol_view = QListView(self)
+        self.symbol_view.setModel(self.symbol_proxy)
+        self.symbol_view.setUniformItemSizes(True)
+        layout.addWidget(self.symbol_view)
 
         # Control buttons
         start_button = QPushButton("Start", self)
@@ -235,40 +395,95 @@ class CryptoBot(QWidget):
 
         self.status_label = QLabel("", self)
         layout.addWidget(self.status_label)
+        self.telegram_stats_label = QLabel("Telegram queue: idle", self)
+        layout.addWidget(self.telegram_stats_label)
+        self.stage_stats_label = QLabel("Stages: no scans yet", self)
+        layout.addWidget(self.stage_stats_label)
 
         self.setLayout(layout)
         self.setWindowTitle("Crypto Trading Bot - @mebularts")
 
-    def build_symbol_checkboxes(self, filter_text: str | None = None):
-        self.clear_layout(self.checkbox_layout)
-        self.checkboxes = []
-        for symbol in self.symbols:
-            if filter_text and filter_text.lower() not in symbol.lower():
-                continue
-            checkbox = QCheckBox(symbol, self)
-            self.checkboxes.append(checkbox)
-            self.checkbox_layout.addWidget(checkbox)
+        # Toggles that the running engine honours immediately.
+        self.auto_message_radio.toggled.connect(self.push_settings)
+        self.paper_checkbox.toggled.connect(self.push_settings)
+        self.paper_risk_input.editingFinished.connect(self.push_settings)
+        self.screener_checkbox.toggled.connect(self.push_settings)
+        self.screener_top_input.editingFinished.connect(self.push_settings)
+        self.profile_combo.currentTextChanged.connect(self.push_settings)
+        for checkbox in self.rsi_checkboxes.values():
+            checkbox.toggled.connect(self.push_settings)
+        self.paper_changed.connect(self.update_paper_labels)
+
+        self.markets_loaded.connect(self.on_markets_loaded)
+        self.portfolio_loaded.connect(self.on_portfolio_loaded)
+        self.portfolio_failed.connect(self.on_portfolio_failed)
+        self.io.submit(self.refresh_markets())
+
+    def snapshot_settings(self):
+        # Credentials, interval and pairs come from the last Start; the toggles
+        # below are live, as they always were.
+        try:
+            paper_risk_pct = float(self.paper_risk_input.text())
+        except ValueError:
+            paper_risk_pct = 5.0
+        try:
+            screener_top_n = max(1, int(self.screener_top_input.text()))
+        except ValueError:
+            screener_top_n = 20
+        return EngineSettings.from_dict(
+            self.settings,
+            symbols=tuple(self.selected_symbols),
+            profile=self.profile_combo.currentText(),
+            auto_messages=self.auto_message_radio.isChecked(),
+            allow_buy=self.rsi_checkboxes["buy"].isChecked(),
+            allow_sell=self.rsi_checkboxes["sell"].isChecked(),
+            paper_enabled=self.paper_checkbox.isChecked(),
+            paper_risk_pct=paper_risk_pct,
+            screener_enabled=self.screener_checkbox.isChecked(),
+            screener_top_n=screener_top_n,
+        )
+
+    def push_settings(self, *_):
+        self.engine.apply_settings(self.snapshot_settings())
+
+    async def refresh_markets(self):
+        started = time.perf_counter()
+        try:
+            symbols = await self.engine.refresh_markets()
+        except Exception as exc:
+            print(f"Exchange init failed: {exc}")
+            return
+        save_markets_cache(self.markets_cache_path, self.engine.settings.exchange_id, symbols)
+        self.markets_loaded.emit(symbols, time.perf_counter() - started)
+
+    def on_markets_loaded(self, symbols, elapsed):
+        self.symbols = symbols
+        self.symbol_model.set_symbols(symbols)
+        self.status_label.setText(f"Markets refreshed: {len(symbols)} pairs in {elapsed:.1f}s")
+
+    def report_startup_time(self):
+        elapsed_ms = (time.perf_counter() - STARTUP_STARTED) * 1000
+        budget_ms = self.settings.get("startup_budget_ms", 1500)
+        verdict = "within" if elapsed_ms <= budget_ms else "over"
+        message = f"Startup: {elapsed_ms:.0f} ms ({verdict} {budget_ms} ms budget)"
+        print(message)
+        if not self.status_label.text():
+            self.status_label.setText(message)
 
     def filter_symbols(self):
-        filter_text = self.search_input.text()
-        self.build_symbol_checkboxes(filter_text)
-
-    def clear_layout(self, layout):
-        for i in reversed(range(layout.count())):
-            item = layout.itemAt(i)
-            if isinstance(item, QWidgetItem):
-                item.widget().deleteLater()
-            elif isinstance(item, QLayoutItem):
-                self.clear_layout(item.layout())
-            layout.removeItem(item)
+        self.symbol_proxy.setFilterFixedString(self.search_input.text())
+
+    def visible_symbols(self):
+        return [
+            self.symbol_proxy.index(row, 0).data()
+            for row in range(self.symbol_proxy.rowCount())
+        ]
 
     def select_all(self):
-        for cb in self.findChildren(QCheckBox):
-            cb.setChecked(True)
+        self.symbol_model.set_checked(self.visible_symbols(), True)
 
     def deselect_all(self):
-        for cb in self.findChildren(QCheckBox):
-            cb.setChecked(False)
+        self.symbol_model.set_checked(self.visible_symbols(), False)
 
     def start_bot(self):
         self.settings["bot_token"] = self.token_input.text().strip()
@@ -278,20 +493,26 @@ class CryptoBot(QWidget):
         self.settings["api_secret"] = self.api_secret_input.text().strip()
         self.settings["profile"] = self.profile_combo.currentText()
         self.settings["signature"] = self.signature_input.text().strip()
+        self.settings["paper_enabled"] = self.paper_checkbox.isChecked()
         try:
             self.settings["paper_risk_pct"] = float(self.paper_risk_input.text())
         except ValueError:
             self.settings["paper_risk_pct"] = 5.0
+        self.settings["screener_enabled"] = self.screener_checkbox.isChecked()
+        try:
+            self.settings["screener_top_n"] = max(1, int(self.screener_top_input.text()))
+        except ValueError:
+            self.settings["screener_top_n"] = 20
+        self.settings["portfolio_auto_refresh"] = self.portfolio_auto_checkbox.isChecked()
         self.settings["rsi_thresholds"] = {
             key: checkbox.isChecked() for key, checkbox in self.rsi_checkboxes.items()
         }
-        self.save_settings()
+        self.selected_symbols = self.symbol_model.selected_symbols()
+        self.settings["selected_coins"] = self.selected_symbols
+        save_settings(self.settings, USER_PATH)
 
-        self.selected_symbols = [
-            cb.text() for cb in self.findChildren(QCheckBox) if cb.isChecked()
-        ]
-        if not self.selected_symbols:
-            self.status_label.setText("Select at least one trading pair.")
+        if not self.selected_symbols and not self.settings["screener_enabled"]:
+            self.status_label.setText("Select at least one trading pair (or enable the screener).")
             return
 
         if not self.settings["bot_token"] or not self.settings["chat_id"]:
@@ -299,406 +520,125 @@ class CryptoBot(QWidget):
             return
 
         self.status_label.setText("Bot started...")
-        self.bot_token = self.settings["bot_token"]
-        self.bot_chatID = self.settings["chat_id"]
-        self.interval = self.settings["interval"]
-        self.profile = self.settings["profile"]
-        QTimer.singleShot(0, self.update_paper_labels)
-        if self.bot_thread is None:
-            self.bot_thread = threading.Thread(target=self.run_bot, daemon=True)
-            self.bot_thread.start()
-
-    def run_bot(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self.bot_loop())
-        loop.close()
-
-    def format_with_signature(self, text: str):
-        signature = self.settings.get("signature", "").strip()
-        if signature:
-            return f"{text}\n\n{signature}"
-        return text
-
-    async def bot_loop(self):
-        while True:
-            try:
-                await self.dispatch_ads_if_due()
-                if self.auto_message_radio.isChecked():
-                    for symbol in self.selected_symbols:
-                        symbol_interval = await self.analyze_and_send_message(symbol)
-                        await asyncio.sleep(symbol_interval or self.interval)
-            except Exception as exc:
-                print(f"Bot loop error: {exc}")
-            await asyncio.sleep(1)
-
-    async def dispatch_ads_if_due(self):
-        current_time = datetime.now()
-        for ad in self.ads:
-            if not ad.get("active"):
-                continue
-            schedule = ad.get("schedule")
-            if not schedule:
-                continue
-            ad_time = datetime.strptime(
-                f"{schedule['date']} {schedule['time']}", "%Y-%m-%d %H:%M:%S"
-            )
-            if current_time >= ad_time:
-                await self.send_ad(ad)
-                ad["active"] = False
-                self.save_ads()
+        self.push_settings()
+        self.update_paper_labels()
+        if self.bot_future is None or self.bot_future.done():
+            self.bot_future = self.io.submit(self.engine.run())
 
     def check_ads_schedule(self):
-        asyncio.run(self.dispatch_ads_if_due())
+        self.io.submit(self.engine.dispatch_ads_if_due())
 
     def closeEvent(self, event):
         self.ad_timer.stop()
-        event.accept()
-
-    async def send_ad(self, ad):
-        try:
-            message = f"{ad['title']}\n{ad['description']}\n{ad['link']}"
-            message = self.format_with_signature(message)
-            bot = Bot(self.bot_token)
-            image_path = ad.get("image_path")
-            if image_path:
-                with open(image_path, "rb") as img:
-                    await bot.send_photo(
-                        chat_id=self.bot_chatID,
-                        photo=img,
-                        caption=message,
-                        parse_mode="Markdown",
-                    )
-            else:
-                await bot.send_message(
-                    chat_id=self.bot_chatID, text=message, parse_mode="Markdown"
-                )
-        except Exception as exc:
-            print(f"Ad send failed: {exc}")
-
-    async def analyze_and_send_message(self, symbol):
-        if not self.exchange:
-            print("Exchange not initialized.")
-            return None
+        self.stats_timer.stop()
+        self.portfolio_timer.stop()
+        if self.bot_future is not None:
+            self.bot_future.cancel()
         try:
-            timeframe, limit = self.get_profile_params()
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-            if not ohlcv:
-                print(f"No data returned for {symbol}")
-                return None
-
-            df = pd.DataFrame(
-                ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
-            )
-            close_prices = df["close"]
-            last_close = close_prices.iloc[-1]
-
-            rsi = ta.rsi(close_prices, length=14)
-            if rsi is None or rsi.empty:
-                print(f"RSI calculation failed for {symbol}")
-                return None
-
-            stoch = ta.stoch(df["high"], df["low"], df["close"])
-            aroon = ta.aroon(df["high"], df["low"])
-            macd = ta.macd(close_prices)
-            obv = ta.obv(close_prices, df["volume"])
-            bbands = ta.bbands(close_prices, length=20, std=2)
-            atr = ta.atr(df["high"], df["low"], close_prices, length=14)
-            psar = ta.psar(df["high"], df["low"], close_prices)
-            dominance = self.fetch_dominance(symbol) or 0
-            atr_value = float(atr.iloc[-1]) if hasattr(atr, "empty") and not atr.empty else 0.0
-            atr_pct = (atr_value / last_close) if last_close else 0
-
-            macd_line = macd.iloc[-1]["MACD_12_26_9"] if hasattr(macd, "empty") and not macd.empty else 0
-            macd_signal = macd.iloc[-1]["MACDs_12_26_9"] if hasattr(macd, "empty") and not macd.empty else 0
-            stoch_k_val = stoch.iloc[-1]["STOCHk_14_3_3"] if hasattr(stoch, "empty") and not stoch.empty else 0
-            stoch_d_val = stoch.iloc[-1]["STOCHd_14_3_3"] if hasattr(stoch, "empty") and not stoch.empty else 0
-            aroon_up_val = aroon.iloc[-1]["AROONU_14"] if hasattr(aroon, "empty") and not aroon.empty else 0
-            aroon_down_val = aroon.iloc[-1]["AROOND_14"] if hasattr(aroon, "empty") and not aroon.empty else 0
-            bb_lower = bbands.iloc[-1]["BBL_20_2.0"] if hasattr(bbands, "empty") and not bbands.empty else last_close
-            bb_middle = bbands.iloc[-1]["BBM_20_2.0"] if hasattr(bbands, "empty") and not bbands.empty else last_close
-            bb_upper = bbands.iloc[-1]["BBU_20_2.0"] if hasattr(bbands, "empty") and not bbands.empty else last_close
-            obv_val = obv.iloc[-1] if hasattr(obv, "empty") and not obv.empty else 0
-            psar_val = psar.iloc[-1]["PSARl_0.02_0.2"] if isinstance(psar, pd.DataFrame) and not psar.empty else last_close
-
-            votes, status = self.compute_indicator_votes(
-                rsi.iloc[-1], macd, stoch, aroon, bbands, last_close
-            )
-            risk_score = self.compute_risk_score(atr_pct, votes)
-            tp, sl = self.compute_tp_sl(status, last_close, atr_value)
-            dynamic_interval = self.compute_dynamic_interval(atr_pct)
-
-            volume_24h = int(df["volume"].sum())
-            paper_note = self.apply_paper_trading(status, symbol, last_close, atr_value)
-
-            message_lines = [
-                f"*{symbol}* | Profile: *{self.profile_combo.currentText()}* | Status: *{status}*",
-                f"RSI: {rsi.iloc[-1]:.2f} | Risk: {risk_score}/100 | ATR%: {atr_pct*100:.2f}",
-                f"Votes (buy/sell/neutral): {votes['buy']} / {votes['sell']} / {votes['neutral']}",
-                f"MACD: {macd_line:.2f} | Signal: {macd_signal:.2f}",
-                f"Stoch %K/%D: {stoch_k_val:.2f}/{stoch_d_val:.2f}",
-                f"Aroon Up/Down: {aroon_up_val:.2f}/{aroon_down_val:.2f}",
-                f"BB L/M/U: {bb_lower:.2f}/{bb_middle:.2f}/{bb_upper:.2f}",
-                f"OBV: {obv_val:.2f} | ATR: {atr_value:.2f} | Dominance: {dominance:.2f}%",
-                f"24h Vol (bars sum): {volume_24h}",
-                f"PSAR: {psar_val:.4f} | TP: {tp:.4f} | SL: {sl:.4f}",
-                f"Next check (dynamic): ~{dynamic_interval}s",
-            ]
-            if paper_note:
-                message_lines.append(paper_note)
-
-            message = self.format_with_signature("\n".join(message_lines))
-            await self.send_telegram_message_with_graph(symbol, message, df, rsi)
-            return dynamic_interval
+            self.io.run(self.engine.close(), timeout=5)
         except Exception as exc:
-            print(f"Error analyzing {symbol}: {exc}")
-            return None
+            print(f"Connection shutdown failed: {exc}")
+        self.io.stop()
+        event.accept()
 
-    async def send_telegram_message_with_graph(self, symbol, message, df, rsi):
-        try:
-            plt.figure(figsize=(12, 16))
-
-            plt.subplot(4, 1, 1)
-            plt.plot(df["close"], label="Close")
-            plt.title(f"{symbol} Close Prices")
-            plt.legend()
-
-            plt.subplot(4, 1, 2)
-            plt.plot(rsi, label="RSI")
-            plt.axhline(70, color="red", linestyle="--")
-            plt.axhline(30, color="green", linestyle="--")
-            plt.title("RSI")
-            plt.legend()
-
-            plt.subplot(4, 1, 3)
-            macd = ta.macd(df["close"])
-            plt.plot(macd["MACD_12_26_9"], label="MACD")
-            plt.plot(macd["MACDs_12_26_9"], label="Signal")
-            plt.title("MACD")
-            plt.legend()
-
-            plt.subplot(4, 1, 4)
-            bbands = ta.bbands(df["close"], length=20, std=2)
-            plt.plot(df["close"], label="Close")
-            plt.plot(bbands["BBL_20_2.0"], label="Lower Band")
-            plt.plot(bbands["BBM_20_2.0"], label="Middle Band")
-            plt.plot(bbands["BBU_20_2.0"], label="Upper Band")
-            plt.title("Bollinger Bands")
-            plt.legend()
-
-            buf = io.BytesIO()
-            plt.savefig(buf, format="png", bbox_inches="tight")
-            buf.seek(0)
-
-            media = [InputMediaPhoto(media=buf, caption=message, parse_mode="Markdown")]
-            bot = Bot(self.bot_token)
-            await bot.send_media_group(chat_id=self.bot_chatID, media=media)
-            buf.close()
-            plt.close()
-        except TelegramError as exc:
-            print(f"Telegram send error: {exc}")
-
-    def compute_indicator_votes(self, rsi_value, macd, stoch, aroon, bbands, last_close):
-        votes = {"buy": 0, "sell": 0, "neutral": 0}
-
-        # RSI vote
-        if rsi_value < 30:
-            votes["buy"] += 1
-        elif rsi_value > 70:
-            votes["sell"] += 1
-        else:
-            votes["neutral"] += 1
+    def update_telegram_stats(self):
+        sender = self.engine.sender
+        if sender is None:
+            return
+        stats = sender.stats()
+        self.telegram_stats_label.setText(
+            f"Telegram queue: {stats['queue_depth']} | sent {stats['sent']} | "
+            f"dropped {stats['dropped']} | failed {stats['failed']} | "
+            f"retries {stats['retries']} | p95 {stats['latency_p95']:.1f}s"
+        )
 
-        # MACD vote
-        try:
-            macd_line = macd.iloc[-1]["MACD_12_26_9"]
-            macd_signal = macd.iloc[-1]["MACDs_12_26_9"]
-            if macd_line - macd_signal > 0:
-                votes["buy"] += 1
-            elif macd_line - macd_signal < 0:
-                votes["sell"] += 1
-            else:
-                votes["neutral"] += 1
-        except Exception:
-            votes["neutral"] += 1
-
-        # Stochastic vote
-        try:
-            stoch_k = stoch.iloc[-1]["STOCHk_14_3_3"]
-            if stoch_k < 20:
-                votes["buy"] += 1
-            elif stoch_k > 80:
-                votes["sell"] += 1
-            else:
-                votes["neutral"] += 1
-        except Exception:
-            votes["neutral"] += 1
-
-        # Aroon vote
-        try:
-            aroon_up = aroon.iloc[-1]["AROONU_14"]
-            aroon_down = aroon.iloc[-1]["AROOND_14"]
-            if aroon_up > 70 and aroon_down < 30:
-                votes["buy"] += 1
-            elif aroon_down > 70 and aroon_up < 30:
-                votes["sell"] += 1
-            else:
-                votes["neutral"] += 1
-        except Exception:
-            votes["neutral"] += 1
-
-        # Bollinger band vote
-        try:
-            lower = bbands.iloc[-1]["BBL_20_2.0"]
-            upper = bbands.iloc[-1]["BBU_20_2.0"]
-            if last_close < lower:
-                votes["buy"] += 1
-            elif last_close > upper:
-                votes["sell"] += 1
-            else:
-                votes["neutral"] += 1
-        except Exception:
-            votes["neutral"] += 1
-
-        # Status from majority
-        if votes["buy"] > votes["sell"] and self.rsi_checkboxes["buy"].isChecked():
-            status = "Buy"
-        elif votes["sell"] > votes["buy"] and self.rsi_checkboxes["sell"].isChecked():
-            status = "Sell"
-        else:
-            status = "Neutral"
-        return votes, status
-
-    def compute_risk_score(self, atr_pct, votes):
-        vote_spread = abs(votes["buy"] - votes["sell"])
-        conflict_penalty = 10 if vote_spread <= 1 else 0
-        atr_component = min(70, atr_pct * 3000)  # scales ATR% into 0-70-ish
-        base = 30 + atr_component + conflict_penalty
-        return int(min(100, max(0, base)))
-
-    def compute_tp_sl(self, status, last_close, atr_value):
-        if not last_close or not atr_value:
-            return last_close, last_close
-        if status == "Buy":
-            tp = last_close + 2 * atr_value
-            sl = last_close - 1.5 * atr_value
-        elif status == "Sell":
-            tp = last_close - 2 * atr_value
-            sl = last_close + 1.5 * atr_value
-        else:
-            tp = last_close
-            sl = last_close
-        return tp, sl
-
-    def compute_dynamic_interval(self, atr_pct):
-        factor = 1.0
-        if atr_pct > 0.03:
-            factor = 0.5
-        elif atr_pct > 0.02:
-            factor = 0.7
-        elif atr_pct < 0.01:
-            factor = 1.3
-        return max(5, int(self.interval * factor))
-
-    def get_profile_params(self):
-        profile = self.profile_combo.currentText()
-        if profile == "scalp":
-            return "1m", 240
-        if profile == "intraday":
-            return "5m", 240
-        return "1h", 240
-
-    def reset_paper_state(self):
-        self.paper_cash = float(self.settings.get("paper_start_balance", 10_000))
-        self.paper_positions = {}
-        self.paper_pnl = 0.0
-
-    def apply_paper_trading(self, status, symbol, last_price, atr_value):
-        if not self.paper_checkbox.isChecked():
-            return ""
-        if status not in {"Buy", "Sell"}:
-            return ""
-        try:
-            risk_pct = float(self.paper_risk_input.text())
-        except Exception:
-            risk_pct = 5.0
-        risk_pct = max(0.1, min(50.0, risk_pct))
-        note = ""
-        if status == "Buy" and symbol not in self.paper_positions:
-            allocation = self.paper_cash * (risk_pct / 100)
-            if allocation <= 0:
-                return ""
-            qty = allocation / last_price
-            self.paper_cash -= allocation
-            self.paper_positions[symbol] = {"qty": qty, "entry": last_price}
-            note = f"[paper] opened {symbol}: qty {qty:.6f} @ {last_price:.4f}"
-        elif status == "Sell" and symbol in self.paper_positions:
-            pos = self.paper_positions[symbol]
-            proceeds = pos["qty"] * last_price
-            spent = pos["qty"] * pos["entry"]
-            pnl = proceeds - spent
-            self.paper_cash += proceeds
-            self.paper_pnl += pnl
-            del self.paper_positions[symbol]
-            note = f"[paper] closed {symbol}: pnl {pnl:.2f} | cash {self.paper_cash:.2f}"
-        QTimer.singleShot(0, self.update_paper_labels)
-        return note
+    def update_stage_stats(self):
+        metrics = self.engine.metrics
+        summary = metrics.summary()
+        if not summary:
+            return
+        parts = [
+            f"{stage} {summary[stage]['p95']*1000:.0f}ms"
+            for stage in ("fetch", "indicators", "dominance", "chart", "telegram", "scan")
+            if stage in summary
+        ]
+        skipped = sum(
+            metrics.counter("skipped_total", reason=reason) for reason in ("no_data", "rsi_nan", "error")
+        )
+        self.stage_stats_label.setText(
+            f"p95: {' | '.join(parts)} | scans {metrics.counter('scans_total')} | skipped {skipped}"
+        )
+        self.stage_stats_label.setToolTip(format_summary(summary))
 
     def update_paper_labels(self):
-        self.paper_balance_label.setText(f"Paper cash: {self.paper_cash:,.2f} USDT")
-        self.paper_pnl_label.setText(f"Paper PnL: {self.paper_pnl:,.2f} USDT")
+        self.paper_balance_label.setText(f"Paper cash: {self.engine.paper_cash:,.2f} USDT")
+        self.paper_pnl_label.setText(f"Paper PnL: {self.engine.paper_pnl:,.2f} USDT")
+        marks = self.engine.paper_marks
+        if marks is not None:
+            self.paper_equity_label.setText(
+                f"Paper equity: {marks['equity']:,.2f} USDT (open {marks['unrealized']:+,.2f})"
+            )
+
+    def reset_paper(self):
+        self.engine.reset_paper_state()
+        self.paper_equity_label.setText("Paper equity: -")
 
     def refresh_portfolio(self):
         api_key = self.api_key_input.text().strip()
         api_secret = self.api_secret_input.text().strip()
         if not api_key or not api_secret:
-            self.portfolio_view.setPlainText("API key/secret missing. Nothing fetched.")
+            self.portfolio_status.setText("API key/secret missing. Nothing fetched.")
             return
+        if self.portfolio_future is not None and not self.portfolio_future.done():
+            return  # the previous refresh is still running
+        if not self.portfolio_model.rows:
+            self.portfolio_status.setText("Fetching balances...")
+        self.portfolio_future = self.io.submit(self.load_portfolio(api_key, api_secret))
+
+    async def load_portfolio(self, api_key, api_secret):
+        # Runs on the engine loop; results reach the widgets through signals.
+        started = time.perf_counter()
         try:
-            exchange = ccxt.binance({"apiKey": api_key, "secret": api_secret})
-            balances = exchange.fetch_balance()
-            summary_lines = []
-            for asset, total in balances.get("total", {}).items():
-                if total and total > 0:
-                    free = balances.get("free", {}).get(asset, 0)
-                    used = balances.get("used", {}).get(asset, 0)
-                    summary_lines.append(
-                        f"{asset}: total {total:.4f} | free {free:.4f} | locked {used:.4f}"
-                    )
-            if not summary_lines:
-                self.portfolio_view.setPlainText("No non-zero balances found (read-only).")
-            else:
-                self.portfolio_view.setPlainText("\n".join(summary_lines))
+            rows = await self.engine.fetch_portfolio(api_key, api_secret)
         except Exception as exc:
-            self.portfolio_view.setPlainText(f"Balance fetch failed: {exc}")
-
-    def fetch_dominance(self, symbol):
-        # Map common trading pairs to CoinGecko symbols
-        symbol_mapping = {
-            "BTC/USDT": "btc",
-            "ETH/USDT": "eth",
-            "LTC/USDT": "ltc",
-            "BNB/USDT": "bnb",
-            "SOL/USDT": "sol",
-            "XRP/USDT": "xrp",
-            "DOGE/USDT": "doge",
-        }
-        try:
-            response = requests.get("https://api.coingecko.com/api/v3/global", timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            market_cap_percentage = data.get("data", {}).get("market_cap_percentage", {})
-            cg_symbol = symbol_mapping.get(symbol)
-            if cg_symbol:
-                return market_cap_percentage.get(cg_symbol)
-        except Exception as exc:
-            print(f"Dominance fetch error for {symbol}: {exc}")
-        return None
+            self.portfolio_failed.emit(str(exc))
+            return
+        self.portfolio_loaded.emit(rows, time.perf_counter() - started)
+
+    def on_portfolio_loaded(self, rows, elapsed):
+        self.portfolio_model.update(rows)
+        if not rows:
+            self.portfolio_status.setText("No non-zero balances found (read-only).")
+            return
+        total = sum(row["value"] for row in rows if row["value"] is not None)
+        unpriced = sum(1 for row in rows if row["value"] is None)
+        note = f", {unpriced} unpriced" if unpriced else ""
+        self.portfolio_status.setText(
+            f"Total {total:,.2f} USDT across {len(rows)} assets{note} | "
+            f"updated {time.strftime('%H:%M:%S')} in {elapsed:.1f}s"
+        )
+
+    def on_portfolio_failed(self, message):
+        # Keep the last good rows on screen.
+        self.portfolio_status.setText(f"Balance fetch failed: {message}")
+
+    def toggle_portfolio_refresh(self, enabled):
+        if enabled:
+            self.portfolio_timer.start()
+            self.refresh_portfolio()
+        else:
+            self.portfolio_timer.stop()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     apply_stylesheet(app, theme="dark_blue.xml")
-    bot_app = CryptoBot()
+    try:
+        bot_app = CryptoBot()
+    except RuntimeError as exc:
+        # Another instance already runs on this state_dir.
+        QMessageBox.critical(None, "Crypto Trading Bot", str(exc))
+        sys.exit(1)
     bot_app.show()
+    QTimer.singleShot(0, bot_app.report_startup_time)
     sys.exit(app.exec_())
@@ -0,0 +1,578 @@
+import asyncio
+import json
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import requests
+
+MARKETS_CACHE_VERSION = 1
+CANDLE_STORE_VERSION = 1
+# Rows per memory-mapped segment (6 float64 columns -> ~3 MB per segment).
+SEGMENT_ROWS = 1 << 16
+TIMEFRAME_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_timeframe(timeframe: str):
+    """'1m' / '5m' / '1h' / '1d' -> milliseconds."""
+    return int(timeframe[:-1]) * TIMEFRAME_SECONDS[timeframe[-1]] * 1000
+
+
+def load_markets_cache(path: Path, exchange_id: str):
+    """Symbols from the last successful load_markets, or [] if missing/stale format."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    if cached.get("version") != MARKETS_CACHE_VERSION or cached.get("exchange") != exchange_id:
+        return []
+    return list(cached.get("symbols", []))
+
+
+def save_markets_cache(path: Path, exchange_id: str, symbols):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": MARKETS_CACHE_VERSION,
+                "exchange": exchange_id,
+                "saved_at": int(time.time()),
+                "symbols": list(symbols),
+            },
+            f,
+        )
+    tmp_path.replace(path)
+
+
+class CandleSeries:
+    """
+    Append-only candles for one (exchange, symbol, timeframe). Columns
+    (timestamp, open, high, low, close, volume) live in fixed-size ``.npy``
+    segments stored column-major and memory-mapped; ``index.json`` records
+    each segment's row count and time range. Appends write in place, so each
+    new bar costs O(1) plus a tiny index rewrite; reads that stay inside one
+    segment return views into the map without copying.
+    """
+
+    def __init__(self, path: Path, segment_rows: int = SEGMENT_ROWS):
+        self.path = path
+        self.index_path = path / "index.json"
+        self.segment_rows = segment_rows
+        self.segments = []
+        self._maps = {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        if index.get("version") == CANDLE_STORE_VERSION:
+            self.segment_rows = index["segment_rows"]
+            self.segments = index["segments"]
+
+    def __len__(self):
+        return sum(segment["rows"] for segment in self.segments)
+
+    @property
+    def last_timestamp(self):
+        if not self.segments or not self.segments[-1]["rows"]:
+            return None
+        return self.segments[-1]["last"]
+
+    def _array(self, segment, writable: bool = False):
+        array = self._maps.get(segment["file"])
+        if array is None or (writable and not array.flags.writeable):
+            mode = "r+" if writable else "r"
+            array = np.load(self.path / segment["file"], mmap_mode=mode)
+            self._maps[segment["file"]] = array
+        return array
+
+    def _new_segment(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        name = f"seg-{len(self.segments):05d}.npy"
+        self._maps[name] = np.lib.format.open_memmap(
+            self.path / name, mode="w+", dtype=np.float64, shape=(6, self.segment_rows)
+        )
+        segment = {"file": name, "rows": 0, "first": None, "last": None}
+        self.segments.append(segment)
+        return segment
+
+    def _write_index(self):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": CANDLE_STORE_VERSION,
+                    "segment_rows": self.segment_rows,
+                    "segments": self.segments,
+                },
+                f,
+            )
+        tmp_path.replace(self.index_path)
+
+    def append(self, candles):
+        """
+        Add ccxt-style candles. Bars older than the stored tail are ignored; a
+        bar with the tail's timestamp replaces it (the bar was still forming).
+        Returns the number of new bars.
+        """
+        if candles is None or len(candles) == 0:
+            return 0
+        rows = np.asarray(candles, dtype=np.float64)[:, :6]
+        last = self.last_timestamp
+        if last is not None:
+            same = rows[rows[:, 0] == last]
+            if len(same):
+                tail = self.segments[-1]
+                self._array(tail, writable=True)[:, tail["rows"] - 1] = same[-1]
+            rows = rows[rows[:, 0] > last]
+        added = len(rows)
+        while len(rows):
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment["rows"] >= self.segment_rows:
+                segment = self._new_segment()
+            array = self._array(segment, writable=True)
+            take = min(len(rows), self.segment_rows - segment["rows"])
+            start = segment["rows"]
+            array[:, start:start + take] = rows[:take].T
+            segment["rows"] += take
+            if segment["first"] is None:
+                segment["first"] = int(rows[0, 0])
+            segment["last"] = int(rows[take - 1, 0])
+            rows = rows[take:]
+        if self.segments:
+            # Rows are already in the shared mapping (they survive a process
+            # crash); the index that makes them visible is replaced atomically.
+            self._write_index()
+        return added
+
+    def read(self, start: int | None = None, end: int | None = None):
+        """Bars with start <= timestamp <= end as an (n, 6) array (a view when in one segment)."""
+        parts = []
+        for segment in self.segments:
+            if not segment["rows"]:
+                continue
+            if (start is not None and segment["last"] < start) or (
+                end is not None and segment["first"] > end
+            ):
+                continue
+            array = self._array(segment)[:, :segment["rows"]]
+            low = np.searchsorted(array[0], start, "left") if start is not None else 0
+            high = np.searchsorted(array[0], end, "right") if end is not None else segment["rows"]
+            parts.append(array[:, low:high])
+        return self._join(parts)
+
+    def tail(self, count: int):
+        """The last ``count`` bars as an (n, 6) array (a view when in one segment)."""
+        parts = []
+        remaining = count
+        for segment in reversed(self.segments):
+            if remaining <= 0:
+                break
+            rows = segment["rows"]
+            take = min(rows, remaining)
+            if take:
+                parts.append(self._array(segment)[:, rows - take:rows])
+                remaining -= take
+        return self._join(parts[::-1])
+
+    @staticmethod
+    def _join(parts):
+        if not parts:
+            return np.empty((0, 6))
+        block = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+        return block.T
+
+
+class CandleStore:
+    """
+    Root of the on-disk candle store: ``<root>/<exchange>/<SYMBOL>/<timeframe>/``.
+    Fed by CandleCache as candles arrive; backtest.py and other offline
+    tools can read the same files.
+    """
+
+    def __init__(self, root: Path, exchange_id: str = "binance", segment_rows: int = SEGMENT_ROWS):
+        self.root = Path(root) / exchange_id
+        self.segment_rows = segment_rows
+        self._series = {}
+
+    @staticmethod
+    def _dirname(symbol: str):
+        return symbol.replace("/", "_").replace(":", "-")
+
+    @staticmethod
+    def _symbol(dirname: str):
+        return dirname.replace("-", ":").replace("_", "/")
+
+    def series(self, symbol: str, timeframe: str):
+        key = (symbol, timeframe)
+        series = self._series.get(key)
+        if series is None:
+            path = self.root / self._dirname(symbol) / timeframe
+            series = self._series[key] = CandleSeries(path, self.segment_rows)
+        return series
+
+    def symbols(self, timeframe: str):
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            self._symbol(path.name)
+            for path in self.root.iterdir()
+            if (path / timeframe / "index.json").exists()
+        )
+
+    def history(self, timeframe: str, symbols=None):
+        """{symbol: (bars, 6) array} for every stored symbol, as backtest.load_history returns."""
+        history = {}
+        for symbol in symbols or self.symbols(timeframe):
+            candles = self.series(symbol, timeframe).read()
+            if len(candles):
+                history[symbol] = np.asarray(candles)
+        return history
+
+
+class CandleCache:
+    """
+    Per (symbol, timeframe) OHLCV buffer. After the first full download only
+    the still-forming last bar and anything newer is requested (``since=``),
+    so steady-state polls move one or two candles instead of the full window.
+    With a CandleStore, fetched bars are persisted and a restart resumes from
+    the stored tail instead of downloading the window again.
+    """
+
+    def __init__(self, exchange, store: CandleStore | None = None):
+        self.exchange = exchange
+        self.store = store
+        self._candles = {}
+        # Keys whose window a stream just completed: the next fetch is free.
+        self._fresh = set()
+        self.full_fetches = 0
+        self.incremental_fetches = 0
+        self.store_loads = 0
+        self.streamed = 0
+
+    def invalidate(self, symbol: str | None = None):
+        if symbol is None:
+            self._candles.clear()
+            self._fresh.clear()
+            return
+        for key in [key for key in self._candles if key[0] == symbol]:
+            del self._candles[key]
+            self._fresh.discard(key)
+
+    def ingest(self, symbol: str, timeframe: str, candle):
+        """
+        Fold a closed candle from a kline stream into the cached window. Returns
+        False (and leaves the next fetch to REST, which fills the gap) when it
+        does not continue the window.
+        """
+        key = (symbol, timeframe)
+        candles = self._candles.get(key)
+        if not candles:
+            return False
+        candle = [int(candle[0]), *candle[1:]]
+        last = candles[-1][0]
+        if candle[0] == last + parse_timeframe(timeframe):
+            candles.append(candle)
+            del candles[0]
+        elif candles[0][0] <= candle[0] <= last:
+            index = next(i for i in range(len(candles) - 1, -1, -1) if candles[i][0] <= candle[0])
+            if candles[index][0] != candle[0]:
+                return False
+            candles[index] = candle
+        else:
+            return False
+        self._fresh.add(key)
+        self.streamed += 1
+        self._persist(symbol, timeframe, [candle])
+        return True
+
+    async def fetch(self, symbol: str, timeframe: str, limit: int):
+        key = (symbol, timeframe)
+        candles = self._candles.get(key)
+        if key in self._fresh:
+            self._fresh.discard(key)
+            if candles and len(candles) >= limit:
+                return list(candles)
+        if candles is None and self.store is not None:
+            candles = self._load_stored(symbol, timeframe, limit)
+        if candles and len(candles) >= limit:
+            fresh = await self._fetch_incremental(symbol, timeframe, limit, candles)
+            if fresh is not None:
+                kept = [candle for candle in candles if candle[0] < fresh[0][0]]
+                self._candles[key] = (kept + [list(candle) for candle in fresh])[-limit:]
+                self.incremental_fetches += 1
+                self._persist(symbol, timeframe, fresh)
+                return list(self._candles[key])
+
+        candles = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        self.full_fetches += 1
+        if candles:
+            self._candles[key] = list(candles[-limit:])
+            self._persist(symbol, timeframe, candles)
+        else:
+            self._candles.pop(key, None)
+        return list(candles or [])
+
+    async def fetch_history(self, symbol: str, timeframe: str, bars: int, page: int = 1000):
+        """
+        The last ``bars`` candles (last one still forming), beyond what a
+        single request returns: whatever the store already holds is reused
+        and the rest is paged in with ``since=``.
+        """
+        step = parse_timeframe(timeframe)
+        now = self.exchange.milliseconds()
+        since = (now // step - bars + 1) * step
+        candles = []
+        if self.store is not None:
+            try:
+                stored = self.store.series(symbol, timeframe).read(start=since)
+            except Exception as exc:
+                print(f"Candle store read failed for {symbol} {timeframe}: {exc}")
+                stored = []
+            if len(stored) and stored[0][0] <= since:
+                # Reuse the stored run only up to its first gap (a missed
+                # write, an outage); everything after it is paged in again.
+                gaps = np.flatnonzero(np.diff(stored[:, 0]) != step)
+                if len(gaps):
+                    stored = stored[:gaps[0] + 1]
+                candles = [[int(row[0]), *row[1:]] for row in stored.tolist()]
+                since = candles[-1][0]
+        while since <= now:
+            fetched = await self.exchange.fetch_ohlcv(
+                symbol, timeframe=timeframe, since=since, limit=page
+            )
+            self.full_fetches += 1
+            if not fetched:
+                break
+            candles = [candle for candle in candles if candle[0] < fetched[0][0]]
+            candles.extend(list(candle) for candle in fetched)
+            self._persist(symbol, timeframe, fetched)
+            if len(fetched) < page:
+                break
+            since = fetched[-1][0] + step
+        return candles[-bars:]
+
+    def _load_stored(self, symbol, timeframe, limit):
+        try:
+            stored = self.store.series(symbol, timeframe).tail(limit)
+        except Exception as exc:
+            print(f"Candle store read failed for {symbol} {timeframe}: {exc}")
+            return None
+        if len(stored) < limit:
+            return None
+        if (np.diff(stored[:, 0]) != parse_timeframe(timeframe)).any():
+            return None  # a gap inside the window: fetch it whole
+        self.store_loads += 1
+        return [[int(row[0]), *row[1:]] for row in stored.tolist()]
+
+    def _persist(self, symbol, timeframe, candles):
+        if self.store is None:
+            return
+        try:
+            self.store.series(symbol, timeframe).append(candles)
+        except Exception as exc:
+            print(f"Candle store write failed for {symbol} {timeframe}: {exc}")
+
+    async def _fetch_incremental(self, symbol, timeframe, limit, candles):
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        # The last cached bar is the one that was still forming; re-request it
+        # together with everything that closed after it.
+        since = candles[-1][0]
+        missing = (self.exchange.milliseconds() - since) // timeframe_ms + 1
+        if missing >= limit:
+            return None
+        fresh = await self.exchange.fetch_ohlcv(
+            symbol, timeframe=timeframe, since=since, limit=int(missing) + 1
+        )
+        if not fresh or fresh[0][0] > since:
+            # Gap between the cache and the exchange answer: start over.
+            return None
+        return fresh
+
+
+class TimeframeAggregator:
+    """
+    Higher-timeframe bars built in memory from one base feed (for example 5m,
+    15m and 1h from 1m). Closed base candles are folded into their bucket
+    once; the still-forming base candle is only layered on top when bars are
+    read, so re-polling it never double counts volume.
+    """
+
+    def __init__(self, base_timeframe: str, timeframes, bars: int = 100):
+        self.base_timeframe = base_timeframe
+        self.base_ms = parse_timeframe(base_timeframe)
+        self.timeframes = tuple(
+            timeframe
+            for timeframe in timeframes
+            if parse_timeframe(timeframe) > self.base_ms
+            and parse_timeframe(timeframe) % self.base_ms == 0
+        )
+        self.steps = {timeframe: parse_timeframe(timeframe) for timeframe in self.timeframes}
+        self.bars_kept = bars
+        self.completed = {timeframe: deque(maxlen=bars) for timeframe in self.timeframes}
+        self.partial = {timeframe: None for timeframe in self.timeframes}
+        self.forming = None
+        self.last_closed = None
+
+    @property
+    def base_bars_needed(self):
+        """Base candles that fill every higher timeframe's window."""
+        if not self.timeframes:
+            return 0
+        return max(self.steps.values()) // self.base_ms * (self.bars_kept + 1)
+
+    def _fold(self, timeframe, candle):
+        step = self.steps[timeframe]
+        bucket = candle[0] // step * step
+        partial = self.partial[timeframe]
+        if partial is not None and partial[0] != bucket:
+            self.completed[timeframe].append(partial)
+            partial = None
+        if partial is None:
+            self.partial[timeframe] = [bucket, *candle[1:6]]
+        else:
+            partial[2] = max(partial[2], candle[2])
+            partial[3] = min(partial[3], candle[3])
+            partial[4] = candle[4]
+            partial[5] += candle[5]
+
+    def update(self, candles):
+        """
+        Fold a base window whose last candle is still forming. Returns False
+        when the window does not connect to what was folded before (a gap),
+        in which case the aggregator should be rebuilt from history.
+        """
+        if not candles:
+            return True
+        *closed, forming = candles
+        if (
+            self.last_closed is not None
+            and closed
+            and closed[0][0] > self.last_closed + self.base_ms
+        ):
+            return False
+        for candle in closed:
+            if self.last_closed is not None and candle[0] <= self.last_closed:
+                continue
+            for timeframe in self.timeframes:
+                self._fold(timeframe, candle)
+            self.last_closed = candle[0]
+        if self.last_closed is None or forming[0] > self.last_closed:
+            self.forming = list(forming[:6])
+        return True
+
+    def bars(self, timeframe: str):
+        """Completed bars plus the current, still-forming one (oldest first)."""
+        step = self.steps[timeframe]
+        rows = [list(bar) for bar in self.completed[timeframe]]
+        partial = self.partial[timeframe]
+        forming = self.forming
+        if forming is not None:
+            bucket = forming[0] // step * step
+            if partial is not None and partial[0] == bucket:
+                current = [
+                    bucket,
+                    partial[1],
+                    max(partial[2], forming[2]),
+                    min(partial[3], forming[3]),
+                    forming[4],
+                    partial[5] + forming[5],
+                ]
+            else:
+                if partial is not None:
+                    rows.append(list(partial))
+                current = [bucket, *forming[1:6]]
+            rows.append(current)
+        elif partial is not None:
+            rows.append(list(partial))
+        return rows[-self.bars_kept:]
+
+
+class DominanceCache:
+    """
+    Process-wide cache of CoinGecko's global market-cap percentages.
+    Concurrent lookups on one event loop share one in-flight request; once
+    the TTL expires the stale payload keeps being served while a refresh runs
+    in the background. Callers may pass their own TTL per lookup.
+    """
+
+    URL = "https://api.coingecko.com/api/v3/global"
+    RETRY_DELAY = 30
+
+    def __init__(self, ttl: float = 300, timeout: float = 10, tap=None):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.tap = tap
+        self.payload = None
+        # Trading pair base -> CoinGecko key, rebuilt from every payload.
+        self.symbol_mapping = {}
+        self.fetched_at = 0.0
+        self.retry_at = 0.0
+        # Event loop -> its refresh task; engines on other threads run their own loops.
+        self._inflight = {}
+
+    def _download(self):
+        if self.tap is not None:
+            payload = self.tap.http_get(self.URL, self.timeout)
+        else:
+            response = requests.get(self.URL, timeout=self.timeout)
+            response.raise_for_status()
+            payload = response.json()
+        return (payload or {}).get("data", {}).get("market_cap_percentage", {})
+
+    async def _fetch(self):
+        try:
+            self.payload = await asyncio.to_thread(self._download)
+            self.symbol_mapping = {key.upper(): key for key in self.payload}
+            self.fetched_at = time.monotonic()
+        except Exception as exc:
+            self.retry_at = time.monotonic() + self.RETRY_DELAY
+            print(f"Dominance fetch error: {exc}")
+        return self.payload
+
+    def _refresh(self):
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(loop)
+        if task is None or task.done():
+            self._inflight = {
+                other: pending
+                for other, pending in self._inflight.items()
+                if not pending.done() and not other.is_closed()
+            }
+            task = self._inflight[loop] = loop.create_task(self._fetch())
+        return task
+
+    async def get(self, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        if self.payload is not None and now - self.fetched_at < ttl:
+            return self.payload
+        if now < self.retry_at:
+            return self.payload or {}
+        task = self._refresh()
+        if self.payload is not None:
+            return self.payload
+        return await asyncio.shield(task) or {}
+
+    async def lookup(self, symbol: str, ttl: float | None = None):
+        payload = await self.get(ttl)
+        base = symbol.split("/")[0].upper()
+        key = self.symbol_mapping.get(base)
+        return payload.get(key) if key else None
+
+
+_dominance_cache = None
+
+
+def shared_dominance_cache(ttl: float = 300):
+    """
+    The process-wide DominanceCache. ``ttl`` only seeds its default; engines
+    pass their own dominance_ttl to lookup().
+    """
+    global _dominance_cache
+    if _dominance_cache is None:
+        _dominance_cache = DominanceCache(ttl=ttl)
+    return _dominance_cache
@@ -0,0 +1,198 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency buckets; the last bucket is +Inf.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Pipeline stages timed by the engine, in the order a scan runs them.
+STAGES = ("screen", "fetch", "indicators", "mtf", "votes", "dominance", "chart", "telegram", "scan", "stream")
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        """Linear interpolation inside the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if seen + count >= rank and count:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """
+    Stage latency histograms (overall and per symbol) and labelled counters,
+    shared by the engine loop, the Telegram worker and the HTTP endpoint.
+    Updates are a lock plus a few integer adds, cheap next to any I/O.
+    """
+
+    def __init__(self, per_symbol: bool = True):
+        self.per_symbol = per_symbol
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.symbol_stages = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, stage: str, seconds: float, symbol: str | None = None):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+            if symbol is not None and self.per_symbol:
+                key = (stage, symbol)
+                histogram = self.symbol_stages.get(key)
+                if histogram is None:
+                    histogram = self.symbol_stages[key] = Histogram()
+                histogram.observe(seconds)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, stage: str, symbol: str | None = None):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment("errors_total", stage=stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, symbol)
+
+    def counter(self, name: str, **labels):
+        with self.lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self):
+        """Per-stage count, mean, p50 and p95 (seconds) for status views."""
+        with self.lock:
+            return {
+                stage: {
+                    "count": histogram.count,
+                    "mean": histogram.total / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for stage, histogram in self.stages.items()
+            }
+
+    def render(self):
+        """The whole registry in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE cryptobot_stage_seconds histogram",
+        ]
+        with self.lock:
+            series = [({"stage": stage}, histogram) for stage, histogram in sorted(self.stages.items())]
+            series += [
+                ({"stage": stage, "symbol": symbol}, histogram)
+                for (stage, symbol), histogram in sorted(self.symbol_stages.items())
+            ]
+            for labels, histogram in series:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f"cryptobot_stage_seconds_bucket{_labels({**labels, 'le': bound})} {cumulative}"
+                    )
+                lines.append(
+                    f"cryptobot_stage_seconds_bucket{_labels({**labels, 'le': '+Inf'})} {histogram.count}"
+                )
+                lines.append(f"cryptobot_stage_seconds_sum{_labels(labels)} {histogram.total}")
+                lines.append(f"cryptobot_stage_seconds_count{_labels(labels)} {histogram.count}")
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE cryptobot_{name} counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f"cryptobot_{name}{_labels(dict(labels))} {value}")
+        lines.append("# TYPE cryptobot_uptime_seconds gauge")
+        lines.append(f"cryptobot_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves ``/metrics`` from a daemon thread; binds to localhost by default."""
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1"):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def format_summary(summary: dict):
+    """One compact line per stage: ``fetch  n=120  p50 45ms  p95 180ms``."""
+    lines = []
+    for stage in sorted(summary, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+        values = summary[stage]
+        lines.append(
+            f"{stage:<10} n={values['count']:<6} p50 {values['p50']*1000:7.1f}ms  p95 {values['p95']*1000:7.1f}ms"
+        )
+    return "\n".join(lines)
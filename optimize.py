@@ -0,0 +1,329 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from backtest import (
+    collect_trades,
+    evaluate_signals,
+    load_history,
+    prepare_history,
+    run_portfolio,
+    trade_stats,
+)
+from signals import CLOSE, bollinger_basis, compute_indicators
+from strategy import StrategyParams
+
+# Values tried per parameter; the current defaults are always evaluated too.
+SEARCH_SPACE = {
+    "rsi_buy": [20, 25, 30, 35],
+    "rsi_sell": [65, 70, 75, 80],
+    "stoch_buy": [10, 15, 20, 25],
+    "stoch_sell": [75, 80, 85, 90],
+    "aroon_strong": [60, 70, 80],
+    "aroon_weak": [20, 30, 40],
+    "bb_length": [14, 20, 26],
+    "bb_std": [1.5, 2.0, 2.5],
+    "tp_mult": [1.0, 1.5, 2.0, 3.0],
+    "sl_mult": [0.75, 1.0, 1.5, 2.0],
+    "interval_high_factor": [0.3, 0.5, 0.7],
+    "interval_mid_factor": [0.5, 0.7, 1.0],
+    "interval_low_factor": [1.0, 1.3, 1.6],
+}
+
+METRICS = {
+    "return": lambda stats: stats["total_return"],
+    "calmar": lambda stats: stats["total_return"] / max(stats["max_drawdown"], 0.01),
+}
+
+# Indicator series that do not depend on any swept parameter.
+SHARED_INDICATORS = ("rsi", "macd", "macd_signal", "stoch_k", "aroon_up", "aroon_down", "atr")
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays packed into one SharedMemory block. Workers attach by
+    name (``descriptor``) and get read-only views, so the price history and
+    cached indicators exist once no matter how many processes read them.
+    """
+
+    def __init__(self, arrays: dict):
+        size = sum(array.nbytes for array in arrays.values())
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            view = np.ndarray(array.shape, array.dtype, buffer=self.shm.buf, offset=offset)
+            view[...] = array
+            self.layout[name] = (offset, array.shape, array.dtype.str)
+            offset += array.nbytes
+
+    @property
+    def descriptor(self):
+        return self.shm.name, self.layout
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_arrays(descriptor):
+    name, layout = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    for key, (offset, shape, dtype) in layout.items():
+        view = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset)
+        view.flags.writeable = False
+        arrays[key] = view
+    return shm, arrays
+
+
+def build_cache(groups, bb_lengths):
+    """
+    Everything a trial needs that no threshold changes: the OHLCV blocks,
+    the parameter-free indicators and one Bollinger basis (mean, std) per
+    swept length. Band edges for a given ``bb_std`` are derived per trial.
+    """
+    arrays = {}
+    for index, (_, _, ohlcv) in enumerate(groups):
+        ind = compute_indicators(ohlcv, psar=False)
+        arrays[f"{index}:ohlcv"] = ohlcv
+        for key in SHARED_INDICATORS:
+            arrays[f"{index}:{key}"] = ind[key]
+        for length in bb_lengths:
+            middle, stdev = bollinger_basis(ohlcv[:, :, CLOSE], length)
+            arrays[f"{index}:bb_middle:{length}"] = middle
+            arrays[f"{index}:bb_stdev:{length}"] = stdev
+    return arrays
+
+
+def group_indicators(arrays, index, params: StrategyParams):
+    ohlcv = arrays[f"{index}:ohlcv"]
+    ind = {key: arrays[f"{index}:{key}"] for key in SHARED_INDICATORS}
+    ind["close"] = ohlcv[:, :, CLOSE]
+    middle = arrays[f"{index}:bb_middle:{params.bb_length}"]
+    width = params.bb_std * arrays[f"{index}:bb_stdev:{params.bb_length}"]
+    ind["bb_lower"] = middle - width
+    ind["bb_upper"] = middle + width
+    return ohlcv, ind
+
+
+def evaluate_params(arrays, groups, step_ms, params: StrategyParams, options: dict):
+    trades = []
+    closes = {}
+    for index, (first, symbols) in enumerate(groups):
+        ohlcv, ind = group_indicators(arrays, index, params)
+        status, tp, sl = evaluate_signals(
+            ohlcv,
+            params,
+            options["allow_buy"],
+            options["allow_sell"],
+            options["interval"],
+            step_ms,
+            ind=ind,
+        )
+        collect_trades(trades, symbols, first, step_ms, ohlcv, status, tp, sl)
+        for row, symbol in enumerate(symbols):
+            closes[symbol] = (first, ohlcv[row, :, CLOSE])
+    _, equity, quantities = run_portfolio(
+        trades, closes, step_ms, options["start_balance"], options["risk_pct"]
+    )
+    return trade_stats(trades, quantities, equity, options["start_balance"])
+
+
+_worker = {}
+
+
+def _init_worker(descriptor, groups, step_ms, options):
+    shm, arrays = attach_arrays(descriptor)
+    _worker.update(shm=shm, arrays=arrays, groups=groups, step_ms=step_ms, options=options)
+
+
+def _evaluate(values):
+    params = StrategyParams.from_dict(values)
+    stats = evaluate_params(
+        _worker["arrays"], _worker["groups"], _worker["step_ms"], params, _worker["options"]
+    )
+    return values, stats
+
+
+def candidates(space: dict, trials: int, seed: int = 0, exhaustive: bool = False):
+    """Parameter dicts to evaluate: the defaults first, then a grid or random sample."""
+    defaults = StrategyParams().to_dict()
+    baseline = {key: defaults[key] for key in space}
+    keys = list(space)
+    if exhaustive:
+        combos = (dict(zip(keys, values)) for values in itertools.product(*space.values()))
+        return [baseline] + [combo for combo in combos if combo != baseline]
+    rng = random.Random(seed)
+    seen = {tuple(baseline.values())}
+    picked = [baseline]
+    total = 1
+    for values in space.values():
+        total *= len(values)
+    while len(picked) < min(trials, total):
+        values = tuple(rng.choice(space[key]) for key in keys)
+        if values not in seen:
+            seen.add(values)
+            picked.append(dict(zip(keys, values)))
+    return picked
+
+
+def optimize(
+    history,
+    timeframe: str | None = None,
+    space: dict | None = None,
+    trials: int = 200,
+    exhaustive: bool = False,
+    workers: int | None = None,
+    metric: str = "calmar",
+    min_trades: int = 10,
+    seed: int = 0,
+    start_balance: float = 10_000.0,
+    risk_pct: float = 5.0,
+    allow_buy: bool = True,
+    allow_sell: bool = True,
+    interval: int | None = None,
+):
+    """
+    Evaluate parameter sets over ``history`` in a process pool. Returns the
+    results sorted best first as (score, params dict, stats) tuples.
+    """
+    space = space or SEARCH_SPACE
+    score_of = METRICS[metric]
+    step_ms, groups = prepare_history(history, timeframe)
+    bb_lengths = sorted(set(space.get("bb_length", [])) | {StrategyParams().bb_length})
+    options = {
+        "start_balance": start_balance,
+        "risk_pct": risk_pct,
+        "allow_buy": allow_buy,
+        "allow_sell": allow_sell,
+        "interval": interval,
+    }
+    trial_params = candidates(space, trials, seed, exhaustive)
+    workers = workers or os.cpu_count() or 1
+    layout = [(first, symbols) for first, symbols, _ in groups]
+
+    shared = SharedArrays(build_cache(groups, bb_lengths))
+    del groups  # workers read the shared copy
+    results = []
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared.descriptor, layout, step_ms, options),
+        ) as pool:
+            chunksize = max(1, len(trial_params) // (workers * 4))
+            for values, stats in pool.map(_evaluate, trial_params, chunksize=chunksize):
+                score = score_of(stats) if stats["trades"] >= min_trades else float("-inf")
+                results.append((score, values, stats))
+    finally:
+        shared.close()
+    results.sort(key=lambda result: result[0], reverse=True)
+    return results
+
+
+def write_results(path: Path, profile: str, results, metric: str, top: int = 5):
+    """Write a file whose ``strategy`` section can be pasted into (or merged with) user.json."""
+    best_score, best_values, best_stats = results[0]
+    payload = {
+        "strategy": {profile: StrategyParams.from_dict(best_values).to_dict()},
+        "optimization": {
+            profile: {
+                "metric": metric,
+                "score": best_score,
+                "stats": best_stats,
+                "runners_up": [
+                    {"score": score, "params": values, "stats": stats}
+                    for score, values, stats in results[1:top]
+                ],
+            }
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=4)
+    return payload
+
+
+def main(argv=None):
+    from engine import PROFILE_PARAMS, EngineSettings, load_settings, save_settings
+
+    parser = argparse.ArgumentParser(description="Sweep strategy thresholds over local candle files.")
+    parser.add_argument("source", help="directory of BASE_QUOTE.csv/.parquet files for the profile's timeframe")
+    parser.add_argument("--store", action="store_true", help="SOURCE is the bot's candle store (cache/candles)")
+    parser.add_argument("--exchange", default="binance", help="exchange folder inside the candle store")
+    parser.add_argument("--profile", choices=sorted(PROFILE_PARAMS), default="swing")
+    parser.add_argument("--timeframe", help="bar size of the files (default: the profile's)")
+    parser.add_argument("--symbols", nargs="*", help="only these pairs, e.g. BTC/USDT")
+    parser.add_argument("--config", default="user.json", help="balance, risk %%, toggles and interval source")
+    parser.add_argument("--trials", type=int, default=200, help="random parameter sets to try")
+    parser.add_argument("--grid", action="store_true", help="try the full grid instead of sampling")
+    parser.add_argument("--workers", type=int, help="processes (default: CPU count)")
+    parser.add_argument("--metric", choices=sorted(METRICS), default="calmar")
+    parser.add_argument("--min-trades", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="optimized.json", help="where to write the best parameters")
+    parser.add_argument("--apply", action="store_true", help="also store them in --config under strategy")
+    args = parser.parse_args(argv)
+
+    config_path = Path(args.config)
+    raw_settings = load_settings(config_path)
+    settings = EngineSettings.from_dict(raw_settings, profile=args.profile)
+    timeframe = args.timeframe or PROFILE_PARAMS[args.profile][0]
+
+    if args.store:
+        from market_data import CandleStore
+
+        history = CandleStore(Path(args.source), args.exchange).history(timeframe, args.symbols)
+    else:
+        history = load_history(args.source, args.symbols)
+    if not history:
+        print(f"No candle files found in {args.source}")
+        return 1
+    started = time.perf_counter()
+    results = optimize(
+        history,
+        timeframe,
+        trials=args.trials,
+        exhaustive=args.grid,
+        workers=args.workers,
+        metric=args.metric,
+        min_trades=args.min_trades,
+        seed=args.seed,
+        start_balance=settings.paper_start_balance,
+        risk_pct=settings.paper_risk_pct,
+        allow_buy=settings.allow_buy,
+        allow_sell=settings.allow_sell,
+        interval=settings.interval,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"{len(results)} parameter sets on {len(history)} pairs in {elapsed:.1f}s")
+    for score, values, stats in results[:5]:
+        print(
+            f"{args.metric} {score:8.3f} | return {stats['total_return']*100:+.2f}% | "
+            f"dd {stats['max_drawdown']*100:.2f}% | trades {stats['trades']} | "
+            f"win {stats['win_rate']*100:.1f}% | {values}"
+        )
+    if results[0][0] == float("-inf"):
+        print(f"No parameter set produced {args.min_trades} trades; nothing written.")
+        return 1
+
+    payload = write_results(Path(args.output), args.profile, results, args.metric)
+    print(f"Best {args.profile} parameters written to {args.output}")
+    if args.apply:
+        raw_settings.setdefault("strategy", {})[args.profile] = payload["strategy"][args.profile]
+        save_settings(raw_settings, config_path)
+        print(f"Applied to {config_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,48 @@
+def valuation_pairs(assets, quote: str, markets: dict):
+    """
+    {asset: (symbol, inverted)} for the market that prices each asset in
+    ``quote``: ``ASSET/quote`` when listed, else ``quote/ASSET`` (fiat and
+    some stablecoins) read inverted. Assets with neither are left out.
+    """
+    pairs = {}
+    for asset in assets:
+        if asset == quote:
+            continue
+        if f"{asset}/{quote}" in markets:
+            pairs[asset] = (f"{asset}/{quote}", False)
+        elif f"{quote}/{asset}" in markets:
+            pairs[asset] = (f"{quote}/{asset}", True)
+    return pairs
+
+
+def value_balances(balances: dict, tickers: dict, pairs: dict, quote: str = "USDT"):
+    """
+    One row per non-zero asset of a ccxt balance: total/free/used, the price
+    in ``quote`` and the value (None when no ticker prices it). Largest
+    value first.
+    """
+    free = balances.get("free") or {}
+    used = balances.get("used") or {}
+    rows = []
+    for asset, total in (balances.get("total") or {}).items():
+        if not total or total <= 0:
+            continue
+        price = 1.0 if asset == quote else None
+        if asset in pairs:
+            symbol, inverted = pairs[asset]
+            ticker = tickers.get(symbol) or {}
+            last = ticker.get("last") or ticker.get("close")
+            if last:
+                price = 1 / last if inverted else last
+        rows.append(
+            {
+                "asset": asset,
+                "total": total,
+                "free": free.get(asset) or 0.0,
+                "used": used.get(asset) or 0.0,
+                "price": price,
+                "value": total * price if price is not None else None,
+            }
+        )
+    rows.sort(key=lambda row: -(row["value"] or 0.0))
+    return rows
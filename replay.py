@@ -0,0 +1,461 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, fields, replace
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from telegram.request import BaseRequest, HTTPXRequest
+
+ARCHIVE_VERSION = 1
+# Query/body parameters that change on every call (signing, clocks) and
+# never identify a response; they are not stored either.
+VOLATILE_PARAMS = {"timestamp", "signature", "recvWindow", "nonce"}
+# Ignored for the fallback match: "the next candles" is the same call.
+TIME_PARAMS = {"startTime", "endTime", "since", "limit", "from", "to"}
+# Response headers kept for the rate-limit governor; the rest is noise.
+KEPT_HEADERS = {"x-mbx-used-weight", "x-mbx-used-weight-1m", "retry-after"}
+SECRET_SETTINGS = ("bot_token", "api_key", "api_secret")
+ATTACH_NAME = re.compile(r"attach://[\w-]+")
+
+
+def _strip(query: str, drop):
+    return urlencode(sorted((k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k not in drop))
+
+
+def normalize_url(url: str, drop=VOLATILE_PARAMS):
+    """Sorted query without ``drop`` params, bot token masked."""
+    parts = urlsplit(url)
+    path = re.sub(r"/bot[^/]+/", "/bot<token>/", parts.path)
+    return urlunsplit((parts.scheme, parts.netloc, path, _strip(parts.query, drop), ""))
+
+
+def _normalize_body(body):
+    if body is None:
+        return None
+    if isinstance(body, dict):
+        # Uploads get a random attach:// name on every send.
+        return {key: ATTACH_NAME.sub("attach://file", value) if isinstance(value, str) else value for key, value in body.items()}
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    # Signed form bodies carry timestamp/signature like the query does.
+    if "=" in body and not body.lstrip().startswith(("{", "[")):
+        return _strip(body, VOLATILE_PARAMS)
+    return body
+
+
+def _kept_headers(headers):
+    return {key: value for key, value in (headers or {}).items() if key.lower() in KEPT_HEADERS}
+
+
+def settings_snapshot(settings):
+    """EngineSettings as JSON, without credentials."""
+    if settings is None:
+        return None
+    snapshot = asdict(settings)
+    for name in SECRET_SETTINGS:
+        snapshot.pop(name, None)
+    return snapshot
+
+
+def settings_from_snapshot(snapshot: dict, **overrides):
+    from engine import EngineSettings
+    from strategy import StrategyParams
+
+    known = {field.name for field in fields(EngineSettings)}
+    values = {key: tuple(value) if isinstance(value, list) else value for key, value in snapshot.items() if key in known}
+    values["strategy"] = StrategyParams.from_dict(snapshot.get("strategy"))
+    values.update(overrides)
+    return EngineSettings(**values)
+
+
+def load_archive(path):
+    """(header, [entries]) from a recorded archive; a torn last line is ignored."""
+    header, entries = {}, []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if "ch" in record:
+                    entries.append(record)
+                else:
+                    header = record
+        except EOFError:
+            pass  # recording was killed before the gzip trailer
+    if header.get("version", ARCHIVE_VERSION) != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported archive version {header.get('version')}")
+    return header, entries
+
+
+class _RecordingRequest(BaseRequest):
+    def __init__(self, recorder, inner: BaseRequest):
+        self.recorder = recorder
+        self.inner = inner
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        body = request_data.json_parameters if request_data is not None else None
+        started, clock = time.time(), time.perf_counter()
+        try:
+            status, payload = await self.inner.do_request(url, method, request_data, *args, **kwargs)
+        except Exception as exc:
+            self.recorder.record("telegram", method, url, body, started, time.perf_counter() - clock, error=exc)
+            raise
+        self.recorder.record(
+            "telegram",
+            method,
+            url,
+            body,
+            started,
+            time.perf_counter() - clock,
+            status=status,
+            response=payload.decode("utf-8", "replace"),
+        )
+        return status, payload
+
+
+class IORecorder:
+    """
+    Appends every exchange, CoinGecko and Telegram request with its response,
+    start time and latency to a gzip JSON-lines archive. Signatures,
+    timestamps, API keys and the bot token are not written. The first line
+    holds the engine settings so a replay can rebuild the same run.
+    """
+
+    def __init__(self, path, settings=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self.records = 0
+        self._write({"archive": "io", "version": ARCHIVE_VERSION, "created": time.time(), "settings": settings_snapshot(settings)})
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def record(self, channel, method, url, body, started, latency, status=None, response=None, headers=None, error=None):
+        entry = {
+            "ch": channel,
+            "at": int(started * 1000),
+            "latency": round(latency, 6),
+            "method": method,
+            "url": normalize_url(url),
+            "body": _normalize_body(body),
+        }
+        if status is not None:
+            entry["status"] = status
+        if headers:
+            entry["headers"] = headers
+        if error is not None:
+            entry["error"] = [type(error).__name__, str(error)]
+        else:
+            entry["response"] = response
+        self._write(entry)
+        self.records += 1
+
+    def wrap_exchange(self, client):
+        fetch = client.fetch
+
+        async def recorded_fetch(url, method="GET", headers=None, body=None):
+            started, clock = time.time(), time.perf_counter()
+            try:
+                response = await fetch(url, method, headers, body)
+            except Exception as exc:
+                self.record(
+                    "exchange", method, url, body, started, time.perf_counter() - clock,
+                    headers=_kept_headers(getattr(client, "last_response_headers", None)), error=exc,
+                )
+                raise
+            self.record(
+                "exchange", method, url, body, started, time.perf_counter() - clock,
+                response=response, headers=_kept_headers(getattr(client, "last_response_headers", None)),
+            )
+            return response
+
+        client.fetch = recorded_fetch
+        return client
+
+    def telegram_request(self):
+        return _RecordingRequest(self, HTTPXRequest())
+
+    def http_get(self, url: str, timeout: float):
+        import requests
+
+        started, clock = time.time(), time.perf_counter()
+        try:
+            response = requests.get(url, timeout=timeout)
+            payload = response.json() if response.ok else None
+        except Exception as exc:
+            self.record("http", "GET", url, None, started, time.perf_counter() - clock, error=exc)
+            raise
+        self.record("http", "GET", url, None, started, time.perf_counter() - clock, status=response.status_code, response=payload)
+        response.raise_for_status()
+        return payload
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+class _ReplayRequest(BaseRequest):
+    def __init__(self, replayer):
+        self.replayer = replayer
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        from telegram.error import NetworkError
+
+        body = request_data.json_parameters if request_data is not None else None
+        entry = self.replayer.take("telegram", method, url, body)
+        self.replayer.sent.append((normalize_url(url).rsplit("/", 1)[-1], _normalize_body(body)))
+        delay = self.replayer.delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        if "error" in entry:
+            raise NetworkError(entry["error"][1])
+        return entry.get("status", 200), entry["response"].encode("utf-8")
+
+
+class IOReplayer:
+    """
+    Serves an IORecorder archive back in place of the network. A request gets
+    the next unused recording of the same call (exact parameters first, then
+    the same endpoint ignoring time/limit parameters); once those run out the
+    last one is repeated. Latencies are reproduced at ``speed`` (1: as
+    recorded, 0: no waiting), and the exchange clock follows the recording.
+    """
+
+    def __init__(self, path, speed: float = 0.0):
+        self.header, self.entries = load_archive(path)
+        self.settings = self.header.get("settings")
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._loose = {}
+        self._last = {}
+        self._used = set()
+        for index, entry in enumerate(self.entries):
+            self._exact.setdefault(self._key(entry["ch"], entry["method"], entry["url"], entry.get("body")), deque()).append(index)
+            self._loose.setdefault(self._loose_key(entry["ch"], entry["method"], entry["url"]), deque()).append(index)
+        self.now_ms = self.entries[0]["at"] if self.entries else int(time.time() * 1000)
+        self.served = 0
+        self.repeated = 0
+        self.missed = 0
+        # Telegram calls made during the replay, to compare runs.
+        self.sent = []
+
+    @staticmethod
+    def _key(channel, method, url, body):
+        return channel, method, normalize_url(url), json.dumps(_normalize_body(body), sort_keys=True)
+
+    @staticmethod
+    def _loose_key(channel, method, url):
+        # Host-free too, so a recording made against a local stand-in still matches.
+        parts = urlsplit(normalize_url(url, VOLATILE_PARAMS | TIME_PARAMS))
+        return channel, method, parts.path, parts.query
+
+    def _pop(self, queue):
+        while queue:
+            index = queue.popleft()
+            if index not in self._used:
+                self._used.add(index)
+                return self.entries[index]
+        return None
+
+    def take(self, channel, method, url, body=None):
+        loose = self._loose_key(channel, method, url)
+        with self._lock:
+            entry = self._pop(self._exact.get(self._key(channel, method, url, body))) or self._pop(self._loose.get(loose))
+            if entry is not None:
+                self.served += 1
+            else:
+                entry = self._last.get(loose)
+                if entry is None:
+                    self.missed += 1
+                    raise ReplayMiss(f"No recorded response for {channel} {method} {normalize_url(url)}")
+                self.repeated += 1
+            self._last[loose] = entry
+            self.now_ms = max(self.now_ms, entry["at"] + int(entry["latency"] * 1000))
+            return entry
+
+    def delay(self, entry):
+        return entry["latency"] / self.speed if self.speed > 0 else 0.0
+
+    def wrap_exchange(self, client):
+        async def replayed_fetch(url, method="GET", headers=None, body=None):
+            entry = self.take("exchange", method, url, body)
+            delay = self.delay(entry)
+            if delay:
+                await asyncio.sleep(delay)
+            client.last_response_headers = entry.get("headers") or {}
+            if "error" in entry:
+                raise _exchange_error(*entry["error"])
+            return entry.get("response")
+
+        client.fetch = replayed_fetch
+        client.milliseconds = lambda: self.now_ms
+        return client
+
+    def telegram_request(self):
+        return _ReplayRequest(self)
+
+    def http_get(self, url: str, timeout: float):
+        entry = self.take("http", "GET", url)
+        delay = self.delay(entry)
+        if delay:
+            time.sleep(delay)
+        if "error" in entry:
+            raise RuntimeError(entry["error"][1])
+        if entry.get("status", 200) >= 400:
+            raise RuntimeError(f"HTTP {entry['status']} for {url}")
+        return entry.get("response")
+
+    def digest(self):
+        """Hash of every Telegram call made, independent of their order."""
+        calls = sorted(json.dumps(call, sort_keys=True, default=str) for call in self.sent)
+        return hashlib.sha256("\n".join(calls).encode()).hexdigest()[:16]
+
+    def close(self):
+        pass
+
+
+def _exchange_error(name, message):
+    from ccxt.base import errors
+
+    error = getattr(errors, name, None)
+    if not (isinstance(error, type) and issubclass(error, Exception)):
+        error = errors.NetworkError
+    return error(message)
+
+
+async def replay_cycles(path, cycles: int = 3, speed: float = 0.0, keep_limits: bool = False, settings=None):
+    """
+    Run the recorded bot cycle ``cycles`` times against the archive: every
+    pair through scan_symbol, as the scheduler does. Returns timings, stage
+    percentiles, archive hit counts and the digest of what was sent.
+    """
+    from engine import BotEngine
+    from telegram_sender import TokenBucket
+
+    tap = IOReplayer(path, speed)
+    if settings is None:
+        if not tap.settings:
+            raise ValueError(f"{path} has no settings snapshot; pass --config")
+        settings = settings_from_snapshot(tap.settings)
+    overrides = {
+        "bot_token": "0:REPLAY",
+        "state_dir": tempfile.mkdtemp(prefix="replay-"),
+        "candle_store": False,
+        "metrics_port": 0,
+        "io_record": "",
+        "stream_enabled": False,
+    }
+    if not keep_limits:
+        overrides["exchange_weight_per_minute"] = 1e12
+    settings = replace(settings, **overrides)
+    engine = BotEngine(settings, ads=[], tap=tap)
+    await engine.ensure_exchange()
+    sender = await engine.get_sender()
+    if not keep_limits:
+        sender.global_bucket = TokenBucket(1e9, 1e9)
+        sender.chat_buckets[settings.chat_id] = TokenBucket(1e9, 1e9)
+    semaphore = asyncio.Semaphore(settings.max_concurrency)
+    symbols = settings.symbols
+    timings = []
+    try:
+        for _ in range(cycles):
+            started = time.perf_counter()
+            symbols = await engine.screen_market(settings) if settings.screener_enabled else settings.symbols
+            await asyncio.gather(*(engine.scan_symbol(symbol, semaphore, None) for symbol in symbols))
+            timings.append(time.perf_counter() - started)
+        try:
+            await asyncio.wait_for(sender.queue.join(), timeout=60)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        summary = engine.metrics.summary()
+        await engine.close()
+    return {
+        "pairs": len(symbols),
+        "cycle_seconds": timings,
+        "stages": {stage: {key: values[key] for key in ("count", "p50", "p95")} for stage, values in summary.items()},
+        "served": tap.served,
+        "repeated": tap.repeated,
+        "missed": tap.missed,
+        "recorded": len(tap.entries),
+        "telegram_calls": len(tap.sent),
+        "digest": tap.digest(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded I/O archive through the bot offline.")
+    parser.add_argument("archive", help="archive written with io_record")
+    parser.add_argument("--cycles", type=int, default=3, help="scan passes over the recorded pairs")
+    parser.add_argument("--speed", type=float, default=0, help="1: recorded latencies, 2: twice as fast, 0: no waiting")
+    parser.add_argument("--keep-limits", action="store_true", help="keep the exchange and Telegram rate limits")
+    parser.add_argument("--config", help="settings to use instead of the ones recorded in the archive")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    settings = None
+    if args.config:
+        from engine import EngineSettings, load_settings
+
+        settings = EngineSettings.from_dict(load_settings(Path(args.config)))
+    result = asyncio.run(replay_cycles(args.archive, args.cycles, args.speed, args.keep_limits, settings))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    from metrics import format_summary
+
+    cycles = " ".join(f"{seconds:.2f}s" for seconds in result["cycle_seconds"])
+    print(f"{result['pairs']} pairs, cycles: {cycles}")
+    print(
+        f"archive: {result['served']}/{result['recorded']} served, {result['repeated']} repeated, "
+        f"{result['missed']} missed; {result['telegram_calls']} Telegram calls, digest {result['digest']}"
+    )
+    print(format_summary(result["stages"]))
+    return 0 if not result["missed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
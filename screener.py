@@ -0,0 +1,68 @@
+import numpy as np
+
+# Stablecoin (and fiat/gold-pegged) bases: liquid, but never a signal.
+EXCLUDED_BASES = {"USDC", "FDUSD", "TUSD", "BUSD", "DAI", "USDP", "EUR", "PAXG", "USDE"}
+
+
+def _percentile_ranks(values):
+    """0..1 rank of each value among all of them (ties share the average rank)."""
+    if len(values) < 2:
+        return np.ones(len(values))
+    order = values.argsort(kind="stable")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return (sums / counts)[inverse] / (len(values) - 1)
+
+
+def rank_tickers(
+    tickers: dict,
+    quote: str = "USDT",
+    min_quote_volume: float = 0.0,
+    weights=(0.5, 0.3, 0.2),
+):
+    """
+    Rank spot ``BASE/quote`` pairs from one fetch_tickers payload by a blend
+    of percentile ranks: quote volume, absolute % change and the day's range
+    relative to the last price. Returns [(symbol, score, volume, change_pct,
+    range_pct)] best first.
+    """
+    suffix = f"/{quote}"
+    symbols, volumes, changes, ranges = [], [], [], []
+    for symbol, ticker in tickers.items():
+        if not symbol.endswith(suffix):
+            continue  # also drops derivatives such as BTC/USDT:USDT
+        base = symbol[: -len(suffix)]
+        if base in EXCLUDED_BASES:
+            continue
+        last = ticker.get("last") or ticker.get("close")
+        high, low = ticker.get("high"), ticker.get("low")
+        volume = ticker.get("quoteVolume")
+        if volume is None and ticker.get("baseVolume") is not None and last:
+            volume = ticker["baseVolume"] * last
+        if not last or volume is None or volume < min_quote_volume:
+            continue
+        change = ticker.get("percentage")
+        if change is None and ticker.get("open"):
+            change = (last / ticker["open"] - 1) * 100
+        symbols.append(symbol)
+        volumes.append(volume)
+        changes.append(abs(change or 0.0))
+        ranges.append((high - low) / last * 100 if high is not None and low is not None else 0.0)
+    if not symbols:
+        return []
+    volumes = np.asarray(volumes, dtype=float)
+    changes = np.asarray(changes, dtype=float)
+    ranges = np.asarray(ranges, dtype=float)
+    w_volume, w_change, w_range = weights
+    scores = (
+        w_volume * _percentile_ranks(volumes)
+        + w_change * _percentile_ranks(changes)
+        + w_range * _percentile_ranks(ranges)
+    )
+    order = np.argsort(-scores, kind="stable")
+    return [
+        (symbols[i], float(scores[i]), float(volumes[i]), float(changes[i]), float(ranges[i]))
+        for i in order
+    ]
@@ -0,0 +1,148 @@
+import asyncio
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from charts import render_chart
+from indicators import IndicatorEngine
+
+
+class SharedCandleBuffer:
+    """
+    Fixed (slots x window x OHLCV) float64 array in shared memory plus a row
+    count per slot. The coordinator writes a pair's fetched window into its
+    slot; the shard that owns the pair reads it in place, so candles never
+    get pickled.
+    """
+
+    def __init__(self, slots: int, window: int):
+        self.slots = slots
+        self.window = window
+        candle_bytes = slots * window * 6 * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=candle_bytes + slots * 8)
+        self.candles = np.ndarray((slots, window, 6), np.float64, buffer=self.shm.buf)
+        self.lengths = np.ndarray((slots,), np.int64, buffer=self.shm.buf, offset=candle_bytes)
+        self.lengths[:] = 0
+        self.assigned = {}
+
+    @property
+    def descriptor(self):
+        return self.shm.name, self.slots, self.window
+
+    def slot_for(self, symbol: str, keep=()):
+        """The pair's slot; when all are taken, reclaim those not in ``keep``."""
+        slot = self.assigned.get(symbol)
+        if slot is not None:
+            return slot
+        if len(self.assigned) >= self.slots:
+            stale = [name for name in self.assigned if name not in keep]
+            if not stale:
+                raise RuntimeError(f"Shared candle buffer full ({self.slots} pairs)")
+            for name in stale:
+                del self.assigned[name]
+        used = set(self.assigned.values())
+        slot = next(index for index in range(self.slots) if index not in used)
+        self.assigned[symbol] = slot
+        return slot
+
+    def write(self, slot: int, ohlcv):
+        rows = np.asarray(ohlcv[-self.window:], dtype=np.float64)
+        self.candles[slot, : len(rows)] = rows
+        self.lengths[slot] = len(rows)
+
+    def close(self):
+        self.candles = None
+        self.lengths = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Per-process shard state (lives in the worker).
+_shard = {}
+
+
+def _shard_init(descriptor):
+    name, slots, window = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    candle_bytes = slots * window * 6 * 8
+    _shard.update(
+        shm=shm,
+        candles=np.ndarray((slots, window, 6), np.float64, buffer=shm.buf),
+        lengths=np.ndarray((slots,), np.int64, buffer=shm.buf, offset=candle_bytes),
+        engines={},
+        latest={},
+    )
+
+
+def _shard_analyze(symbol: str, slot: int, window: int, bb_length: int, bb_std: float):
+    length = int(_shard["lengths"][slot])
+    rows = _shard["candles"][slot, :length].tolist()
+    ohlcv = [[int(row[0]), *row[1:]] for row in rows]
+    engine = _shard["engines"].get(symbol)
+    if engine is None or (engine.window, engine.bb_length, engine.bb_std) != (window, bb_length, bb_std):
+        engine = _shard["engines"][symbol] = IndicatorEngine(window=window, bb_length=bb_length, bb_std=bb_std)
+    values = engine.sync(ohlcv)
+    _shard["latest"][symbol] = (values, length)
+    return values
+
+
+def _shard_render(symbol: str, options: tuple):
+    values, length = _shard["latest"][symbol]
+    history = _shard["engines"][symbol].series(values, length)
+    return render_chart(options, symbol, history)
+
+
+def _shard_reset():
+    _shard["engines"].clear()
+    _shard["latest"].clear()
+
+
+class ShardPool:
+    """
+    Pairs split across single-process executors by a stable hash, so each
+    pair's streaming indicator state and chart renderer stay warm in one
+    process. The coordinator keeps all I/O (fetching, sending, the GUI) and
+    gets back plain indicator values and rendered chart bytes.
+    """
+
+    def __init__(self, shards: int, slots: int = 1024, window: int = 240):
+        self.buffer = SharedCandleBuffer(slots, window)
+        # spawn: the coordinator runs an event-loop thread (and maybe Qt),
+        # which must not be forked.
+        context = multiprocessing.get_context("spawn")
+        self.executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_shard_init,
+                initargs=(self.buffer.descriptor,),
+            )
+            for _ in range(max(1, int(shards)))
+        ]
+
+    def _executor(self, symbol: str):
+        return self.executors[zlib.crc32(symbol.encode()) % len(self.executors)]
+
+    async def analyze(self, symbol: str, ohlcv, window: int, bb_length: int, bb_std: float, keep=()):
+        slot = self.buffer.slot_for(symbol, keep)
+        self.buffer.write(slot, ohlcv)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor(symbol), _shard_analyze, symbol, slot, min(window, self.buffer.window), bb_length, bb_std
+        )
+
+    async def render(self, symbol: str, options: tuple):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(symbol), _shard_render, symbol, options)
+
+    def reset(self):
+        for executor in self.executors:
+            executor.submit(_shard_reset)
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.buffer.close()
@@ -0,0 +1,74 @@
+import json
+import math
+import os
+import time
+from pathlib import Path
+
+
+def signal_fingerprint(profile, status, votes, risk_score, tp, sl, risk_bucket: int = 10, price_step_pct: float = 0.5):
+    """
+    What a reader of the message would act on. Risk is bucketed and TP/SL
+    are rounded to ``price_step_pct`` steps on a log scale, so the steps do
+    not move with the price itself.
+    """
+    step = math.log1p(price_step_pct / 100) if price_step_pct > 0 else None
+
+    def level(price):
+        if step is None or not price or price <= 0 or math.isnan(price):
+            return None
+        return round(math.log(price) / step)
+
+    return [
+        profile,
+        status,
+        votes["buy"],
+        votes["sell"],
+        votes["neutral"],
+        int(risk_score) // max(1, risk_bucket),
+        level(tp),
+        level(sl),
+    ]
+
+
+class SignalStateCache:
+    """
+    Last sent fingerprint and send time per pair, kept in a small JSON file so
+    a restart does not resend every unchanged signal.
+    """
+
+    def __init__(self, path: Path, heartbeat: float = 3600):
+        self.path = Path(path)
+        self.heartbeat = heartbeat
+        self.states = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.states = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as exc:
+            print(f"Signal state unreadable, starting fresh: {exc}")
+
+    def should_send(self, symbol: str, fingerprint, now: float | None = None):
+        state = self.states.get(symbol)
+        if state is None or state["fingerprint"] != fingerprint:
+            return True
+        now = time.time() if now is None else now
+        return bool(self.heartbeat) and now - state["sent_at"] >= self.heartbeat
+
+    def record(self, symbol: str, fingerprint, now: float | None = None):
+        self.states[symbol] = {
+            "fingerprint": fingerprint,
+            "sent_at": time.time() if now is None else now,
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.states, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self.dirty = False
@@ -0,0 +1,309 @@
+import numpy as np
+
+from strategy import StrategyParams
+
+OPEN, HIGH, LOW, CLOSE, VOLUME = 0, 1, 2, 3, 4
+
+STATUS_SELL, STATUS_NEUTRAL, STATUS_BUY = -1, 0, 1
+STATUS_NAMES = {STATUS_SELL: "Sell", STATUS_NEUTRAL: "Neutral", STATUS_BUY: "Buy"}
+
+EPSILON = 2.220446049250313e-16
+
+# Bars per matrix product in _recurrence and per reduction in _rolling.
+RECURRENCE_BLOCK = 64
+ROLLING_CHUNK = 1 << 15
+
+
+def stack_ohlcv(candles_by_symbol: dict, bars: int):
+    """
+    Build a (symbols, bars, 5) float array from ccxt candle lists, keeping the
+    last ``bars`` candles. Symbols with a shorter history are skipped.
+    """
+    symbols = []
+    rows = []
+    for symbol, candles in candles_by_symbol.items():
+        if len(candles) < bars:
+            continue
+        symbols.append(symbol)
+        rows.append([candle[1:6] for candle in candles[-bars:]])
+    if not rows:
+        return symbols, np.empty((0, bars, 5))
+    return symbols, np.asarray(rows, dtype=float)
+
+
+def _windows(values, length):
+    return np.lib.stride_tricks.sliding_window_view(values, length, axis=1)
+
+
+def _rolling(values, length, reducer):
+    # Reduce in column chunks so reducers that materialize the windows
+    # (np.std) stay bounded on long histories.
+    out = np.full(values.shape, np.nan)
+    bars = values.shape[1]
+    for begin in range(length - 1, bars, ROLLING_CHUNK):
+        end = min(bars, begin + ROLLING_CHUNK)
+        out[:, begin:end] = reducer(_windows(values[:, begin - length + 1:end], length), axis=-1)
+    return out
+
+
+def _recurrence(values, alpha, seed, start):
+    """
+    a[start] = seed, a[t] = a[t-1] + alpha * (x[t] - a[t-1]) for every row.
+    The recurrence is linear, so each block of bars is one matrix product
+    with a decay kernel plus the carried-in value: the Python loop runs
+    bars / RECURRENCE_BLOCK times instead of once per bar.
+    """
+    out = np.full(values.shape, np.nan)
+    out[:, start] = seed
+    decay = 1.0 - alpha
+    steps = np.arange(RECURRENCE_BLOCK)
+    lag = steps[None, :] - steps[:, None]
+    kernel = np.where(lag >= 0, alpha * decay ** np.maximum(lag, 0), 0.0)
+    carry = decay ** (steps + 1)
+    previous = out[:, start]
+    for begin in range(start + 1, values.shape[1], RECURRENCE_BLOCK):
+        chunk = values[:, begin:begin + RECURRENCE_BLOCK]
+        width = chunk.shape[1]
+        block = chunk @ kernel[:width, :width] + previous[:, None] * carry[:width]
+        out[:, begin:begin + width] = block
+        previous = block[:, -1]
+    return out
+
+
+def _wilder(values, length, start):
+    """RMA seeded with the first value at ``start`` (pandas ewm adjust=False)."""
+    if values.shape[1] <= start:
+        return np.full(values.shape, np.nan)
+    out = _recurrence(values, 1 / length, values[:, start], start)
+    out[:, :start + length - 1] = np.nan
+    return out
+
+
+def _ema(values, length, start=0):
+    """EMA seeded with the SMA of the first ``length`` values after ``start``."""
+    seed_at = start + length - 1
+    if values.shape[1] <= seed_at:
+        return np.full(values.shape, np.nan)
+    seed = values[:, start:seed_at + 1].mean(axis=1)
+    return _recurrence(values, 2 / (length + 1), seed, seed_at)
+
+
+def _psar(high, low, close, af0=0.02, af_start=0.02, max_af=0.2):
+    symbols, bars = high.shape
+    long = np.full(high.shape, np.nan)
+    short = np.full(high.shape, np.nan)
+    if bars < 2:
+        return long, short
+    up = high[:, 1] - high[:, 0]
+    down = low[:, 0] - low[:, 1]
+    falling = (down > up) & (down > 0)
+    sar = close[:, 0].copy()
+    ep = np.where(falling, low[:, 0], high[:, 0])
+    af = np.full(symbols, af_start)
+    for t in range(1, bars):
+        prev2 = max(t - 2, 0)
+        candidate = sar + af * (ep - sar)
+        reverse = np.where(falling, high[:, t] > candidate, low[:, t] < candidate)
+        extend = np.where(falling, low[:, t] < ep, high[:, t] > ep)
+        ep = np.where(extend, np.where(falling, low[:, t], high[:, t]), ep)
+        af = np.where(extend, np.minimum(af + af0, max_af), af)
+        candidate = np.where(
+            falling,
+            np.maximum(np.maximum(high[:, t - 1], high[:, prev2]), candidate),
+            np.minimum(np.minimum(low[:, t - 1], low[:, prev2]), candidate),
+        )
+        candidate = np.where(reverse, ep, candidate)
+        af = np.where(reverse, af0, af)
+        falling = np.where(reverse, ~falling, falling)
+        ep = np.where(reverse, np.where(falling, low[:, t], high[:, t]), ep)
+        sar = candidate
+        long[:, t] = np.where(falling, np.nan, sar)
+        short[:, t] = np.where(falling, sar, np.nan)
+    return long, short
+
+
+def bollinger_basis(close, length: int = 20):
+    """Rolling mean and population std of ``close``; bands are mean +/- k * std."""
+    return _rolling(close, length, np.mean), _rolling(close, length, np.std)
+
+
+def compute_indicators(ohlcv, bb_length: int = 20, bb_std: float = 2.0, psar: bool = True):
+    """
+    All indicators for every symbol and bar of a (symbols, bars, 5) array.
+    RMA/EMA run blockwise (see _recurrence), window indicators are fully
+    vectorized; PSAR loops over bars and can be skipped with ``psar=False``
+    when only the voting inputs are needed (backtests).
+    """
+    high = ohlcv[:, :, HIGH]
+    low = ohlcv[:, :, LOW]
+    close = ohlcv[:, :, CLOSE]
+    volume = ohlcv[:, :, VOLUME]
+
+    diff = np.full(close.shape, np.nan)
+    diff[:, 1:] = np.diff(close, axis=1)
+    avg_gain = _wilder(np.maximum(diff, 0.0), 14, start=1)
+    avg_loss = _wilder(np.maximum(-diff, 0.0), 14, start=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = 100 * avg_gain / (avg_gain + avg_loss)
+
+    prev_close = np.full(close.shape, np.nan)
+    prev_close[:, 1:] = close[:, :-1]
+    true_range = np.fmax(
+        high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close))
+    )
+    atr = _wilder(true_range, 14, start=1)
+
+    macd = _ema(close, 12) - _ema(close, 26)
+    macd_signal = _ema(np.nan_to_num(macd), 9, start=25)
+
+    lowest = _rolling(low, 14, np.min)
+    highest = _rolling(high, 14, np.max)
+    span = highest - lowest
+    span[span == 0] = EPSILON
+    raw_stoch = 100 * (close - lowest) / span
+    stoch_k = _rolling(raw_stoch, 3, np.mean)
+    stoch_d = _rolling(stoch_k, 3, np.mean)
+
+    aroon_up = np.full(close.shape, np.nan)
+    aroon_down = np.full(close.shape, np.nan)
+    if close.shape[1] >= 15:
+        # argmax over the reversed window = bars since the most recent extreme
+        aroon_up[:, 14:] = 100 * (1 - np.argmax(_windows(high, 15)[..., ::-1], axis=-1) / 14)
+        aroon_down[:, 14:] = 100 * (1 - np.argmin(_windows(low, 15)[..., ::-1], axis=-1) / 14)
+
+    direction = np.sign(np.nan_to_num(diff))
+    direction[:, 0] = 1
+    obv = np.cumsum(direction * volume, axis=1)
+
+    bb_middle, bb_stdev = bollinger_basis(close, bb_length)
+    bb_width = bb_std * bb_stdev
+
+    ind = {
+        "close": close,
+        "volume": volume,
+        "rsi": rsi,
+        "macd": macd,
+        "macd_signal": macd_signal,
+        "macd_hist": macd - macd_signal,
+        "stoch_k": stoch_k,
+        "stoch_d": stoch_d,
+        "aroon_up": aroon_up,
+        "aroon_down": aroon_down,
+        "obv": obv,
+        "bb_lower": bb_middle - bb_width,
+        "bb_middle": bb_middle,
+        "bb_upper": bb_middle + bb_width,
+        "atr": atr,
+    }
+    if psar:
+        ind["psar_long"], ind["psar_short"] = _psar(high, low, close)
+    return ind
+
+
+def _vote(buy, sell):
+    """+1 / -1 / 0 per cell; NaN inputs make both masks False (neutral)."""
+    return buy.astype(np.int8) - (sell & ~buy).astype(np.int8)
+
+
+def compute_votes(ind, allow_buy: bool = True, allow_sell: bool = True, params: StrategyParams | None = None):
+    """Vectorized compute_indicator_votes: returns (buy, sell, neutral, status) arrays."""
+    params = params or StrategyParams()
+    close = ind["close"]
+    with np.errstate(invalid="ignore"):
+        macd_diff = ind["macd"] - ind["macd_signal"]
+        votes = np.stack(
+            [
+                _vote(ind["rsi"] < params.rsi_buy, ind["rsi"] > params.rsi_sell),
+                _vote(macd_diff > 0, macd_diff < 0),
+                _vote(ind["stoch_k"] < params.stoch_buy, ind["stoch_k"] > params.stoch_sell),
+                _vote(
+                    (ind["aroon_up"] > params.aroon_strong) & (ind["aroon_down"] < params.aroon_weak),
+                    (ind["aroon_down"] > params.aroon_strong) & (ind["aroon_up"] < params.aroon_weak),
+                ),
+                _vote(close < ind["bb_lower"], close > ind["bb_upper"]),
+            ]
+        )
+    buy = (votes == 1).sum(axis=0)
+    sell = (votes == -1).sum(axis=0)
+    neutral = (votes == 0).sum(axis=0)
+    status = np.full(buy.shape, STATUS_NEUTRAL, dtype=np.int8)
+    if allow_buy:
+        status[buy > sell] = STATUS_BUY
+    if allow_sell:
+        status[sell > buy] = STATUS_SELL
+    return buy, sell, neutral, status
+
+
+def compute_atr_pct(close, atr):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(close != 0, atr / close, 0.0)
+
+
+def compute_risk_scores(atr_pct, buy, sell):
+    """Vectorized compute_risk_score (NaN ATR% saturates like min(70, nan) == 70)."""
+    conflict_penalty = np.where(np.abs(buy - sell) <= 1, 10, 0)
+    with np.errstate(invalid="ignore"):
+        atr_component = np.where(np.isnan(atr_pct), 70, np.minimum(70, atr_pct * 3000))
+    base = 30 + atr_component + conflict_penalty
+    return np.clip(base, 0, 100).astype(np.int16)
+
+
+def compute_tp_sl(status, close, atr, tp_mult: float = 2.0, sl_mult: float = 1.5):
+    """Vectorized compute_tp_sl."""
+    direction = status.astype(float)
+    tp = close + direction * tp_mult * atr
+    sl = close - direction * sl_mult * atr
+    flat = (status == STATUS_NEUTRAL) | (close == 0) | (atr == 0)
+    return np.where(flat, close, tp), np.where(flat, close, sl)
+
+
+def compute_dynamic_intervals(atr_pct, base_interval: int, params: StrategyParams | None = None):
+    """Vectorized compute_dynamic_interval."""
+    params = params or StrategyParams()
+    with np.errstate(invalid="ignore"):
+        factor = np.select(
+            [
+                atr_pct > params.interval_high_atr,
+                atr_pct > params.interval_mid_atr,
+                atr_pct < params.interval_low_atr,
+            ],
+            [params.interval_high_factor, params.interval_mid_factor, params.interval_low_factor],
+            1.0,
+        )
+    return np.maximum(5, (base_interval * factor).astype(np.int64))
+
+
+def scan(
+    symbols,
+    ohlcv,
+    base_interval: int = 900,
+    allow_buy: bool = True,
+    allow_sell: bool = True,
+    params: StrategyParams | None = None,
+):
+    """
+    One vectorized pass over a (symbols, bars, 5) array. Returns a DataFrame
+    indexed by symbol with the latest-bar indicators, votes, status, risk
+    score, TP/SL and next interval, i.e. what analyze_and_send_message
+    derives per symbol.
+    """
+    import pandas as pd
+
+    params = params or StrategyParams()
+    ind = compute_indicators(ohlcv, params.bb_length, params.bb_std)
+    buy, sell, neutral, status = compute_votes(ind, allow_buy, allow_sell, params)
+    last = {key: values[:, -1] for key, values in ind.items()}
+    atr_pct = compute_atr_pct(last["close"], last["atr"])
+    buy, sell, neutral, status = buy[:, -1], sell[:, -1], neutral[:, -1], status[:, -1]
+    tp, sl = compute_tp_sl(status, last["close"], last["atr"], params.tp_mult, params.sl_mult)
+    table = pd.DataFrame(last, index=pd.Index(symbols, name="symbol"))
+    table["atr_pct"] = atr_pct
+    table["votes_buy"] = buy.astype(np.int8)
+    table["votes_sell"] = sell.astype(np.int8)
+    table["votes_neutral"] = neutral.astype(np.int8)
+    table["status"] = pd.Categorical.from_codes(status + 1, ["Sell", "Neutral", "Buy"])
+    table["risk"] = compute_risk_scores(atr_pct, buy, sell)
+    table["tp"] = tp
+    table["sl"] = sl
+    table["next_interval"] = compute_dynamic_intervals(atr_pct, base_interval, params)
+    return table
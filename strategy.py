@@ -0,0 +1,42 @@
+from dataclasses import asdict, dataclass, fields
+
+
+@dataclass(frozen=True)
+class StrategyParams:
+    """
+    Tunable thresholds of the voting strategy. The defaults are the values the
+    bot has always used; user.json can override them per profile under
+    ``"strategy": {"swing": {...}, ...}`` (optimize.py writes that section).
+    """
+
+    rsi_buy: float = 30.0
+    rsi_sell: float = 70.0
+    stoch_buy: float = 20.0
+    stoch_sell: float = 80.0
+    aroon_strong: float = 70.0
+    aroon_weak: float = 30.0
+    bb_length: int = 20
+    bb_std: float = 2.0
+    tp_mult: float = 2.0
+    sl_mult: float = 1.5
+    # compute_dynamic_interval: ATR% above high/mid or below low scales the
+    # base interval by the matching factor.
+    interval_high_atr: float = 0.03
+    interval_high_factor: float = 0.5
+    interval_mid_atr: float = 0.02
+    interval_mid_factor: float = 0.7
+    interval_low_atr: float = 0.01
+    interval_low_factor: float = 1.3
+
+    @classmethod
+    def from_dict(cls, values: dict | None):
+        types = {field.name: field.type for field in fields(cls)}
+        return cls(**{key: types[key](value) for key, value in (values or {}).items() if key in types})
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def strategy_for_profile(settings: dict, profile: str):
+    """StrategyParams for ``profile`` from a user.json dict (defaults if absent)."""
+    return StrategyParams.from_dict(settings.get("strategy", {}).get(profile))
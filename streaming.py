@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import itertools
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from market_data import parse_timeframe
+
+DEFAULT_STREAM_URL = "wss://stream.binance.com:9443/stream"
+# Binance allows 1024 streams per connection; smaller groups keep a
+# reconnect (and the REST backfill after it) cheap.
+STREAMS_PER_CONNECTION = 200
+
+
+def stream_name(symbol: str, timeframe: str):
+    """'BTC/USDT', '1m' -> 'btcusdt@kline_1m'"""
+    return f"{symbol.replace('/', '').lower()}@kline_{timeframe}"
+
+
+def kline_event(symbol: str, timeframe: str, candle, closed: bool = True):
+    """One candle as a combined-stream kline message, as Binance sends it."""
+    start = int(candle[0])
+    step = parse_timeframe(timeframe)
+    market = symbol.replace("/", "").upper()
+    return {
+        "stream": stream_name(symbol, timeframe),
+        "data": {
+            "e": "kline",
+            "E": start + step,
+            "s": market,
+            "k": {
+                "t": start,
+                "T": start + step - 1,
+                "s": market,
+                "i": timeframe,
+                "o": repr(float(candle[1])),
+                "h": repr(float(candle[2])),
+                "l": repr(float(candle[3])),
+                "c": repr(float(candle[4])),
+                "v": repr(float(candle[5])),
+                "x": closed,
+            },
+        },
+    }
+
+
+def parse_kline(message: dict):
+    """(market, timeframe, candle, closed) from a kline message, None for anything else."""
+    data = message.get("data", message)
+    if not isinstance(data, dict) or data.get("e") != "kline":
+        return None
+    k = data["k"]
+    candle = [int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"])]
+    return data["s"], k["i"], candle, bool(k["x"])
+
+
+class _Connection:
+    def __init__(self):
+        self.streams = set()
+        self.ws = None
+        self.task = None
+
+
+class KlineStream:
+    """
+    Closed-candle events for a set of pairs over Binance-style combined kline
+    streams. Pairs are spread over a few connections; each reconnects with
+    backoff and resubscribes on its own, and ``on_connect`` gets that
+    connection's pairs after every (re)connect so the caller can backfill
+    what it missed over REST.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeframe: str,
+        on_close,
+        on_connect=None,
+        per_connection: int = STREAMS_PER_CONNECTION,
+        metrics=None,
+    ):
+        self.url = url
+        self.timeframe = timeframe
+        self.on_close = on_close
+        self.on_connect = on_connect
+        self.per_connection = per_connection
+        self.metrics = metrics
+        self.names = {}
+        self.connections = []
+        self.session = None
+        self.connects = 0
+        self._ids = itertools.count(1)
+        self._sends = set()
+
+    def update(self, symbols):
+        """Subscribe to exactly ``symbols``, changing open connections in place."""
+        wanted = {stream_name(symbol, self.timeframe): symbol for symbol in symbols}
+        removed = self.names.keys() - wanted.keys()
+        added = sorted(wanted.keys() - self.names.keys())
+        self.names = wanted
+        for connection in self.connections:
+            gone = connection.streams & removed
+            if gone:
+                connection.streams -= gone
+                self._send(connection, "UNSUBSCRIBE", gone)
+        for connection in self.connections:
+            room = self.per_connection - len(connection.streams)
+            if added and room > 0:
+                taken, added = added[:room], added[room:]
+                connection.streams.update(taken)
+                self._send(connection, "SUBSCRIBE", taken)
+        while added:
+            connection = _Connection()
+            connection.streams.update(added[: self.per_connection])
+            added = added[self.per_connection:]
+            connection.task = asyncio.create_task(self._run(connection))
+            self.connections.append(connection)
+        for connection in [connection for connection in self.connections if not connection.streams]:
+            connection.task.cancel()
+            self.connections.remove(connection)
+
+    def _send(self, connection, method, streams):
+        # Not connected: the next connect subscribes to connection.streams.
+        if connection.ws is None or connection.ws.closed:
+            return
+        payload = {"method": method, "params": sorted(streams), "id": next(self._ids)}
+        task = asyncio.create_task(connection.ws.send_json(payload))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+    async def _run(self, connection):
+        import aiohttp
+
+        backoff = 1.0
+        while True:
+            try:
+                if self.session is None or self.session.closed:
+                    self.session = aiohttp.ClientSession()
+                async with self.session.ws_connect(self.url, heartbeat=30) as ws:
+                    connection.ws = ws
+                    if connection.streams:
+                        await ws.send_json(
+                            {"method": "SUBSCRIBE", "params": sorted(connection.streams), "id": next(self._ids)}
+                        )
+                    self.connects += 1
+                    backoff = 1.0
+                    if self.on_connect is not None:
+                        self.on_connect([self.names[name] for name in connection.streams if name in self.names])
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self._dispatch(message.data)
+                        elif message.type == aiohttp.WSMsgType.ERROR:
+                            break
+                print(f"Kline stream closed, reconnecting in {backoff:.0f}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Kline stream error: {exc}; reconnecting in {backoff:.0f}s")
+            finally:
+                connection.ws = None
+            if self.metrics is not None:
+                self.metrics.increment("stream_reconnects_total")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _dispatch(self, text):
+        try:
+            parsed = parse_kline(json.loads(text))
+        except (ValueError, KeyError, TypeError):
+            return
+        if parsed is None:
+            return
+        market, timeframe, candle, closed = parsed
+        if not closed or timeframe != self.timeframe:
+            return
+        symbol = self.names.get(f"{market.lower()}@kline_{timeframe}")
+        if symbol is not None:
+            self.on_close(symbol, timeframe, candle)
+
+    async def close(self):
+        for connection in self.connections:
+            connection.task.cancel()
+        await asyncio.gather(*(connection.task for connection in self.connections), return_exceptions=True)
+        self.connections.clear()
+        self.names = {}
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class KlineReplayServer:
+    """
+    Local stand-in for the exchange's kline stream: replays recorded candles
+    ({symbol: (bars, 6) array}) as closed-bar events at ``speed`` times real
+    time (0: as fast as the sockets take them), speaking the same
+    SUBSCRIBE/UNSUBSCRIBE protocol. Playback starts with the first
+    subscription. With a ``clock`` (a FakeExchange) the fake REST side moves
+    with the feed; ``drop_every`` closes every client after that many bars to
+    exercise reconnects and gap backfill.
+    """
+
+    def __init__(
+        self,
+        history: dict,
+        timeframe: str,
+        speed: float = 60.0,
+        start_ms: int | None = None,
+        clock=None,
+        drop_every: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.history = history
+        self.timeframe = timeframe
+        self.step = parse_timeframe(timeframe)
+        self.speed = speed
+        self.clock = clock
+        self.drop_every = drop_every
+        self.host = host
+        self.port = port
+        self.names = {stream_name(symbol, timeframe): symbol for symbol in history}
+        stamps = [candles[:, 0] for candles in history.values() if len(candles)]
+        timeline = np.unique(np.concatenate(stamps)) if stamps else np.empty(0)
+        if start_ms is not None:
+            timeline = timeline[timeline >= start_ms]
+        self.timeline = timeline.astype(np.int64)
+        self.clients = []
+        self.bars_sent = 0
+        self.ticks = 0
+        self.done = asyncio.Event()
+        self._subscribed = asyncio.Event()
+        self._runner = None
+        self._player = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/stream"
+
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/stream", self._handle)
+        app.router.add_get("/ws", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+        await web.SockSite(self._runner, sock).start()
+        self._player = asyncio.create_task(self._play())
+        return self
+
+    async def _handle(self, request):
+        from aiohttp import WSMsgType, web
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = {name for name in request.query.get("streams", "").split("/") if name}
+        client = (ws, streams)
+        self.clients.append(client)
+        if streams:
+            self._subscribed.set()
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    payload = json.loads(message.data)
+                except ValueError:
+                    continue
+                method = payload.get("method")
+                if method == "SUBSCRIBE":
+                    streams.update(payload.get("params", []))
+                    self._subscribed.set()
+                elif method == "UNSUBSCRIBE":
+                    streams.difference_update(payload.get("params", []))
+                await ws.send_json({"result": None, "id": payload.get("id")})
+        finally:
+            self.clients.remove(client)
+        return ws
+
+    async def _play(self):
+        await self._subscribed.wait()
+        positions = {
+            symbol: int(np.searchsorted(candles[:, 0], self.timeline[0])) if len(self.timeline) else 0
+            for symbol, candles in self.history.items()
+        }
+        interval = self.step / 1000 / self.speed if self.speed > 0 else 0.0
+        started = time.monotonic()
+        for index, timestamp in enumerate(self.timeline.tolist()):
+            if interval:
+                await asyncio.sleep(max(0.0, started + (index + 1) * interval - time.monotonic()))
+            else:
+                await asyncio.sleep(0)
+            if self.clock is not None:
+                # The bar just closed: REST now sees the next one forming.
+                self.clock.now_ms = timestamp + self.step
+            events = {}
+            for symbol, candles in self.history.items():
+                position = positions[symbol]
+                if position < len(candles) and int(candles[position, 0]) == timestamp:
+                    events[stream_name(symbol, self.timeframe)] = json.dumps(
+                        kline_event(symbol, self.timeframe, candles[position].tolist())
+                    )
+                    positions[symbol] = position + 1
+            for ws, streams in list(self.clients):
+                for name in streams & events.keys():
+                    try:
+                        await ws.send_str(events[name])
+                    except ConnectionError:
+                        break
+                    self.bars_sent += 1
+            self.ticks += 1
+            if self.drop_every and self.ticks % self.drop_every == 0:
+                for ws, _ in list(self.clients):
+                    await ws.close()
+        self.done.set()
+
+    async def stop(self):
+        if self._player is not None:
+            self._player.cancel()
+        for ws, _ in list(self.clients):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def _serve(server):
+    await server.start()
+    print(f"Replaying {len(server.history)} pairs, {len(server.timeline)} bars on {server.url}")
+    await server.done.wait()
+    print(f"Replay finished: {server.bars_sent} candles sent")
+    await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded candles as a local kline stream.")
+    parser.add_argument("source", help="directory of BASE_QUOTE.csv/.parquet files, or the candle store with --store")
+    parser.add_argument("--store", action="store_true", help="SOURCE is the bot's candle store (cache/candles)")
+    parser.add_argument("--exchange", default="binance", help="exchange folder inside the candle store")
+    parser.add_argument("--symbols", nargs="*", help="only these pairs, e.g. BTC/USDT")
+    parser.add_argument("--timeframe", default="1m", help="bar size of the recorded candles")
+    parser.add_argument("--speed", type=float, default=60.0, help="times real time (0: as fast as possible)")
+    parser.add_argument("--skip-bars", type=int, default=0, help="start this many bars into the recording")
+    parser.add_argument("--drop-every", type=int, default=0, help="drop all clients every N bars")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9443)
+    args = parser.parse_args(argv)
+
+    if args.store:
+        from market_data import CandleStore
+
+        history = CandleStore(Path(args.source), args.exchange).history(args.timeframe, args.symbols)
+    else:
+        from backtest import load_history
+
+        history = load_history(args.source, args.symbols)
+    if not history:
+        print(f"No candle files found in {args.source}")
+        return 1
+    first = min(int(candles[0, 0]) for candles in history.values() if len(candles))
+    server = KlineReplayServer(
+        history,
+        args.timeframe,
+        speed=args.speed,
+        start_ms=first + args.skip_bars * parse_timeframe(args.timeframe),
+        drop_every=args.drop_every,
+        host=args.host,
+        port=args.port,
+    )
+    try:
+        asyncio.run(_serve(server))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import asyncio
+import time
+from collections import deque
+
+from telegram import Bot, InputMediaPhoto
+from telegram.error import NetworkError, RetryAfter, TelegramError, TimedOut
+
+# Bot API guidance: ~30 messages/s overall, ~1 message/s per private chat and
+# ~20 messages/min per group. A media group costs one message per item.
+GLOBAL_RATE = 30.0
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+MEDIA_GROUP_LIMIT = 10
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    async def acquire(self, cost: float = 1.0):
+        cost = min(cost, self.capacity)
+        while True:
+            now = self._refill()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return
+            await asyncio.sleep((cost - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class TelegramSender:
+    """
+    One long-lived Bot behind a bounded queue. A single worker drains the
+    queue through global and per-chat token buckets, honours RetryAfter,
+    backs off on network errors and can merge queued charts for the same
+    chat into one media group.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        queue_size: int = 100,
+        coalesce: bool = False,
+        coalesce_window: float = 1.0,
+        max_retries: int = 3,
+        metrics=None,
+        base_url: str | None = None,
+        request=None,
+    ):
+        self.token = token
+        self.base_url = base_url or ""
+        # base_url points the client at a self-hosted Bot API server (or a fake
+        # one); request swaps the HTTP transport (recording/replay).
+        options = {"base_url": base_url} if base_url else {}
+        if request is not None:
+            options["request"] = request
+        self.bot = Bot(token, **options)
+        self.queue = asyncio.Queue(maxsize=max(1, int(queue_size)))
+        self.coalesce = coalesce
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets = {}
+        self.worker = None
+        self.held = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.latencies = deque(maxlen=500)
+        # Optional metrics.Metrics: delivery latency and counters for /metrics.
+        self.metrics = metrics
+
+    def start(self):
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.bot.shutdown()
+        except Exception as exc:
+            print(f"Telegram shutdown failed: {exc}")
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+        return {
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p95": p95,
+        }
+
+    def _enqueue(self, item):
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.increment("telegram_dropped_total")
+            print(f"Telegram queue full, dropped message for chat {item['chat_id']}")
+            return False
+
+    def send_chart(self, chat_id, image: bytes, caption: str):
+        return self._enqueue(
+            {"kind": "chart", "chat_id": chat_id, "image": image, "caption": caption, "queued": time.monotonic()}
+        )
+
+    def send_photo(self, chat_id, image: bytes, caption: str):
+        return self._enqueue(
+            {"kind": "photo", "chat_id": chat_id, "image": image, "caption": caption, "queued": time.monotonic()}
+        )
+
+    def send_text(self, chat_id, text: str):
+        return self._enqueue(
+            {"kind": "text", "chat_id": chat_id, "text": text, "queued": time.monotonic()}
+        )
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = str(chat_id).startswith("-")
+            rate = GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE
+            capacity = MEDIA_GROUP_LIMIT if is_group else 1
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate, capacity)
+        return bucket
+
+    async def _next_batch(self):
+        first = self.held or await self.queue.get()
+        self.held = None
+        batch = [first]
+        if not self.coalesce or first["kind"] != "chart":
+            return batch
+        deadline = time.monotonic() + self.coalesce_window
+        while len(batch) < MEDIA_GROUP_LIMIT:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item["kind"] == "chart" and item["chat_id"] == first["chat_id"]:
+                batch.append(item)
+            else:
+                self.held = item
+                break
+        return batch
+
+    async def _deliver(self, batch):
+        first = batch[0]
+        chat_id = first["chat_id"]
+        if first["kind"] == "text":
+            await self.bot.send_message(chat_id=chat_id, text=first["text"], parse_mode="Markdown")
+        elif first["kind"] == "photo":
+            await self.bot.send_photo(
+                chat_id=chat_id, photo=first["image"], caption=first["caption"], parse_mode="Markdown"
+            )
+        else:
+            media = [
+                InputMediaPhoto(media=item["image"], caption=item["caption"], parse_mode="Markdown")
+                for item in batch
+            ]
+            await self.bot.send_media_group(chat_id=chat_id, media=media)
+
+    async def _send_with_retry(self, batch):
+        chat_bucket = self._chat_bucket(batch[0]["chat_id"])
+        backoff = 1.0
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire(len(batch))
+            await chat_bucket.acquire(len(batch))
+            try:
+                await self._deliver(batch)
+                return True
+            except RetryAfter as exc:
+                delay = exc.retry_after
+                delay = delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+                # Flood control is per bot: hold every chat, not just this one.
+                self.global_bucket.pause(delay)
+                chat_bucket.pause(delay)
+                print(f"Telegram flood control, retrying in {delay:.0f}s")
+            except (TimedOut, NetworkError) as exc:
+                print(f"Telegram network error ({exc}), retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            except TelegramError as exc:
+                print(f"Telegram send error: {exc}")
+                return False
+            if attempt < self.max_retries:
+                self.retries += 1
+                if self.metrics is not None:
+                    self.metrics.increment("retries_total", stage="telegram")
+        return False
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                delivered = await self._send_with_retry(batch)
+            except Exception as exc:
+                print(f"Telegram sender error: {exc}")
+                delivered = False
+            now = time.monotonic()
+            for item in batch:
+                if delivered:
+                    self.sent += 1
+                    self.latencies.append(now - item["queued"])
+                    if self.metrics is not None:
+                        self.metrics.observe("telegram", now - item["queued"])
+                else:
+                    self.failed += 1
+                    if self.metrics is not None:
+                        self.metrics.increment("errors_total", stage="telegram")
+                self.queue.task_done()
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def random_candles(
+    bars: int, seed: int = 0, start: float = 100.0, step_ms: int = 3_600_000, drift: float = 0.0, volatility: float = 0.01
+):
+    """ccxt-style [timestamp, open, high, low, close, volume] rows of a random walk."""
+    rng = np.random.default_rng(seed)
+    close = start * np.exp(np.cumsum(rng.normal(drift, volatility, bars)))
+    open_ = np.concatenate([[start], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, volatility / 2, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, volatility / 2, bars))
+    volume = rng.uniform(100, 1000, bars)
+    return [
+        [i * step_ms, float(o), float(h), float(l), float(c), float(v)]
+        for i, (o, h, l, c, v) in enumerate(zip(open_, high, low, close, volume))
+    ]
+
+
+@pytest.fixture
+def candles():
+    return random_candles(240, seed=7)
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+import backtest as bt
+from signals import CLOSE, STATUS_BUY, STATUS_SELL
+
+STEP_MS = 60_000
+
+
+def naive_trades(ohlcv, status, tp, sl):
+    """
+    Bar-by-bar reference for simulate_symbol: a Buy opens at that bar's close
+    while flat, TP/SL are checked from the next bar on (SL first, gaps fill at
+    the open), then a Sell close, then the last bar.
+    """
+    trades = []
+    position = None
+    last = len(ohlcv) - 1
+    for bar, (open_, high, low, close, _) in enumerate(ohlcv):
+        if position is not None:
+            entry, take, stop = position
+            if low <= stop:
+                trades.append((entry, bar, ohlcv[entry, CLOSE], min(stop, open_), "sl"))
+            elif high >= take:
+                trades.append((entry, bar, ohlcv[entry, CLOSE], max(take, open_), "tp"))
+            elif status[bar] == STATUS_SELL:
+                trades.append((entry, bar, ohlcv[entry, CLOSE], close, "signal"))
+            elif bar == last:
+                trades.append((entry, bar, ohlcv[entry, CLOSE], close, "end"))
+            else:
+                continue
+            position = None
+        elif status[bar] == STATUS_BUY and bar < last:
+            position = (bar, tp[bar], sl[bar])
+    return trades
+
+
+def naive_equity(trades_by_symbol, start_balance, risk_pct, bars):
+    """Cash walk bar by bar: exits first, then entries sized at risk_pct of the cash on hand."""
+    exits = {}
+    entries = {}
+    for symbol, trades in trades_by_symbol.items():
+        for entry, exit_bar, entry_price, exit_price, _ in trades:
+            exits.setdefault(exit_bar, []).append(((symbol, entry), exit_price))
+            entries.setdefault(entry, []).append(((symbol, entry), entry_price))
+    cash = start_balance
+    held = {}
+    for bar in range(bars):
+        for key, exit_price in exits.get(bar, ()):
+            cash += held.pop(key) * exit_price
+        for key, entry_price in entries.get(bar, ()):
+            allocation = cash * risk_pct / 100
+            held[key] = allocation / entry_price
+            cash -= allocation
+    assert not held
+    return cash
+
+
+def random_ohlcv(bars, seed, volatility=0.01):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, volatility, bars)))
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, volatility / 4, bars))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, volatility, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, volatility, bars))
+    return np.column_stack([open_, high, low, close, rng.uniform(1, 10, bars)])
+
+
+def test_find_exit_hits_and_gaps():
+    #           0      1      2      3      4
+    open_ = np.array([100.0, 100.0, 90.0, 100.0, 120.0])
+    high = np.array([101.0, 101.0, 95.0, 111.0, 125.0])
+    low = np.array([99.0, 99.0, 85.0, 99.0, 119.0])
+    # Bar 2 gaps below the stop: filled at the open, not the stop.
+    assert bt._find_exit(0, 4, 110.0, 95.0, open_, high, low) == (2, 90.0, "sl")
+    # Bar 3 touches the target; bar 4 gaps above it.
+    assert bt._find_exit(2, 4, 110.0, 80.0, open_, high, low) == (3, 110.0, "tp")
+    assert bt._find_exit(3, 4, 115.0, 80.0, open_, high, low) == (4, 120.0, "tp")
+    # Both touched in one bar: the stop wins.
+    assert bt._find_exit(2, 3, 110.0, 99.0, open_, high, low) == (3, 99.0, "sl")
+    # Nothing touched up to the limit.
+    assert bt._find_exit(0, 1, 110.0, 95.0, open_, high, low) is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_simulate_symbol_matches_bar_loop(seed):
+    bars = 3_000
+    ohlcv = random_ohlcv(bars, seed, volatility=0.02)
+    rng = np.random.default_rng(seed + 100)
+    status = rng.choice([STATUS_SELL, 0, STATUS_BUY], bars, p=[0.02, 0.95, 0.03]).astype(np.int8)
+    atr = ohlcv[:, CLOSE] * 0.02
+    tp = ohlcv[:, CLOSE] + 2.0 * atr
+    sl = ohlcv[:, CLOSE] - 1.5 * atr
+
+    trades = bt.simulate_symbol(ohlcv, status, tp, sl)
+    assert trades == naive_trades(ohlcv, status, tp, sl)
+    reasons = {trade[4] for trade in trades}
+    assert {"tp", "sl", "signal"} <= reasons
+
+
+def test_run_backtest_matches_bar_loop():
+    bars = 4_000
+    history = {}
+    for i, symbol in enumerate(("AAA/USDT", "BBB/USDT", "CCC/USDT")):
+        ohlcv = random_ohlcv(bars, seed=10 + i)
+        stamps = 1_600_000_000_000 + np.arange(bars) * STEP_MS
+        history[symbol] = np.column_stack([stamps, ohlcv])
+
+    result = bt.run_backtest(history, "1m", start_balance=10_000.0, risk_pct=5.0)
+
+    expected = {}
+    for symbol, candles in history.items():
+        ohlcv = candles[:, 1:]
+        status, tp, sl = bt.evaluate_signals(ohlcv[None])
+        expected[symbol] = naive_trades(ohlcv, status[0], tp[0], sl[0])
+    assert set(result.trades["symbol"]) == set(history)
+    for symbol, frame in result.trades.groupby("symbol", sort=False):
+        rows = list(frame.itertuples())
+        assert len(rows) == len(expected[symbol])
+        for row, (entry, exit_bar, entry_price, exit_price, reason) in zip(rows, expected[symbol]):
+            assert (row.entry_bar, row.exit_bar, row.reason) == (entry, exit_bar, reason)
+            # The block pass and the single-symbol pass may round TP/SL a ulp apart.
+            assert row.entry_price == pytest.approx(entry_price, rel=1e-12)
+            assert row.exit_price == pytest.approx(exit_price, rel=1e-12)
+    assert {"tp", "sl"} <= set(result.trades["reason"])
+    assert result.stats["final_equity"] == pytest.approx(
+        naive_equity(expected, 10_000.0, 5.0, bars), rel=1e-9
+    )
@@ -0,0 +1,122 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+import engine as E
+from fakes import FakeExchange
+from market_data import CandleCache
+
+
+class FakeSender:
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.sent = []
+
+    def send_chart(self, chat_id, image, caption):
+        if self.accept:
+            self.sent.append(caption)
+        return self.accept
+
+
+def make_engine(tmp_path, sender, **overrides):
+    overrides.setdefault("symbols", ("A/USDT",))
+    settings = E.EngineSettings.from_dict({}, state_dir=str(tmp_path), profile="swing", **overrides)
+    engine = E.BotEngine(settings)
+    engine.exchange = FakeExchange()
+    engine.candles = CandleCache(engine.exchange)
+
+    async def get_sender():
+        return sender
+
+    async def fetch_dominance(symbol):
+        return 1.0
+
+    engine.get_sender = get_sender
+    engine.fetch_dominance = fetch_dominance
+    return engine
+
+
+def test_dropped_send_is_not_recorded(tmp_path):
+    async def main():
+        sender = FakeSender(accept=False)
+        engine = make_engine(tmp_path, sender)
+        try:
+            await engine.analyze_and_send_message("A/USDT")
+            assert engine.metrics.counter("suppressed_total") == 0
+            # The queue was full: the same signal is not suppressed next scan.
+            sender.accept = True
+            await engine.analyze_and_send_message("A/USDT")
+            assert len(sender.sent) == 1
+            await engine.analyze_and_send_message("A/USDT")
+            assert len(sender.sent) == 1
+            assert engine.metrics.counter("suppressed_total") == 1
+        finally:
+            await engine.close()
+
+    asyncio.run(main())
+
+
+def run_for(engine, seconds, during=None):
+    async def main():
+        async def ensure_exchange():
+            return engine.exchange
+
+        engine.ensure_exchange = ensure_exchange
+        task = asyncio.create_task(engine.run())
+        try:
+            await asyncio.sleep(seconds)
+            if during is not None:
+                await during()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await engine.close()
+
+    asyncio.run(main())
+
+
+def test_idle_loop_does_not_spin(tmp_path):
+    engine = make_engine(tmp_path, FakeSender(), auto_messages=False)
+    passes = []
+
+    async def dispatch_ads_if_due():
+        passes.append(None)
+
+    engine.dispatch_ads_if_due = dispatch_ads_if_due
+    run_for(engine, 1.5)
+    assert len(passes) <= 3
+
+
+def test_concurrency_follows_settings(tmp_path):
+    engine = make_engine(
+        tmp_path, FakeSender(), symbols=("A/USDT", "B/USDT", "C/USDT", "D/USDT"), max_concurrency=1
+    )
+    active = []
+    peak = [0]
+
+    async def analyze_and_send_message(symbol):
+        active.append(symbol)
+        peak[0] = max(peak[0], len(active))
+        await asyncio.sleep(0.2)
+        active.remove(symbol)
+        return 0.1
+
+    engine.analyze_and_send_message = analyze_and_send_message
+
+    async def raise_limit():
+        assert peak[0] == 1
+        engine.apply_settings(dataclasses.replace(engine.settings, max_concurrency=4))
+        await asyncio.sleep(1.5)
+
+    run_for(engine, 1.0, raise_limit)
+    assert peak[0] == 4
+
+
+def test_state_dir_is_single_instance(tmp_path):
+    engine = make_engine(tmp_path, FakeSender())
+    with pytest.raises(RuntimeError, match="in use by another bot instance"):
+        make_engine(tmp_path, FakeSender())
+    asyncio.run(engine.close())
+    # Released on close: the directory can be taken over.
+    asyncio.run(make_engine(tmp_path, FakeSender()).close())
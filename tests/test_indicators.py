@@ -0,0 +1,116 @@
+import math
+
+import pytest
+
+from conftest import random_candles
+from indicators import IndicatorEngine
+
+WINDOW = 240
+
+# Max absolute difference allowed against pandas_ta, per indicator. The
+# streaming formulas are the same recurrences, so only float rounding of the
+# running sums separates them.
+TOLERANCE = {
+    "rsi": 1e-8,
+    "atr": 1e-8,
+    "macd": 1e-8,
+    "macd_signal": 1e-8,
+    "bb_lower": 1e-8,
+    "bb_middle": 1e-8,
+    "bb_upper": 1e-8,
+    "stoch_k": 1e-8,
+    "stoch_d": 1e-8,
+    "aroon_up": 1e-9,
+    "aroon_down": 1e-9,
+    "obv": 1e-6,
+    "psar_long": 1e-8,
+    "psar_short": 1e-8,
+}
+
+
+@pytest.fixture
+def ta():
+    return pytest.importorskip("pandas_ta")
+
+
+def stream(candles, window=WINDOW):
+    """Feed the bars one at a time; returns the per-bar outputs of the last ``window`` bars."""
+    engine = IndicatorEngine(window=window)
+    rows = [engine.update(candle) for candle in candles]
+    return {key: [row[key] for row in rows[-window:]] for key in rows[0]}
+
+
+def reference(ta, candles):
+    import pandas as pd
+
+    df = pd.DataFrame(candles, columns=["timestamp", "open", "high", "low", "close", "volume"])
+    macd = ta.macd(df["close"])
+    stoch = ta.stoch(df["high"], df["low"], df["close"])
+    aroon = ta.aroon(df["high"], df["low"])
+    bbands = ta.bbands(df["close"], length=20, std=2)
+    psar = ta.psar(df["high"], df["low"], df["close"])
+    columns = {
+        "rsi": ta.rsi(df["close"], length=14),
+        "atr": ta.atr(df["high"], df["low"], df["close"], length=14),
+        "macd": macd["MACD_12_26_9"],
+        "macd_signal": macd["MACDs_12_26_9"],
+        "bb_lower": bbands["BBL_20_2.0"],
+        "bb_middle": bbands["BBM_20_2.0"],
+        "bb_upper": bbands["BBU_20_2.0"],
+        "stoch_k": stoch["STOCHk_14_3_3"],
+        "stoch_d": stoch["STOCHd_14_3_3"],
+        "aroon_up": aroon["AROONU_14"],
+        "aroon_down": aroon["AROOND_14"],
+        "obv": ta.obv(df["close"], df["volume"]),
+        "psar_long": psar["PSARl_0.02_0.2"],
+        "psar_short": psar["PSARs_0.02_0.2"],
+    }
+    return {key: series.tolist() for key, series in columns.items()}
+
+
+def assert_close(key, ours, theirs, min_compared):
+    compared = 0
+    for bar, (a, b) in enumerate(zip(ours, theirs)):
+        if b is None or math.isnan(b):
+            continue
+        assert not math.isnan(a), f"{key}[{bar}] still warming up, pandas_ta has {b}"
+        assert abs(a - b) <= TOLERANCE[key], f"{key}[{bar}]: {a} vs {b}"
+        compared += 1
+    assert compared >= min_compared, f"{key}: only {compared} bars compared"
+
+
+@pytest.mark.parametrize("key", sorted(TOLERANCE))
+def test_streamed_matches_pandas_ta(ta, key, candles):
+    ours = stream(candles)
+    theirs = reference(ta, candles)
+    # PSAR alternates between the long and short column, so each only covers
+    # part of the window; every other indicator is warm after ~35 bars.
+    min_compared = 1 if key.startswith("psar") else WINDOW - 40
+    assert_close(key, ours[key], theirs[key], min_compared)
+
+
+def test_windowed_obv_after_sliding(ta):
+    # OBV is windowed: the engine keeps only the last WINDOW bars and, like
+    # ta.obv on a fixed fetch window, counts the first bar of that window as an
+    # up bar. After streaming more than a window it must match ta.obv over the
+    # trailing WINDOW bars, not a cumulative OBV since the first streamed bar.
+    candles = random_candles(WINDOW * 2 + 17, seed=3)
+    ours = stream(candles)
+    theirs = reference(ta, candles[-WINDOW:])
+    assert ours["obv"][-1] == pytest.approx(theirs["obv"][-1], abs=TOLERANCE["obv"])
+
+
+def test_psar_after_sliding_is_not_a_fresh_recomputation():
+    # PSAR caveat: the stream never restarts, so once more than WINDOW bars
+    # have been streamed its values can differ from ta.psar recomputed over
+    # the trailing WINDOW bars until the first reversal inside the window.
+    # The comparison above therefore starts the engine at the window's first
+    # bar; here we only check the streamed state is not reset by sliding.
+    candles = random_candles(WINDOW * 2, seed=5)
+    slid = stream(candles)
+    full = stream(candles, window=len(candles))
+    for key in ("psar_long", "psar_short"):
+        tail = full[key][-WINDOW:]
+        assert all(
+            (math.isnan(a) and math.isnan(b)) or a == b for a, b in zip(slid[key], tail)
+        )
@@ -0,0 +1,57 @@
+import pytest
+
+from ledger import PaperLedger
+
+
+def crash(ledger, torn: bytes = b""):
+    """Drop the ledger without close() (no final snapshot), optionally mid-write of a fill."""
+    ledger.journal.close()
+    if torn:
+        with open(ledger.journal_path, "ab") as f:
+            f.write(torn)
+
+
+def test_snapshot_plus_journal_replay(tmp_path):
+    ledger = PaperLedger(tmp_path, 1_000, snapshot_every=2)
+    ledger.open_position("A/USDT", 1, 10)
+    ledger.open_position("B/USDT", 2, 20)  # second fill: snapshot, journal restarts
+    ledger.close_position("A/USDT", 15)
+    crash(ledger)
+
+    recovered = PaperLedger(tmp_path, 1_000, snapshot_every=2)
+    assert recovered.recovered_fills == 1
+    assert recovered.cash == pytest.approx(1_000 - 10 - 40 + 15)
+    assert recovered.pnl == pytest.approx(5)
+    assert recovered.positions == {"B/USDT": {"qty": 2, "entry": 20}}
+    recovered.close()
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    ledger = PaperLedger(tmp_path, 1_000)
+    ledger.open_position("A/USDT", 1, 10)
+    crash(ledger, torn=b'{"type":"open","symbol":"B/US')
+
+    recovered = PaperLedger(tmp_path, 1_000)
+    assert recovered.recovered_fills == 1
+    assert recovered.positions == {"A/USDT": {"qty": 1, "entry": 10}}
+    # The fragment is gone from the journal, not just skipped.
+    assert recovered.journal_path.read_bytes().endswith(b"}\n")
+    recovered.close()
+
+
+def test_fills_after_a_torn_line_survive_the_next_crash(tmp_path):
+    ledger = PaperLedger(tmp_path, 1_000)
+    ledger.open_position("A/USDT", 1, 10)
+    crash(ledger, torn=b'{"type":"open","sym')
+
+    restarted = PaperLedger(tmp_path, 1_000)
+    restarted.open_position("C/USDT", 2, 5)
+    restarted.close_position("A/USDT", 20)
+    crash(restarted)
+
+    recovered = PaperLedger(tmp_path, 1_000)
+    assert recovered.recovered_fills == 3
+    assert recovered.cash == pytest.approx(1_000 - 10 - 10 + 20)
+    assert recovered.pnl == pytest.approx(10)
+    assert recovered.positions == {"C/USDT": {"qty": 2, "entry": 5}}
+    recovered.close()
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from fakes import FakeExchange
+from market_data import CandleCache, CandleStore, DominanceCache, parse_timeframe
+
+STEP = parse_timeframe("1m")
+
+
+def stored_with_gap(tmp_path, exchange, bars, gap):
+    """A store holding the exchange's last ``bars`` 1m candles minus ``gap`` rows in the middle."""
+    rows = np.asarray(asyncio.run(exchange.fetch_ohlcv("A/USDT", "1m", limit=bars)))
+    middle = len(rows) // 2
+    store = CandleStore(tmp_path)
+    store.series("A/USDT", "1m").append(np.vstack((rows[:middle], rows[middle + gap:])))
+    return store, rows
+
+
+def test_fetch_history_refetches_from_a_stored_gap(tmp_path):
+    exchange = FakeExchange()
+    store, rows = stored_with_gap(tmp_path, exchange, 600, gap=5)
+    cache = CandleCache(exchange, store)
+
+    candles = asyncio.run(cache.fetch_history("A/USDT", "1m", 600, page=200))
+
+    stamps = np.array([candle[0] for candle in candles])
+    assert (np.diff(stamps) == STEP).all()
+    np.testing.assert_array_equal(np.asarray(candles), rows)
+    # Paged from the gap on, not from the start of the window.
+    assert cache.full_fetches == 2
+
+
+def test_fetch_skips_a_stored_window_with_a_gap(tmp_path):
+    exchange = FakeExchange()
+    store, rows = stored_with_gap(tmp_path, exchange, 300, gap=1)
+    cache = CandleCache(exchange, store)
+
+    candles = asyncio.run(cache.fetch("A/USDT", "1m", 240))
+
+    assert cache.store_loads == 0
+    np.testing.assert_array_equal(np.asarray(candles), rows[-240:])
+
+
+class CountingDominance(DominanceCache):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.downloads = 0
+
+    def _download(self):
+        self.downloads += 1
+        time.sleep(0.05)
+        return {"btc": 50.0 + self.downloads}
+
+
+def test_dominance_ttl_per_lookup():
+    cache = CountingDominance(ttl=300)
+
+    async def main():
+        assert await cache.lookup("BTC/USDT") == 51.0
+        assert await cache.lookup("BTC/USDT") == 51.0
+        # A shorter TTL from another caller refreshes in the background.
+        await cache.lookup("BTC/USDT", ttl=0)
+        await asyncio.sleep(0.2)
+        return await cache.lookup("BTC/USDT")
+
+    assert asyncio.run(main()) == 52.0
+    assert cache.downloads == 2
+
+
+def test_dominance_shared_across_event_loops():
+    cache = CountingDominance(ttl=0)
+    results = []
+
+    def engine_thread():
+        async def burst():
+            return await asyncio.gather(*(cache.get() for _ in range(5)))
+
+        results.append(asyncio.run(burst()))
+
+    # Two engine threads, each with its own loop, look up at the same time:
+    # neither may await a task that belongs to the other loop.
+    threads = [threading.Thread(target=engine_thread) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    assert len(results) == 2
+    assert all(payload for burst in results for payload in burst)
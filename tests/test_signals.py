@@ -0,0 +1,67 @@
+import pytest
+
+import engine as E
+from conftest import random_candles
+from indicators import IndicatorEngine
+from signals import scan, stack_ohlcv
+
+BARS = 240
+SYMBOLS = [f"S{i}/USDT" for i in range(12)]
+
+
+@pytest.fixture
+def bot(tmp_path):
+    settings = E.EngineSettings.from_dict({}, state_dir=str(tmp_path))
+    bot = E.BotEngine(settings)
+    yield bot
+    bot.charts.shutdown()
+
+
+def market():
+    # Mixed drift and volatility so the symbols land on every status and
+    # dynamic interval band.
+    return {
+        symbol: random_candles(
+            BARS,
+            seed=100 + i,
+            start=10.0 ** (i % 4),
+            drift=(i % 3 - 1) * 0.002,
+            volatility=(0.004, 0.01, 0.02, 0.035)[i % 4],
+        )
+        for i, symbol in enumerate(SYMBOLS)
+    }
+
+
+@pytest.mark.parametrize("allow_buy,allow_sell", [(True, True), (True, False), (False, True)])
+def test_scan_matches_per_symbol_analysis(bot, allow_buy, allow_sell):
+    settings = E.EngineSettings.from_dict({}, allow_buy=allow_buy, allow_sell=allow_sell)
+    params = settings.strategy
+    candles = market()
+    symbols, ohlcv = stack_ohlcv(candles, BARS)
+    table = scan(symbols, ohlcv, settings.interval, allow_buy, allow_sell, params)
+
+    statuses = set()
+    intervals = set()
+    for symbol in SYMBOLS:
+        engine = IndicatorEngine(window=BARS, bb_length=params.bb_length, bb_std=params.bb_std)
+        values = engine.sync(candles[symbol])
+        close = values["close"]
+        atr_pct = values["atr"] / close if close else 0
+        votes, status = bot.compute_indicator_votes(values, close, settings)
+        tp, sl = bot.compute_tp_sl(status, close, values["atr"], params)
+        row = table.loc[symbol]
+
+        assert (row.votes_buy, row.votes_sell, row.votes_neutral) == (
+            votes["buy"],
+            votes["sell"],
+            votes["neutral"],
+        )
+        assert row.status == status
+        assert row.risk == bot.compute_risk_score(atr_pct, votes)
+        assert row.tp == pytest.approx(tp, rel=1e-9)
+        assert row.sl == pytest.approx(sl, rel=1e-9)
+        assert row.next_interval == bot.compute_dynamic_interval(atr_pct, settings.interval, params)
+        statuses.add(status)
+        intervals.add(row.next_interval)
+    assert len(statuses) == 3 or not (allow_buy and allow_sell)
+    assert len(intervals) > 2
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from telegram_sender import TelegramSender
+
+
+def test_retry_after_pauses_every_chat():
+    async def main():
+        sender = TelegramSender("123:abc")
+        calls = []
+
+        async def deliver(batch):
+            calls.append((batch[0]["chat_id"], time.monotonic()))
+            if len(calls) == 1:
+                raise RetryAfter(1)
+
+        sender._deliver = deliver
+        started = time.monotonic()
+        first = asyncio.create_task(sender._send_with_retry([{"chat_id": 1}]))
+        await asyncio.sleep(0.1)
+        # Another chat has its own bucket but must wait out the flood control too.
+        assert await sender._send_with_retry([{"chat_id": 2}])
+        assert await first
+        assert sorted(chat for chat, _ in calls) == [1, 1, 2]
+        assert all(at - started >= 0.9 for _, at in calls[1:])
+
+    asyncio.run(main())